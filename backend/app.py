@@ -1,19 +1,48 @@
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Request, Response, request, jsonify, send_from_directory, make_response, g, has_app_context
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
 import pymysql
 from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT, SECRET_KEY, JWT_ALGORITHM
-from config import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM
+from config import EMAIL_WORKER_ENABLED
+from config import DB_POOL_SIZE, DB_POOL_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_IDLE_TIMEOUT, DB_POOL_PING_INTERVAL
+from config import SEARCH_INDEX_REFRESH_SECONDS, FACETS_CACHE_TTL
+from config import CACHE_BACKEND, CACHE_REDIS_URL, CACHE_MAX_ENTRIES, CACHE_DEFAULT_TTL
+from config import AUTH_TOKEN_CACHE_SIZE, ROLE_CACHE_TTL
+from config import BCRYPT_ROUNDS, PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT, PASSWORD_TIMEOUT
+from config import UPLOADS_MAX_AGE, UPLOADS_SENDFILE_MODE, UPLOADS_ACCEL_PREFIX, UPLOADS_GC_INTERVAL_HOURS
+from config import MAX_REQUEST_BYTES, PHOTO_MAX_BYTES, PROOF_MAX_BYTES, UPLOAD_SESSION_TTL, UPLOAD_CHUNK_MAX_BYTES
+from config import EVENTS_BACKEND, EVENTS_REDIS_URL, EVENTS_HEARTBEAT, EVENTS_MAX_SECONDS, UNREAD_COUNT_CACHE_TTL
+from config import MESSAGES_ARCHIVE_INTERVAL_HOURS
+from db_pool import create_pool
+from migrate import migrate_on_boot
+from search_index import SearchIndex
+from cache import create_cache
+from auth import TokenVerifier, AuthError
+from passwords import PasswordHasher, PasswordPoolBusy
+from mailer import create_outbox
+import images
+from migrate_photos import is_data_url, save_data_url
+from storage import ContentStore, UploadSpool, UploadRejected, IMAGE_KINDS, iter_stream, add_reference, release_reference
+import gc_uploads
+from chunked_uploads import ChunkedUploads, UploadSessionError
+from events import create_broker, stream as event_stream
+import conversations
+import archive_messages
+from werkzeug.security import safe_join
+from werkzeug.exceptions import RequestEntityTooLarge
 import jwt
 import datetime
 import bcrypt
 import os
-import smtplib
 import random
-import uuid
+import json
+import base64
+import mimetypes
+import re
+from urllib.parse import urlencode
 from werkzeug.utils import secure_filename
-from email.message import EmailMessage
 import traceback
+from functools import wraps
 
 app = Flask(__name__)
 # Configuración CORS mejorada para manejar FormData y archivos
@@ -21,7 +50,7 @@ CORS(app, resources={
     r"/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", "Content-Range"],
         "supports_credentials": True
     }
 })
@@ -33,6 +62,57 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 if not os.path.exists(app.config['UPLOAD_FOLDER']):
     os.makedirs(app.config['UPLOAD_FOLDER'])
 
+# Archivos nombrados por su hash (deduplicados) y repartidos en subdirectorios ab/cd/
+content_store = ContentStore(app.config['UPLOAD_FOLDER'])
+
+# Tamaño máximo de cualquier petición; los endpoints con subidas lo ajustan con @upload_limit
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+# Margen para los campos de texto que acompañan al archivo en el multipart
+FORM_OVERHEAD_BYTES = 64 * 1024
+PROOF_KINDS = IMAGE_KINDS | {'pdf'}
+
+
+class UploadRequest(Request):
+    """Petición cuyas partes de archivo se escriben directo al almacenamiento (UploadSpool),
+    con el tamaño y los tipos permitidos por el endpoint"""
+
+    @property
+    def max_content_length(self):
+        limit = g.get('upload_request_limit') if has_app_context() else None
+        return limit or super().max_content_length
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return content_store.spool(g.get('upload_limit', PHOTO_MAX_BYTES), g.get('upload_kinds', IMAGE_KINDS))
+
+
+app.request_class = UploadRequest
+
+# Subidas por partes reanudables (/api/uploads) para conexiones móviles inestables
+chunked_uploads = ChunkedUploads(content_store,
+                                 {'photo': (PHOTO_MAX_BYTES, IMAGE_KINDS), 'proof': (PROOF_MAX_BYTES, PROOF_KINDS)},
+                                 ttl_seconds=UPLOAD_SESSION_TTL * 3600, max_chunk=UPLOAD_CHUNK_MAX_BYTES)
+
+
+def upload_limit(max_bytes, kinds=IMAGE_KINDS):
+    """Tamaño máximo y tipos de archivo aceptados por un endpoint con subidas.
+
+    Rechaza por Content-Length sin leer el cuerpo y procesa el multipart antes de entrar a
+    la ruta, así un archivo inválido responde 413/415 aunque la ruta capture excepciones."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # Las fotos también pueden llegar como data URL en JSON (base64 ocupa 4/3)
+            request_limit = max_bytes * 4 // 3 + FORM_OVERHEAD_BYTES
+            if request.content_length is not None and request.content_length > request_limit:
+                return jsonify({'error': f'El archivo supera el máximo de {max_bytes / 1024 / 1024:.0f} MB'}), 413
+            g.upload_limit = max_bytes
+            g.upload_kinds = kinds
+            g.upload_request_limit = request_limit
+            _ = request.files
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
 # ===== CONFIGURACIÓN DE SWAGGER UI =====
 SWAGGER_URL = '/docs'
 API_URL = '/openapi.yaml'
@@ -60,11 +140,52 @@ def handle_preflight():
         response.headers.add('Access-Control-Allow-Methods', "*")
         return response
 
+# Endpoints de lectura con GET condicional: ETag fuerte (hash del contenido) y 304 si no cambió
+CONDITIONAL_GET_ENDPOINTS = {
+    'me',
+    'get_publications',
+    'get_publication_facets',
+    'get_publication',
+    'get_user_profile',
+    'valoraciones',
+    'get_wishlist',
+    'check_wishlist_status',
+    'get_wishlist_id_set',
+    'get_conversations',
+    'get_messages_with_user',
+    'unread_message_count',
+    'get_my_transactions',
+    'get_transaction_details',
+}
+
+
+@app.after_request
+def add_conditional_get_headers(response):
+    if request.method != 'GET' or request.endpoint not in CONDITIONAL_GET_ENDPOINTS:
+        return response
+    if response.status_code != 200 or response.direct_passthrough or not response.is_json:
+        return response
+    response.add_etag()
+    if g.get('last_modified'):
+        response.last_modified = g.last_modified
+    # Guardar pero revalidar siempre; las respuestas con token son solo para ese usuario
+    response.headers['Cache-Control'] = 'private, no-cache' if request.headers.get('Authorization') else 'no-cache'
+    response.vary.add('Authorization')
+    return response.make_conditional(request)
+
+
+def set_last_modified(rows, field):
+    """Registra la fecha más reciente de `field` en las filas para el encabezado Last-Modified"""
+    dates = [row[field] for row in rows if isinstance(row.get(field), datetime.datetime)]
+    if dates:
+        g.last_modified = max(dates)
+
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def save_uploaded_file(file):
-    """Guarda un archivo subido y retorna el nombre del archivo guardado"""
+def save_uploaded_file(file, generate_variants=True):
+    """Guarda un archivo subido en el almacenamiento por contenido y retorna el StoredFile"""
     if not file:
         print("[DEBUG] No se proporcionó archivo")
         return None
@@ -72,19 +193,21 @@ def save_uploaded_file(file):
     print(f"[DEBUG] Procesando archivo: {file.filename}")
     print(f"[DEBUG] Tipo de contenido: {file.content_type}")
     
+    if isinstance(file.stream, UploadSpool):
+        # Ya escrito, hasheado y validado por su firma mientras llegaba: solo moverlo
+        stored = content_store.adopt(file.stream)
+        if generate_variants:
+            images.generate_in_background(app.config['UPLOAD_FOLDER'], stored.path)
+        return stored
     if file and allowed_file(file.filename):
-        # Generar nombre único para el archivo
         filename = secure_filename(file.filename)
         ext = filename.rsplit('.', 1)[1].lower()
-        new_filename = f"{uuid.uuid4()}.{ext}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], new_filename)
-        
-        print(f"[DEBUG] Guardando archivo en: {file_path}")
-        
         try:
-            file.save(file_path)
-            print(f"[DEBUG] Archivo guardado exitosamente: {new_filename}")
-            return new_filename
+            # El hash se calcula mientras se escribe; si el contenido ya existía no se duplica
+            stored = content_store.save(iter_stream(file.stream), ext)
+            if generate_variants:
+                images.generate_in_background(app.config['UPLOAD_FOLDER'], stored.path)
+            return stored
         except Exception as e:
             print(f"[DEBUG] Error al guardar archivo: {e}")
             return None
@@ -92,108 +215,281 @@ def save_uploaded_file(file):
         print(f"[DEBUG] Tipo de archivo no permitido: {file.filename}")
     return None
 
-@app.route('/uploads/<filename>')
+# Nombre de un archivo del almacenamiento por contenido: <sha256>.<ext> o <sha256>__<tamaño>.<ext>
+CONTENT_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})(?:__(?P<size>[a-z]+))?\.(?P<ext>\w+)$')
+
+
+def upload_etag(relpath):
+    """ETag fuerte derivado del hash del nombre, o None para que Werkzeug lo calcule"""
+    match = CONTENT_NAME_RE.match(os.path.basename(relpath))
+    if not match:
+        return None
+    if match.group('size'):
+        return f"{match.group('digest')}-{match.group('size')}-{match.group('ext')}"
+    return match.group('digest')
+
+
+def send_upload(relpath, mimetype=None):
+    """Envía un archivo de uploads con caché de larga duración.
+
+    Sin UPLOADS_SENDFILE_MODE lo transmite Werkzeug (Range, If-None-Match/If-Modified-Since
+    y `wsgi.file_wrapper` para que el servidor WSGI use sendfile). Con 'x-accel' o
+    'x-sendfile' solo se responden las cabeceras y el servidor web envía el archivo."""
+    folder = app.config['UPLOAD_FOLDER']
+    path = safe_join(folder, relpath)
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    etag = upload_etag(relpath)
+    if UPLOADS_SENDFILE_MODE in ('x-accel', 'x-sendfile'):
+        response = make_response('')
+        if UPLOADS_SENDFILE_MODE == 'x-accel':
+            response.headers['X-Accel-Redirect'] = UPLOADS_ACCEL_PREFIX.rstrip('/') + '/' + relpath
+        else:
+            response.headers['X-Sendfile'] = path
+        response.mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        response.set_etag(etag or f"{os.path.getmtime(path):.0f}-{os.path.getsize(path)}")
+        response.make_conditional(request)
+    else:
+        response = send_from_directory(folder, relpath, mimetype=mimetype, max_age=UPLOADS_MAX_AGE,
+                                       etag=etag or True, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.max_age = UPLOADS_MAX_AGE
+    response.cache_control.immutable = True
+    response.cache_control.no_cache = None
+    return response
+
+
+@app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """Sirve un archivo subido; `?size=sm|md|lg` entrega un derivado redimensionado"""
+    size = request.args.get('size')
+    if not size:
+        return send_upload(filename)
+    if size not in images.IMAGE_SIZES:
+        return jsonify({'error': f"Tamaño inválido, use uno de: {', '.join(images.IMAGE_SIZES)}"}), 400
+    # Formato explícito con ?format=webp|jpeg o negociado según el Accept del navegador
+    fmt = request.args.get('format')
+    if fmt not in images.IMAGE_FORMATS:
+        fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpeg'
+    if safe_join(app.config['UPLOAD_FOLDER'], filename) is None:
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+    derivative = images.ensure_derivative(app.config['UPLOAD_FOLDER'], filename, size, fmt)
+    if not derivative:
+        # Sin Pillow o archivo no derivable: servir el original
+        return send_upload(filename)
+    response = send_upload(derivative, mimetype=images.IMAGE_FORMATS[fmt][2])
+    if 'format' not in request.args and not isinstance(response, tuple):
+        response.vary.add('Accept')
+    return response
+
+
+# Las fotos de perfil en base64 que aún no se migraron (migrate_photos.py) no se envían en JSON
+USER_PHOTO_COLUMN = "IF(LEFT(foto, 5) = 'data:', NULL, foto) AS foto"
+
+
+def user_photo_from_request(data):
+    """URL de la foto de perfil enviada como archivo (`foto` multipart) o como data URL en base64.
+
+    Retorna (url, error). `url` es None si no se envió foto nueva; una URL existente se conserva."""
+    file = request.files.get('foto')
+    if file and file.filename:
+        stored = save_uploaded_file(file)
+        if not stored:
+            return None, 'Tipo de archivo no permitido'
+        return stored.url, None
+    value = data.get('foto')
+    if is_data_url(value):
+        try:
+            # Misma validación por firma y límite de tamaño que un archivo multipart
+            stored = save_data_url(value, content_store, max_bytes=g.get('upload_limit', PHOTO_MAX_BYTES),
+                                   kinds=g.get('upload_kinds', IMAGE_KINDS))
+        except ValueError as e:
+            return None, str(e)
+        images.generate_in_background(app.config['UPLOAD_FOLDER'], stored.path)
+        return stored.url, None
+    return value, None
+
+
+def release_publication_files(cur, pub_id):
+    """Quita las referencias a los archivos de una publicación que se va a eliminar (la foto de
+    la prenda y los comprobantes de sus transacciones, que se borran en cascada)"""
+    cur.execute('''
+        SELECT foto AS url FROM prenda WHERE id_publicacion = %s
+        UNION ALL
+        SELECT comprobante_pago AS url FROM transaccion WHERE id_publicacion = %s
+    ''', (pub_id, pub_id))
+    for row in cur.fetchall():
+        release_reference(cur, row['url'])
+
+
+def release_user_files(cur, user_id):
+    """Quita las referencias a los archivos de un usuario que se va a eliminar (foto de perfil,
+    sus publicaciones y los comprobantes de las transacciones donde compra o vende)"""
+    cur.execute('''
+        SELECT foto AS url FROM usuario WHERE id_usuario = %s
+        UNION ALL
+        SELECT pr.foto FROM prenda pr JOIN publicacion p ON pr.id_publicacion = p.id_publicacion
+        WHERE p.id_usuario = %s
+        UNION ALL
+        SELECT t.comprobante_pago FROM transaccion t JOIN publicacion p ON t.id_publicacion = p.id_publicacion
+        WHERE t.id_comprador = %s OR p.id_usuario = %s
+    ''', (user_id, user_id, user_id, user_id))
+    for row in cur.fetchall():
+        release_reference(cur, row['url'])
+
+
+def add_photo_variants(publications):
+    """Agrega `foto_variantes` (URLs de los derivados por ancho) a cada publicación"""
+    for publication in publications:
+        publication['foto_variantes'] = images.variant_urls(publication.get('foto'))
+    return publications
+
+
+# Pool compartido: las rutas siguen llamando a conn.close(), que devuelve la conexión al pool
+db_pool = create_pool(
+    DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT,
+    size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    timeout=DB_POOL_TIMEOUT,
+    idle_timeout=DB_POOL_IDLE_TIMEOUT,
+    ping_interval=DB_POOL_PING_INTERVAL,
+)
 
 
 def get_db_connection():
-    return pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME, port=DB_PORT, cursorclass=pymysql.cursors.DictCursor)
+    return db_pool.connection()
 
 
-def ensure_verification_columns():
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Añadir columnas si no existen (tolerar errores)
-            try:
-                cur.execute("ALTER TABLE usuario ADD COLUMN verified BOOLEAN DEFAULT FALSE")
-            except Exception:
-                pass
-            try:
-                cur.execute("ALTER TABLE usuario ADD COLUMN verification_code VARCHAR(32) DEFAULT NULL")
-            except Exception:
-                pass
-            try:
-                cur.execute("ALTER TABLE usuario ADD COLUMN verification_exp DATETIME DEFAULT NULL")
-            except Exception:
-                pass
-            conn.commit()
-    finally:
-        conn.close()
+# Caché de lecturas (catálogo, perfiles, valoraciones) con invalidación por etiquetas
+cache = create_cache(CACHE_BACKEND, redis_url=CACHE_REDIS_URL, max_entries=CACHE_MAX_ENTRIES,
+                     default_ttl=CACHE_DEFAULT_TTL)
 
 
-def ensure_foto_columns():
-    """Asegura que las columnas 'foto' en las tablas usuario y prenda permitan almacenar cadenas largas (LONGTEXT).
-    Se ejecuta al inicio para evitar problemas cuando el frontend envía imágenes en base64.
-    """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            try:
-                # Cambiar a LONGTEXT para manejar imágenes base64 grandes
-                cur.execute("ALTER TABLE usuario MODIFY COLUMN foto LONGTEXT")
-                print("Columna foto de usuario actualizada a LONGTEXT")
-            except Exception as e:
-                print(f"Error actualizando columna foto de usuario: {e}")
-            try:
-                cur.execute("ALTER TABLE prenda MODIFY COLUMN foto LONGTEXT")
-                print("Columna foto de prenda actualizada a LONGTEXT")
-            except Exception as e:
-                print(f"Error actualizando columna foto de prenda: {e}")
-            conn.commit()
-    finally:
-        conn.close()
+# Autenticación: cada token se verifica una vez y su payload queda en memoria hasta que expira
+token_verifier = TokenVerifier(app.config['SECRET_KEY'], JWT_ALGORITHM, max_entries=AUTH_TOKEN_CACHE_SIZE)
 
 
-def ensure_wishlist_table():
-    """Crea la tabla lista_deseos si no existe"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS lista_deseos (
-                    id_lista_deseos INT AUTO_INCREMENT PRIMARY KEY,
-                    id_usuario INT NOT NULL,
-                    id_publicacion INT NOT NULL,
-                    fecha_agregado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario) ON DELETE CASCADE,
-                    FOREIGN KEY (id_publicacion) REFERENCES publicacion(id_publicacion) ON DELETE CASCADE,
-                    UNIQUE KEY unique_wishlist (id_usuario, id_publicacion)
-                )
-            """)
-            conn.commit()
-            print("Tabla lista_deseos creada/verificada correctamente")
-    except Exception as e:
-        print(f"Error creando tabla lista_deseos: {e}")
-    finally:
-        conn.close()
+def authenticate():
+    """Valida el encabezado Authorization y deja el usuario en `g.user`"""
+    payload = token_verifier.from_header(request.headers.get('Authorization', ''))
+    g.user = {'id_usuario': payload.get('sub'), 'name': payload.get('name'), 'payload': payload}
+    return g.user
 
 
-def generate_code(length=6):
-    return ''.join(random.choices('0123456789', k=length))
+def auth_error_response(error):
+    body = {'error': error.message}
+    if error.detail:
+        body['detail'] = error.detail
+    return jsonify(body), error.status
+
+
+def login_required(f):
+    """Decorador para rutas que requieren un usuario autenticado (disponible en `g.user`)"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            authenticate()
+        except AuthError as e:
+            return auth_error_response(e)
+        return f(*args, **kwargs)
+    return decorated
+
+
+def login_optional(f):
+    """Decorador para rutas públicas que cambian si hay sesión; `g.user` es None sin token válido"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        try:
+            authenticate()
+        except AuthError:
+            g.user = None
+        return f(*args, **kwargs)
+    return decorated
+
+
+def get_user_role(user_id):
+    """Rol del usuario con caché corta; se invalida con la etiqueta `usuario:{id}`"""
+    def load():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT rol FROM usuario WHERE id_usuario = %s', (user_id,))
+                row = cur.fetchone()
+                return row['rol'] if row else None
+        finally:
+            conn.close()
+    return cache.get_or_set(f'rol:{user_id}', load, ttl=ROLE_CACHE_TTL, tags=[f'usuario:{user_id}'])
+
+
+# bcrypt corre en un pool propio para no bloquear el resto de las peticiones
+password_hasher = PasswordHasher(rounds=BCRYPT_ROUNDS, workers=PASSWORD_WORKERS, max_queue=PASSWORD_QUEUE_LIMIT,
+                                 timeout=PASSWORD_TIMEOUT)
+
+
+@app.errorhandler(UploadRejected)
+def handle_upload_rejected(e):
+    print(f"[WARN] Subida rechazada: {e.message}")
+    return jsonify({'error': e.message}), e.status
+
+
+@app.errorhandler(UploadSessionError)
+def handle_upload_session_error(e):
+    body = {'error': e.message}
+    if e.offset is not None:
+        body['offset'] = e.offset
+    return jsonify(body), e.status
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def handle_request_too_large(e):
+    return jsonify({'error': 'La petición supera el tamaño máximo permitido'}), 413
+
 
+@app.errorhandler(PasswordPoolBusy)
+def handle_password_pool_busy(e):
+    print(f"[WARN] Pool de contraseñas saturado: {e}")
+    response = jsonify({'error': 'Servidor ocupado, intenta de nuevo en unos segundos'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
 
-def send_email(to_address, subject, body):
-    # Si no hay configuración SMTP, loggear y devolver False
-    if not SMTP_HOST or not SMTP_USER or not SMTP_PASSWORD:
-        print(f"SMTP no configurado. Código/email para {to_address}:\n{body}")
-        return False
+
+# Correos salientes: las rutas encolan y un hilo de fondo envía con una sesión SMTP reutilizada
+email_outbox = create_outbox(get_db_connection, run_worker=EMAIL_WORKER_ENABLED)
+email_outbox.start()
+
+# Eventos en tiempo real (/api/events); con EVENTS_BACKEND=redis se comparten entre workers
+event_broker = create_broker(EVENTS_BACKEND, redis_url=EVENTS_REDIS_URL)
+event_broker.start()
+
+
+def publish_event(user_ids, event_type, data):
+    """Envía un evento a las conexiones SSE de los usuarios; nunca hace fallar la petición"""
     try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = SMTP_FROM
-        msg['To'] = to_address
-        msg.set_content(body)
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
+        event_broker.publish({int(u) for u in user_ids if u is not None}, event_type, app.json.dumps(data))
     except Exception as e:
-        print('Error enviando email:', e)
-        return False
+        print(f"[WARN] No se pudo publicar el evento {event_type}: {e}")
+
+
+def publish_transaction_event(cur, transaction_id):
+    """Avisa al comprador y al vendedor el estado actual de una transacción"""
+    cur.execute('''
+        SELECT t.id_transaccion, t.id_publicacion, t.estado, t.id_comprador, p.id_usuario AS id_vendedor
+        FROM transaccion t
+        JOIN publicacion p ON t.id_publicacion = p.id_publicacion
+        WHERE t.id_transaccion = %s
+    ''', (transaction_id,))
+    row = cur.fetchone()
+    if row:
+        publish_event([row['id_comprador'], row['id_vendedor']], 'transaction', row)
+
+
+# Recolector de archivos huérfanos dentro del proceso (desactivado por defecto; ver gc_uploads.py)
+gc_uploads.start_periodic(get_db_connection, UPLOADS_GC_INTERVAL_HOURS, app.config['UPLOAD_FOLDER'])
+archive_messages.start_periodic(get_db_connection, MESSAGES_ARCHIVE_INTERVAL_HOURS)
+
+
+def generate_code(length=6):
+    return ''.join(random.choices('0123456789', k=length))
 
 
 @app.route('/api/contact', methods=['POST'])
@@ -213,9 +509,9 @@ def contact():
     # Destino fijo
     target = 'styleInfinite90@gmail.com'
 
-    sent = send_email(target, subject, body)
+    sent = email_outbox.enqueue(target, subject, body)
     if not sent:
-        # Si no se pudo enviar por SMTP, devolver éxito simulando (pero loggear)
+        # Si no se pudo encolar por falta de SMTP, devolver éxito simulando (pero loggear)
         print('[WARN] No se pudo enviar correo de contacto por SMTP. Mensaje:')
         print(body)
         # Devolver 200 para no romper la UX en desarrollo, pero indicar advertencia
@@ -224,47 +520,11 @@ def contact():
     return jsonify({'ok': True, 'message': 'Mensaje enviado correctamente'}), 200
 
 
-def send_email_with_attachments(to_address, subject, body, attachments=None):
-    """Envía un correo y adjunta archivos. `attachments` es una lista de rutas absolutas a archivos."""
-    # Si no hay configuración SMTP, loggear y devolver False
-    if not SMTP_HOST or not SMTP_USER or not SMTP_PASSWORD:
-        print(f"SMTP no configurado. Email para {to_address}:\n{subject}\n{body}\nAdjuntos: {attachments}")
-        return False
-    try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = SMTP_FROM
-        msg['To'] = to_address
-        msg.set_content(body)
-
-        if attachments:
-            import mimetypes
-            for path in attachments:
-                try:
-                    ctype, encoding = mimetypes.guess_type(path)
-                    if ctype is None:
-                        ctype = 'application/octet-stream'
-                    maintype, subtype = ctype.split('/', 1)
-                    with open(path, 'rb') as f:
-                        file_data = f.read()
-                        filename = os.path.basename(path)
-                        msg.add_attachment(file_data, maintype=maintype, subtype=subtype, filename=filename)
-                except Exception as e:
-                    print(f"Error adjuntando archivo {path}: {e}")
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASSWORD)
-            server.send_message(msg)
-        return True
-    except Exception as e:
-        print('Error enviando email con adjuntos:', e)
-        return False
-
-
 @app.route('/api/register', methods=['POST'])
+@upload_limit(PHOTO_MAX_BYTES)
 def register():
-    data = request.json
+    # JSON o multipart (con la foto de perfil como archivo)
+    data = request.get_json(silent=True) or request.form.to_dict()
     # Campos requeridos mínimos
     required = ['correo_electronico', 'contrasena', '1_nombre', '1_apellido']
     if not all(k in data for k in required):
@@ -278,9 +538,11 @@ def register():
     second_last = data.get('2_apellido', '')
     talla = data.get('talla', '')
     fecha_nacimiento = data.get('fecha_nacimiento') or None
-    foto = data.get('foto', '')
+    foto, error = user_photo_from_request(data)
+    if error:
+        return jsonify({'error': error}), 400
 
-    hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed = password_hasher.hash(password)
 
     conn = get_db_connection()
     try:
@@ -300,10 +562,11 @@ def register():
                 "VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)"
             )
             cur.execute(sql, (first_name, second_name, last_name, second_last, email, hashed, talla, fecha_nacimiento, foto, 0, code, exp))
+            add_reference(cur, foto)
+            # Encolar el correo en la misma transacción que el alta
+            email_outbox.enqueue(email, 'Código de verificación', f'Tu código de verificación es: {code}', cur=cur)
             conn.commit()
-            
-            # Enviar correo una sola vez
-            send_email(email, 'Código de verificación', f'Tu código de verificación es: {code}')
+            email_outbox.notify()
             print(f"[DEBUG] Sent verification code to {email}: {code}")
             return jsonify({
                 'message': 'Usuario registrado correctamente. Se ha enviado un código de verificación a tu correo.', 
@@ -330,15 +593,13 @@ def login():
             if not user:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
             
-            # Manejar el hash de contraseña correctamente
             stored_password = user['contrasena']
-            if isinstance(stored_password, str):
-                stored_password = stored_password.encode('utf-8')
-            
             try:
-                # Intentar verificar la contraseña con bcrypt
-                if not bcrypt.checkpw(password.encode('utf-8'), stored_password):
+                # Verificar la contraseña con bcrypt (en el pool de contraseñas)
+                if not password_hasher.verify(password, stored_password):
                     return jsonify({'error': 'Contraseña inválida'}), 401
+            except PasswordPoolBusy:
+                raise
             except ValueError as e:
                 # Si el hash está corrupto, devolver error específico
                 print(f"[ERROR] Hash corrupto para usuario {email}: {e}")
@@ -348,6 +609,15 @@ def login():
                 print(f"[ERROR] Error de bcrypt para usuario {email}: {e}")
                 return jsonify({'error': 'Error de autenticación'}), 500
 
+            # Rehash transparente si el hash se generó con otro costo
+            if password_hasher.needs_rehash(stored_password):
+                try:
+                    cur.execute('UPDATE usuario SET contrasena=%s WHERE id_usuario=%s',
+                                (password_hasher.hash(password), user['id_usuario']))
+                    conn.commit()
+                except PasswordPoolBusy:
+                    pass  # se reintentará en el próximo inicio de sesión
+
             # Si el usuario no está verificado
             if not user.get('verified'):
                 # Verificar si ya tiene un código válido
@@ -359,8 +629,9 @@ def login():
                     code = generate_code()
                     exp = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
                     cur.execute('UPDATE usuario SET verification_code=%s, verification_exp=%s WHERE id_usuario=%s', (code, exp, user['id_usuario']))
+                    email_outbox.enqueue(email, 'Código de verificación', f'Tu código de verificación es: {code}', cur=cur)
                     conn.commit()
-                    send_email(email, 'Código de verificación', f'Tu código de verificación es: {code}')
+                    email_outbox.notify()
                     print(f"[DEBUG] Sent NEW verification code to {email}: {code}")
                 else:
                     print(f"[DEBUG] Using existing verification code for {email}")
@@ -391,21 +662,15 @@ def login():
 
 
 @app.route('/api/me')
+@login_optional
 def me():
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
+    if g.user is None:
         return jsonify({'logged_in': False}), 401
-    token = auth.split(' ', 1)[1]
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-    except Exception as e:
-        return jsonify({'logged_in': False, 'error': str(e)}), 401
-
-    user_id = payload.get('sub')
+    user_id = g.user['id_usuario']
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute('SELECT id_usuario, `1_nombre`, `2_nombre`, `1_apellido`, `2_apellido`, correo_electronico, rol, talla, fecha_nacimiento, foto FROM usuario WHERE id_usuario=%s', (user_id,))
+            cur.execute(f'SELECT id_usuario, `1_nombre`, `2_nombre`, `1_apellido`, `2_apellido`, correo_electronico, rol, talla, fecha_nacimiento, {USER_PHOTO_COLUMN} FROM usuario WHERE id_usuario=%s', (user_id,))
             user = cur.fetchone()
             if not user:
                 return jsonify({'logged_in': False}), 404
@@ -415,18 +680,18 @@ def me():
 
 
 @app.route('/api/profile', methods=['PUT'])
+@login_required
+@upload_limit(PHOTO_MAX_BYTES)
 def update_profile():
     # se espera Authorization Bearer <token>
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-    except Exception as e:
-        return jsonify({'error': 'Token inválido', 'detail': str(e)}), 401
-    user_id = payload.get('sub')
-    data = request.json or {}
+    user_id = g.user['id_usuario']
+    # JSON o multipart (con la foto de perfil como archivo)
+    data = request.get_json(silent=True) or request.form.to_dict()
+    foto, error = user_photo_from_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if foto is not None:
+        data['foto'] = foto
     # campos editables: 1_nombre, 2_nombre, 1_apellido, 2_apellido, talla, fecha_nacimiento, foto
     fields = ['1_nombre', '2_nombre', '1_apellido', '2_apellido', 'talla', 'fecha_nacimiento', 'foto']
     updates = {}
@@ -478,13 +743,18 @@ def update_profile():
         with conn.cursor() as cur:
             sql = f"UPDATE usuario SET {set_clause} WHERE id_usuario=%s"
             print(f"[DEBUG] Updating profile for user {user_id}, fields: {list(updates.keys())}")
-            # Para debug, mostrar el tamaño de la foto si se está actualizando
-            if 'foto' in updates and updates['foto']:
-                print(f"[DEBUG] Photo data length: {len(str(updates['foto']))}")
+            if 'foto' in updates:
+                cur.execute('SELECT foto FROM usuario WHERE id_usuario=%s', (user_id,))
+                previous = cur.fetchone()
+                if previous and previous['foto'] != updates['foto']:
+                    release_reference(cur, previous['foto'])
+                    add_reference(cur, updates['foto'])
             cur.execute(sql, values)
             conn.commit()
+            # El nombre del vendedor aparece en el catálogo
+            cache.invalidate_tags(f'usuario:{user_id}', 'publicaciones')
             print(f"[DEBUG] Profile updated successfully for user {user_id}")
-            return jsonify({'message': 'Perfil actualizado'}), 200
+            return jsonify({'message': 'Perfil actualizado', 'foto': updates.get('foto')}), 200
     except Exception as e:
         print(f"[ERROR] Error updating profile: {e}")
         raise
@@ -495,81 +765,77 @@ def update_profile():
 @app.route('/api/profile/<int:user_id>', methods=['GET'])
 def get_user_profile(user_id):
     """Obtener el perfil público de un usuario específico"""
-    conn = get_db_connection()
+    def load():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT id_usuario, `1_nombre`, `2_nombre`, `1_apellido`, `2_apellido`, 
+                           correo_electronico, talla, fecha_nacimiento, fecha_registro, {USER_PHOTO_COLUMN}
+                    FROM usuario 
+                    WHERE id_usuario = %s
+                """, (user_id,))
+                user = cur.fetchone()
+        finally:
+            conn.close()
+        if not user:
+            return None
+
+        # Convertir fechas a string de forma segura
+        fecha_nacimiento = None
+        fecha_registro = None
+
+        try:
+            if user.get('fecha_nacimiento'):
+                fn = user['fecha_nacimiento']
+                if hasattr(fn, 'isoformat'):  # datetime object
+                    fecha_nacimiento = fn.isoformat()
+                else:
+                    fecha_nacimiento = str(fn) if fn else None
+        except Exception as e:
+            print(f"[WARN] Error procesando fecha_nacimiento: {e}")
+
+        try:
+            if user.get('fecha_registro'):
+                fr = user['fecha_registro']
+                if hasattr(fr, 'isoformat'):  # datetime object
+                    fecha_registro = fr.isoformat()
+                else:
+                    fecha_registro = str(fr) if fr else None
+        except Exception as e:
+            print(f"[WARN] Error procesando fecha_registro: {e}")
+
+        # Construir respuesta
+        return {
+            'id_usuario': user.get('id_usuario'),
+            '1_nombre': user.get('1_nombre'),
+            '2_nombre': user.get('2_nombre'),
+            '1_apellido': user.get('1_apellido'),
+            '2_apellido': user.get('2_apellido'),
+            'correo_electronico': user.get('correo_electronico'),
+            'talla': user.get('talla'),
+            'fecha_nacimiento': fecha_nacimiento,
+            'fecha_registro': fecha_registro,
+            'foto': user.get('foto')
+        }
+
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT id_usuario, `1_nombre`, `2_nombre`, `1_apellido`, `2_apellido`, 
-                       correo_electronico, talla, fecha_nacimiento, fecha_registro, foto
-                FROM usuario 
-                WHERE id_usuario = %s
-            """, (user_id,))
-            
-            user = cur.fetchone()
-            if not user:
-                return jsonify({'error': 'Usuario no encontrado'}), 404
-            
-            # Convertir fechas a string de forma segura
-            fecha_nacimiento = None
-            fecha_registro = None
-            
-            try:
-                if user.get('fecha_nacimiento'):
-                    fn = user['fecha_nacimiento']
-                    if hasattr(fn, 'isoformat'):  # datetime object
-                        fecha_nacimiento = fn.isoformat()
-                    else:
-                        fecha_nacimiento = str(fn) if fn else None
-            except Exception as e:
-                print(f"[WARN] Error procesando fecha_nacimiento: {e}")
-                
-            try:
-                if user.get('fecha_registro'):
-                    fr = user['fecha_registro']
-                    if hasattr(fr, 'isoformat'):  # datetime object
-                        fecha_registro = fr.isoformat()
-                    else:
-                        fecha_registro = str(fr) if fr else None
-            except Exception as e:
-                print(f"[WARN] Error procesando fecha_registro: {e}")
-            
-            # Construir respuesta
-            user_data = {
-                'id_usuario': user.get('id_usuario'),
-                '1_nombre': user.get('1_nombre'),
-                '2_nombre': user.get('2_nombre'),
-                '1_apellido': user.get('1_apellido'),
-                '2_apellido': user.get('2_apellido'),
-                'correo_electronico': user.get('correo_electronico'),
-                'talla': user.get('talla'),
-                'fecha_nacimiento': fecha_nacimiento,
-                'fecha_registro': fecha_registro,
-                'foto': user.get('foto')
-            }
-            
-            return jsonify({'ok': True, 'data': user_data}), 200
-            
+        user_data = cache.get_or_set(f'perfil:{user_id}', load, tags=[f'usuario:{user_id}', 'usuarios'])
     except Exception as e:
         print(f"[ERROR] Error getting user profile: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': 'Error interno del servidor'}), 500
-    finally:
-        conn.close()
+    if user_data is None:
+        return jsonify({'error': 'Usuario no encontrado'}), 404
+    return jsonify({'ok': True, 'data': user_data}), 200
 
 
 @app.route('/api/password/change-auth', methods=['POST'])
+@login_required
 def password_change_auth():
     # Cambiar contraseña cuando el usuario está autenticado (se espera Authorization header)
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-    except Exception as e:
-        return jsonify({'error': 'Token inválido', 'detail': str(e)}), 401
-    user_id = payload.get('sub')
+    user_id = g.user['id_usuario']
     data = request.json or {}
     old_password = data.get('old_password')
     new_password = data.get('new_password')
@@ -582,9 +848,9 @@ def password_change_auth():
             user = cur.fetchone()
             if not user:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
-            if not bcrypt.checkpw(old_password.encode('utf-8'), user['contrasena'].encode('utf-8')):
+            if not password_hasher.verify(old_password, user['contrasena']):
                 return jsonify({'error': 'Contraseña actual incorrecta'}), 401
-            hashed = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed = password_hasher.hash(new_password)
             cur.execute('UPDATE usuario SET contrasena=%s WHERE id_usuario=%s', (hashed, user_id))
             conn.commit()
             return jsonify({'message': 'Contraseña cambiada'}), 200
@@ -645,8 +911,9 @@ def password_send_code():
             code = generate_code()
             exp = datetime.datetime.utcnow() + datetime.timedelta(minutes=10)
             cur.execute('UPDATE usuario SET verification_code=%s, verification_exp=%s WHERE id_usuario=%s', (code, exp, user['id_usuario']))
+            email_outbox.enqueue(correo, 'Código para cambiar contraseña', f'Tu código para cambiar contraseña es: {code}', cur=cur)
             conn.commit()
-            send_email(correo, 'Código para cambiar contraseña', f'Tu código para cambiar contraseña es: {code}')
+            email_outbox.notify()
             print(f"[DEBUG] Sent password code to {correo}: {code}")
             return jsonify({'message': 'Código enviado'}), 200
     finally:
@@ -672,7 +939,7 @@ def password_change():
                 return jsonify({'error': 'Código inválido'}), 400
             if user.get('verification_exp') and user.get('verification_exp') < datetime.datetime.utcnow():
                 return jsonify({'error': 'Código expirado'}), 400
-            hashed = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed = password_hasher.hash(new_password)
             cur.execute('UPDATE usuario SET contrasena=%s, verification_code=NULL, verification_exp=NULL WHERE id_usuario=%s', (hashed, user['id_usuario']))
             conn.commit()
             return jsonify({'message': 'Contraseña cambiada'}), 200
@@ -681,73 +948,297 @@ def password_change():
 
 
 # Rutas para publicaciones
+PUBLICATIONS_MAX_LIMIT = 100
+
+
+def encode_cursor(data):
+    """Codifica la posición de paginación como un cursor opaco"""
+    raw = json.dumps(data)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor opaco o lanza ValueError si no es válido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(data, dict):
+        raise ValueError('Cursor inválido')
+    return data
+
+
+def encode_publication_cursor(publication):
+    """Cursor con la posición (fecha_publicacion, id_publicacion) de la última fila entregada"""
+    fecha = publication.get('fecha_publicacion')
+    return encode_cursor({'f': str(fecha) if fecha is not None else None, 'id': publication['id_publicacion']})
+
+
+def publication_cursor_condition(after):
+    """Condición SQL (con ' AND ...') y parámetros para las filas posteriores al cursor.
+
+    Sigue el orden `fecha_publicacion DESC, id_publicacion DESC`, en el que MySQL deja las
+    fechas NULL al final: tras una fecha siguen las menores y luego todas las NULL; tras
+    una NULL solo siguen NULL con id menor."""
+    fecha, pub_id = after
+    if fecha is None:
+        return ' AND p.fecha_publicacion IS NULL AND p.id_publicacion < %s', [pub_id]
+    return (' AND (p.fecha_publicacion < %s OR (p.fecha_publicacion = %s AND p.id_publicacion < %s)'
+            ' OR p.fecha_publicacion IS NULL)', [fecha, fecha, pub_id])
+
+
+SEARCH_DOCUMENT_QUERY = '''
+    SELECT p.id_publicacion, p.descripcion, pr.nombre, pr.descripcion_prenda,
+           CONCAT_WS(' ', u.1_nombre, u.1_apellido) AS vendedor
+    FROM publicacion p
+    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion
+    JOIN usuario u ON p.id_usuario = u.id_usuario
+'''
+
+
+def load_search_documents():
+    """Carga todas las publicaciones para construir el índice de búsqueda"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(SEARCH_DOCUMENT_QUERY)
+            return [(row['id_publicacion'], row) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+search_index = SearchIndex(load_search_documents, refresh_seconds=SEARCH_INDEX_REFRESH_SECONDS)
+
+
+def index_publication(cur, pub_id):
+    """Actualiza la entrada de una publicación en el índice de búsqueda"""
+    cur.execute(SEARCH_DOCUMENT_QUERY + ' WHERE p.id_publicacion = %s', (pub_id,))
+    row = cur.fetchone()
+    if row:
+        search_index.upsert(pub_id, row)
+    else:
+        search_index.remove(pub_id)
+
+
+def build_publication_filters(filters, ranked_ids=None):
+    """Condiciones SQL (con ' AND ...') y parámetros para los filtros del catálogo"""
+    conditions = ''
+    params = []
+    if 'talla' in filters:
+        conditions += ' AND pr.talla = %s'
+        params.append(filters['talla'])
+    if 'estado' in filters:
+        conditions += ' AND p.estado = %s'
+        params.append(filters['estado'])
+    if 'tipo_publicacion' in filters:
+        conditions += ' AND p.tipo_publicacion = %s'
+        params.append(filters['tipo_publicacion'])
+    if 'valor_min' in filters:
+        conditions += ' AND pr.valor >= %s'
+        params.append(float(filters['valor_min']))
+    if 'valor_max' in filters:
+        conditions += ' AND pr.valor <= %s'
+        params.append(float(filters['valor_max']))
+    if ranked_ids is not None:
+        conditions += ' AND p.id_publicacion IN (' + ', '.join(['%s'] * len(ranked_ids)) + ')'
+        params.extend(ranked_ids)
+    return conditions, params
+
+
+def order_by_rank(rows, ranked_ids):
+    """Ordena filas de publicaciones según la posición de su id en el resultado de búsqueda"""
+    position = {pub_id: i for i, pub_id in enumerate(ranked_ids)}
+    return sorted(rows, key=lambda row: position[row['id_publicacion']])
+
+
 @app.route('/api/publications', methods=['GET'])
 def get_publications():
     filters = request.args.to_dict()
-    
+    search = filters.get('q', '').strip()
+
+    # Paginación por cursor opcional: sin `limit` se mantiene la lista completa.
+    # Sin búsqueda el cursor es keyset (fecha, id); con búsqueda es la posición en el ranking.
+    paginated = 'limit' in filters or 'cursor' in filters
+    limit = None
+    after = None
+    offset = 0
+    if paginated:
+        try:
+            limit = min(max(int(filters.get('limit', 20)), 1), PUBLICATIONS_MAX_LIMIT)
+            if filters.get('cursor'):
+                position = decode_cursor(filters['cursor'])
+                if search:
+                    offset = int(position['o'])
+                else:
+                    after = (position['f'], int(position['id']))
+        except (ValueError, KeyError, TypeError):
+            return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
+
+    def query():
+        ranked_ids = None
+        if search:
+            ranked_ids = search_index.search(search)
+            if not ranked_ids:
+                return {'items': [], 'next_cursor': None} if paginated else []
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                query = '''
+                    SELECT p.*, pr.nombre, pr.descripcion_prenda, pr.talla, pr.foto, pr.valor,
+                           u.1_nombre, u.2_nombre, u.1_apellido, u.2_apellido
+                    FROM publicacion p
+                    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion
+                    JOIN usuario u ON p.id_usuario = u.id_usuario
+                    WHERE 1=1
+                '''
+                conditions, params = build_publication_filters(filters, ranked_ids)
+                query += conditions
+
+                if ranked_ids is not None:
+                    # Búsqueda: ordenar por relevancia
+                    cur.execute(query, params)
+                    publications = order_by_rank(cur.fetchall(), ranked_ids)
+                    if not paginated:
+                        return publications
+                    page = publications[offset:offset + limit]
+                    next_cursor = encode_cursor({'o': offset + limit}) if len(publications) > offset + limit else None
+                    return {'items': page, 'next_cursor': next_cursor}
+
+                if after:
+                    condition, condition_params = publication_cursor_condition(after)
+                    query += condition
+                    params.extend(condition_params)
+                    
+                query += ' ORDER BY p.fecha_publicacion DESC, p.id_publicacion DESC'
+                if paginated:
+                    # Pedir una fila extra para saber si existe una página siguiente
+                    query += ' LIMIT %s'
+                    params.append(limit + 1)
+                
+                cur.execute(query, params)
+                publications = cur.fetchall()
+                if not paginated:
+                    return publications
+
+                next_cursor = None
+                if len(publications) > limit:
+                    publications = publications[:limit]
+                    next_cursor = encode_publication_cursor(publications[-1])
+                return {'items': publications, 'next_cursor': next_cursor}
+        finally:
+            conn.close()
+
+    def load():
+        result = query()
+        add_photo_variants(result['items'] if paginated else result)
+        return result
+
+    cache_key = 'publicaciones:' + urlencode(sorted(filters.items()))
+    return jsonify(cache.get_or_set(cache_key, load, tags=['publicaciones']))
+
+
+# Rangos de precio para las facetas: [0, 20000), [20000, 50000), ... [200000, ∞)
+PRICE_BUCKET_EDGES = [20000, 50000, 100000, 200000]
+FACET_FILTER_KEYS = ('talla', 'estado', 'tipo_publicacion', 'valor_min', 'valor_max', 'q')
+
+
+def invalidate_publication_caches(pub_id=None):
+    """Invalida los datos derivados del catálogo tras crear, editar o eliminar publicaciones"""
+    if pub_id is not None:
+        cache.invalidate_tags('publicaciones', f'publicacion:{pub_id}')
+    else:
+        cache.invalidate_tags('publicaciones')
+
+
+def price_bucket_label(index):
+    low = PRICE_BUCKET_EDGES[index - 1] if index > 0 else 0
+    if index >= len(PRICE_BUCKET_EDGES):
+        return f"{low}+"
+    return f"{low}-{PRICE_BUCKET_EDGES[index]}"
+
+
+def compute_facets(filters):
+    ranked_ids = None
+    search = filters.get('q', '').strip()
+    if search:
+        ranked_ids = search_index.search(search)
+    facets = {'total': 0, 'talla': {}, 'tipo_publicacion': {}, 'estado': {}, 'rango_valor': {}}
+    if ranked_ids == []:
+        return facets
+
+    bucket_expr = 'CASE ' + ' '.join(
+        f'WHEN pr.valor < {edge} THEN {i}' for i, edge in enumerate(PRICE_BUCKET_EDGES)
+    ) + f' ELSE {len(PRICE_BUCKET_EDGES)} END'
+    conditions, params = build_publication_filters(filters, ranked_ids)
+
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            query = '''
-                SELECT p.*, pr.nombre, pr.descripcion_prenda, pr.talla, pr.foto, pr.valor,
-                       u.1_nombre, u.2_nombre, u.1_apellido, u.2_apellido
+            # Una sola pasada agrupada; los totales por faceta se acumulan en memoria
+            cur.execute(f"""
+                SELECT pr.talla, p.tipo_publicacion, p.estado, {bucket_expr} AS rango, COUNT(*) AS total
                 FROM publicacion p
                 JOIN prenda pr ON p.id_publicacion = pr.id_publicacion
-                JOIN usuario u ON p.id_usuario = u.id_usuario
-                WHERE 1=1
-            '''
-            params = []
-            
-            if 'talla' in filters:
-                query += ' AND pr.talla = %s'
-                params.append(filters['talla'])
-            if 'estado' in filters:
-                query += ' AND p.estado = %s'
-                params.append(filters['estado'])
-            if 'tipo_publicacion' in filters:
-                query += ' AND p.tipo_publicacion = %s'
-                params.append(filters['tipo_publicacion'])
-            if 'valor_min' in filters:
-                query += ' AND pr.valor >= %s'
-                params.append(float(filters['valor_min']))
-            if 'valor_max' in filters:
-                query += ' AND pr.valor <= %s'
-                params.append(float(filters['valor_max']))
-                
-            query += ' ORDER BY p.fecha_publicacion DESC'
-            
-            cur.execute(query, params)
-            publications = cur.fetchall()
-            return jsonify(publications)
+                WHERE 1=1 {conditions}
+                GROUP BY pr.talla, p.tipo_publicacion, p.estado, rango
+            """, params)
+            rows = cur.fetchall()
     finally:
         conn.close()
 
+    for row in rows:
+        count = int(row['total'])
+        facets['total'] += count
+        for key in ('talla', 'tipo_publicacion', 'estado'):
+            value = row[key] if row[key] is not None else ''
+            facets[key][value] = facets[key].get(value, 0) + count
+        if row['rango'] is not None:
+            label = price_bucket_label(int(row['rango']))
+            facets['rango_valor'][label] = facets['rango_valor'].get(label, 0) + count
+    return facets
+
+
+@app.route('/api/publications/facets', methods=['GET'])
+def get_publication_facets():
+    """Conteos por talla, tipo, estado y rango de precio para los filtros actuales"""
+    filters = {k: v for k, v in request.args.items() if k in FACET_FILTER_KEYS}
+    try:
+        for key in ('valor_min', 'valor_max'):
+            if key in filters:
+                float(filters[key])
+    except ValueError:
+        return jsonify({'error': 'Filtro de valor inválido'}), 400
+
+    cache_key = 'facetas:' + urlencode(sorted(filters.items()))
+    facets = cache.get_or_set(cache_key, lambda: compute_facets(filters), ttl=FACETS_CACHE_TTL,
+                              tags=['publicaciones'])
+    return jsonify(facets)
+
 @app.route('/api/publications', methods=['POST'])
+@login_required
+@upload_limit(PHOTO_MAX_BYTES)
 def create_publication():
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
-    
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-    except:
-        return jsonify({'error': 'Token inválido'}), 401
-        
-    user_id = payload.get('sub')
+    user_id = g.user['id_usuario']
 
-    # Verificar si hay archivo de imagen
-    if 'foto' not in request.files:
-        return jsonify({'error': 'No se proporcionó imagen'}), 400
-        
-    foto = request.files['foto']
-    if foto.filename == '':
-        return jsonify({'error': 'No se seleccionó archivo'}), 400
-        
-    # Guardar imagen
-    filename = save_uploaded_file(foto)
-    if not filename:
-        return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        # Foto subida antes por partes (/api/uploads)
+        stored = chunked_uploads.resolve(upload_id, user_id, 'photo')
+    else:
+        # Verificar si hay archivo de imagen
+        if 'foto' not in request.files:
+            return jsonify({'error': 'No se proporcionó imagen'}), 400
+
+        foto = request.files['foto']
+        if foto.filename == '':
+            return jsonify({'error': 'No se seleccionó archivo'}), 400
+
+        # Guardar imagen
+        stored = save_uploaded_file(foto)
+        if not stored:
+            return jsonify({'error': 'Tipo de archivo no permitido'}), 400
         
     # Obtener resto de datos del form
     data = request.form
@@ -767,14 +1258,19 @@ def create_publication():
             publication_id = cur.lastrowid
             
             # Crear prenda con la URL de la imagen
-            foto_url = f"/uploads/{filename}"
+            foto_url = stored.url
             cur.execute('''
                 INSERT INTO prenda (nombre, descripcion_prenda, talla, foto, valor, id_publicacion)
                 VALUES (%s, %s, %s, %s, %s, %s)
             ''', (data['nombre'], data['descripcion_prenda'], data['talla'], 
                   foto_url, data['valor'], publication_id))
+            add_reference(cur, foto_url, stored.size)
             
             conn.commit()
+            if upload_id:
+                chunked_uploads.discard(upload_id)
+            index_publication(cur, publication_id)
+            invalidate_publication_caches()
             return jsonify({
                 'message': 'Publicación creada exitosamente',
                 'publication_id': publication_id
@@ -782,18 +1278,67 @@ def create_publication():
     finally:
         conn.close()
 
+@app.route('/api/publications/<int:pub_id>', methods=['GET'])
+def get_publication(pub_id):
+    """Obtener una publicación con su prenda, resumen del vendedor y promedio de valoraciones"""
+    def load():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('''
+                    SELECT p.*, pr.nombre, pr.descripcion_prenda, pr.talla, pr.foto, pr.valor,
+                           u.1_nombre, u.2_nombre, u.1_apellido, u.2_apellido,
+                           (SELECT AVG(v.puntaje) FROM valoracion v
+                             WHERE v.usuario_valorado_id = p.id_usuario) AS promedio_valoracion,
+                           (SELECT COUNT(*) FROM valoracion v
+                             WHERE v.usuario_valorado_id = p.id_usuario) AS total_valoraciones
+                    FROM publicacion p
+                    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion
+                    JOIN usuario u ON p.id_usuario = u.id_usuario
+                    WHERE p.id_publicacion = %s
+                ''', (pub_id,))
+                publication = cur.fetchone()
+        finally:
+            conn.close()
+        if not publication:
+            return None
+
+        promedio = publication.pop('promedio_valoracion')
+        publication['vendedor'] = {
+            'id_usuario': publication['id_usuario'],
+            'nombre': f"{publication.get('1_nombre') or ''} {publication.get('1_apellido') or ''}".strip(),
+            'promedio_valoracion': round(float(promedio), 2) if promedio is not None else None,
+            'total_valoraciones': int(publication.pop('total_valoraciones') or 0),
+        }
+        add_photo_variants([publication])
+        return publication
+
+    found, publication = cache.get(f'publicacion:{pub_id}')
+    if not found:
+        # Las etiquetas dependen del vendedor, que no cambia: se lee antes para que get_or_set
+        # tome las versiones de `usuario:{id}` y `valoraciones:{id}` antes de la consulta completa
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT id_usuario FROM publicacion WHERE id_publicacion = %s', (pub_id,))
+                owner = cur.fetchone()
+        finally:
+            conn.close()
+        if not owner:
+            return jsonify({'error': 'Publicación no encontrada'}), 404
+        seller_id = owner['id_usuario']
+        publication = cache.get_or_set(
+            f'publicacion:{pub_id}', load,
+            tags=[f'publicacion:{pub_id}', f'usuario:{seller_id}', f'valoraciones:{seller_id}'])
+        if publication is None:
+            return jsonify({'error': 'Publicación no encontrada'}), 404
+    return jsonify(publication)
+
 @app.route('/api/publications/<int:pub_id>', methods=['PUT', 'DELETE'])
+@login_required
+@upload_limit(PHOTO_MAX_BYTES)
 def manage_publication(pub_id):
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
-    
-    try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
-    except:
-        return jsonify({'error': 'Token inválido'}), 401
+    user_id = g.user['id_usuario']
     
     conn = get_db_connection()
     try:
@@ -805,9 +1350,12 @@ def manage_publication(pub_id):
                 return jsonify({'error': 'Publicación no encontrada o no autorizada'}), 404
             
             if request.method == 'DELETE':
+                release_publication_files(cur, pub_id)
                 cur.execute('DELETE FROM prenda WHERE id_publicacion = %s', (pub_id,))
                 cur.execute('DELETE FROM publicacion WHERE id_publicacion = %s', (pub_id,))
                 conn.commit()
+                search_index.remove(pub_id)
+                invalidate_publication_caches(pub_id)
                 return jsonify({'message': 'Publicación eliminada exitosamente'})
             else:
                 # Obtener datos del formulario
@@ -817,14 +1365,17 @@ def manage_publication(pub_id):
                 
                 # Manejar imagen si se proporciona
                 foto_url = None
-                if 'foto' in request.files:
+                if data.get('upload_id'):
+                    # Foto subida antes por partes (/api/uploads)
+                    stored = chunked_uploads.resolve(data['upload_id'], user_id, 'photo')
+                    foto_url = stored.url
+                elif 'foto' in request.files:
                     foto = request.files['foto']
                     print(f"[DEBUG] Archivo foto recibido: {foto.filename}")
                     if foto.filename != '':
-                        filename = save_uploaded_file(foto)
-                        print(f"[DEBUG] Archivo guardado como: {filename}")
-                        if filename:
-                            foto_url = f"/uploads/{filename}"
+                        stored = save_uploaded_file(foto)
+                        if stored:
+                            foto_url = stored.url
                             print(f"[DEBUG] URL de la foto: {foto_url}")
                 else:
                     print("[DEBUG] No se encontró archivo 'foto' en request.files")
@@ -859,9 +1410,14 @@ def manage_publication(pub_id):
                     print(f"[DEBUG] Estado recibido pero columna no existe: {data['estado']}")
                     # prenda_updates['estado'] = data['estado'].strip()
                 
-                # Agregar foto si se actualizó
+                # Agregar foto si se actualizó, moviendo la referencia del archivo anterior
                 if foto_url:
                     prenda_updates['foto'] = foto_url
+                    cur.execute('SELECT foto FROM prenda WHERE id_publicacion = %s', (pub_id,))
+                    previous = cur.fetchone()
+                    if previous and previous['foto'] != foto_url:
+                        release_reference(cur, previous['foto'])
+                        add_reference(cur, foto_url, stored.size)
                 
                 if prenda_updates:
                     set_clause = ', '.join(f'{k} = %s' for k in prenda_updates.keys())
@@ -870,6 +1426,10 @@ def manage_publication(pub_id):
                     cur.execute(f'UPDATE prenda SET {set_clause} WHERE id_publicacion = %s', values)
                 
                 conn.commit()
+                if data.get('upload_id'):
+                    chunked_uploads.discard(data['upload_id'])
+                index_publication(cur, pub_id)
+                invalidate_publication_caches(pub_id)
                 
                 # Obtener los datos actualizados para confirmar
                 cur.execute('''
@@ -890,32 +1450,28 @@ def manage_publication(pub_id):
 @app.route('/api/valoraciones/<int:user_id>', methods=['POST', 'GET'])
 def valoraciones(user_id):
     if request.method == 'GET':
-        conn = get_db_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute('''
-                    SELECT v.*, u.`1_nombre` as valorador_nombre, u.`1_apellido` as valorador_apellido
-                    FROM valoracion v
-                    JOIN usuario u ON v.usuario_valorador_id = u.id_usuario
-                    WHERE v.usuario_valorado_id = %s
-                    ORDER BY v.fecha_valoracion DESC
-                ''', (user_id,))
-                valoraciones = cur.fetchall()
-                # Devolver directamente la lista de valoraciones (frontend espera un array)
-                return jsonify(valoraciones)
-        finally:
-            conn.close()
+        def load():
+            conn = get_db_connection()
+            try:
+                with conn.cursor() as cur:
+                    cur.execute('''
+                        SELECT v.*, u.`1_nombre` as valorador_nombre, u.`1_apellido` as valorador_apellido
+                        FROM valoracion v
+                        JOIN usuario u ON v.usuario_valorador_id = u.id_usuario
+                        WHERE v.usuario_valorado_id = %s
+                        ORDER BY v.fecha_valoracion DESC
+                    ''', (user_id,))
+                    return cur.fetchall()
+            finally:
+                conn.close()
+        # Devolver directamente la lista de valoraciones (frontend espera un array)
+        return jsonify(cache.get_or_set(f'valoraciones:{user_id}', load,
+                                        tags=[f'valoraciones:{user_id}', 'valoraciones']))
     else:
-        auth = request.headers.get('Authorization', '')
-        if not auth.startswith('Bearer '):
-            return jsonify({'error': 'No autorizado'}), 401
-        token = auth.split(' ', 1)[1]
-        
         try:
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-            evaluador_id = payload.get('sub')
-        except:
-            return jsonify({'error': 'Token inválido'}), 401
+            evaluador_id = authenticate()['id_usuario']
+        except AuthError as e:
+            return auth_error_response(e)
             
         data = request.json
         if not data or 'puntaje' not in data:
@@ -947,6 +1503,7 @@ def valoraciones(user_id):
                         print(f"[WARN] Error marcando transacción como calificada: {e}")
                 
                 conn.commit()
+                cache.invalidate_tags(f'valoraciones:{user_id}')
                 return jsonify({'message': 'Valoración registrada exitosamente'})
         finally:
             conn.close()
@@ -954,16 +1511,12 @@ def valoraciones(user_id):
 # ===== RUTAS PARA LISTA DE DESEOS =====
 
 @app.route('/api/wishlist', methods=['GET'])
+@login_required
 def get_wishlist():
     """Obtiene la lista de deseos del usuario autenticado"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -980,6 +1533,7 @@ def get_wishlist():
                 ORDER BY ld.fecha_agregado DESC
             ''', (user_id,))
             wishlist = cur.fetchall()
+            set_last_modified(wishlist, 'fecha_agregado')
             return jsonify(wishlist)
     except Exception as e:
         return jsonify({'error': 'Error de autorización', 'detail': str(e)}), 401
@@ -987,16 +1541,12 @@ def get_wishlist():
         conn.close()
 
 @app.route('/api/wishlist/<int:publication_id>', methods=['POST'])
+@login_required
 def add_to_wishlist(publication_id):
     """Agrega una publicación a la lista de deseos"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -1016,6 +1566,7 @@ def add_to_wishlist(publication_id):
                     VALUES (%s, %s)
                 ''', (user_id, publication_id))
                 conn.commit()
+                cache.invalidate_tags(f'wishlist:{user_id}')
                 return jsonify({'message': 'Agregado a la lista de deseos', 'added': True})
             except pymysql.IntegrityError:
                 # Ya existe en la lista de deseos
@@ -1026,16 +1577,12 @@ def add_to_wishlist(publication_id):
         conn.close()
 
 @app.route('/api/wishlist/<int:publication_id>', methods=['DELETE'])
+@login_required
 def remove_from_wishlist(publication_id):
     """Elimina una publicación de la lista de deseos"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -1046,6 +1593,7 @@ def remove_from_wishlist(publication_id):
             
             if cur.rowcount > 0:
                 conn.commit()
+                cache.invalidate_tags(f'wishlist:{user_id}')
                 return jsonify({'message': 'Eliminado de la lista de deseos', 'removed': True})
             else:
                 return jsonify({'error': 'No se encontró en la lista de deseos'}), 404
@@ -1054,30 +1602,50 @@ def remove_from_wishlist(publication_id):
     finally:
         conn.close()
 
+def get_wishlist_ids(user_id):
+    """Ids de publicaciones en la lista de deseos del usuario (en caché hasta que cambie)"""
+    def load():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT id_publicacion FROM lista_deseos WHERE id_usuario = %s', (user_id,))
+                return sorted(row['id_publicacion'] for row in cur.fetchall())
+        finally:
+            conn.close()
+    return cache.get_or_set(f'wishlist_ids:{user_id}', load, tags=[f'wishlist:{user_id}'])
+
+
 @app.route('/api/wishlist/check/<int:publication_id>', methods=['GET'])
+@login_optional
 def check_wishlist_status(publication_id):
     """Verifica si una publicación está en la lista de deseos del usuario"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
+    if g.user is None:
         return jsonify({'in_wishlist': False})  # Si no está autenticado, no está en wishlist
-    token = auth.split(' ', 1)[1]
-    
+    return jsonify({'in_wishlist': publication_id in get_wishlist_ids(g.user['id_usuario'])})
+
+@app.route('/api/wishlist/ids', methods=['GET'])
+@login_optional
+def get_wishlist_id_set():
+    """Devuelve todos los ids de publicaciones en la lista de deseos del usuario"""
+    if g.user is None:
+        return jsonify({'ids': []})  # Si no está autenticado, la lista está vacía
+    return jsonify({'ids': get_wishlist_ids(g.user['id_usuario'])})
+
+@app.route('/api/wishlist/check', methods=['POST'])
+@login_optional
+def check_wishlist_batch():
+    """Verifica en una sola petición qué publicaciones de una lista están en la lista de deseos"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list) or len(ids) > 500:
+        return jsonify({'error': 'Se requiere una lista "ids" (máx. 500)'}), 400
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
-        
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-            cur.execute('''
-                SELECT id_lista_deseos FROM lista_deseos 
-                WHERE id_usuario = %s AND id_publicacion = %s
-            ''', (user_id, publication_id))
-            result = cur.fetchone()
-            return jsonify({'in_wishlist': result is not None})
-    except Exception:
-        return jsonify({'in_wishlist': False})
-    finally:
-        conn.close()
+        ids = [int(pub_id) for pub_id in ids]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Ids inválidos'}), 400
+
+    wishlist = set(get_wishlist_ids(g.user['id_usuario'])) if g.user else set()
+    return jsonify({'in_wishlist': {str(pub_id): pub_id in wishlist for pub_id in ids}})
 
 @app.route('/api/admin/clean-corrupt-users', methods=['POST'])
 def clean_corrupt_users():
@@ -1105,6 +1673,7 @@ def clean_corrupt_users():
             deleted_count = 0
             for user in corrupt_users:
                 try:
+                    release_user_files(cur, user['id_usuario'])
                     # Eliminar publicaciones del usuario
                     cur.execute('DELETE FROM publicacion WHERE id_usuario = %s', (user['id_usuario'],))
                     # Eliminar wishlist del usuario
@@ -1116,6 +1685,9 @@ def clean_corrupt_users():
                     print(f"Error eliminando usuario {user['correo_electronico']}: {e}")
             
             conn.commit()
+            if deleted_count:
+                cache.invalidate_tags('usuarios', 'publicaciones', 'valoraciones')
+                search_index.invalidate()
             
             return jsonify({
                 'success': True, 
@@ -1133,35 +1705,50 @@ def clean_corrupt_users():
 # =====================================================
 
 def admin_required(f):
-    """Decorador para verificar permisos de administrador"""
+    """Decorador para verificar permisos de administrador (rol en caché, sin abrir conexión por petición)"""
+    @wraps(f)
+    @login_required
     def decorated(*args, **kwargs):
-        auth = request.headers.get('Authorization', '')
-        if not auth.startswith('Bearer '):
-            return jsonify({'error': 'No autorizado'}), 401
-        
-        token = auth.split(' ', 1)[1]
-        try:
-            payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-            user_id = payload.get('sub')
-            
-            # Verificar que el usuario es administrador
-            conn = get_db_connection()
-            try:
-                with conn.cursor() as cur:
-                    cur.execute('SELECT rol FROM usuario WHERE id_usuario = %s', (user_id,))
-                    user = cur.fetchone()
-                    if not user or user['rol'] != 'Administrador':
-                        return jsonify({'error': 'Permisos insuficientes'}), 403
-            finally:
-                conn.close()
-                
-        except jwt.InvalidTokenError:
-            return jsonify({'error': 'Token inválido'}), 401
-        
+        if get_user_role(g.user['id_usuario']) != 'Administrador':
+            return jsonify({'error': 'Permisos insuficientes'}), 403
         return f(*args, **kwargs)
-    decorated.__name__ = f.__name__
     return decorated
 
+# ==================== SUBIDAS POR PARTES ====================
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def create_chunked_upload():
+    """Iniciar una subida reanudable: `{kind: photo|proof, size}`"""
+    data = request.get_json(silent=True) or {}
+    upload = chunked_uploads.create(g.user['id_usuario'], data.get('kind'), data.get('size'))
+    return jsonify(upload), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+@login_required
+def chunked_upload(upload_id):
+    """Consultar el offset (GET), enviar una parte con Content-Range (PUT) o cancelar (DELETE)"""
+    user_id = g.user['id_usuario']
+    if request.method == 'GET':
+        return jsonify(chunked_uploads.status(upload_id, user_id))
+    if request.method == 'DELETE':
+        chunked_uploads.status(upload_id, user_id)
+        chunked_uploads.discard(upload_id)
+        return jsonify({'message': 'Subida cancelada'})
+    upload = chunked_uploads.write(upload_id, user_id, request.stream, request.headers.get('Content-Range'),
+                                   request.content_length)
+    return jsonify(upload)
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def complete_chunked_upload(upload_id):
+    """Finalizar la subida: el `upload_id` queda listo para usarse en publicaciones o comprobantes"""
+    upload, stored = chunked_uploads.complete(upload_id, g.user['id_usuario'])
+    if upload['kind'] == 'photo':
+        images.generate_in_background(app.config['UPLOAD_FOLDER'], stored.path)
+    return jsonify(upload)
+
+
 # ==================== CRUD USUARIOS ====================
 
 @app.route('/api/admin/users', methods=['GET'])
@@ -1209,7 +1796,7 @@ def admin_get_users():
             query = f"""
                 SELECT id_usuario, 1_nombre, 2_nombre, 1_apellido, 2_apellido, 
                        correo_electronico, talla, fecha_nacimiento, rol, verified,
-                       foto
+                       {USER_PHOTO_COLUMN}
                 FROM usuario {where_clause}
                 ORDER BY id_usuario DESC
                 LIMIT %s OFFSET %s
@@ -1229,14 +1816,21 @@ def admin_get_users():
 
 @app.route('/api/admin/users', methods=['POST'])
 @admin_required
+@upload_limit(PHOTO_MAX_BYTES)
 def admin_create_user():
     """Crear nuevo usuario"""
-    data = request.json
+    # JSON o multipart (con la foto de perfil como archivo)
+    data = request.get_json(silent=True) or request.form.to_dict()
     required_fields = ['1_nombre', '1_apellido', 'correo_electronico', 'contrasena', 'rol']
     
     if not all(field in data for field in required_fields):
         return jsonify({'error': 'Faltan campos requeridos'}), 400
     
+    # La foto se guarda como archivo en uploads/, nunca como base64 en la tabla
+    foto, error = user_photo_from_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
@@ -1246,7 +1840,7 @@ def admin_create_user():
                 return jsonify({'error': 'El email ya está registrado'}), 400
             
             # Hash de contraseña
-            hashed_password = bcrypt.hashpw(data['contrasena'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            hashed_password = password_hasher.hash(data['contrasena'])
             
             # Insertar usuario
             cur.execute('''
@@ -1256,11 +1850,12 @@ def admin_create_user():
             ''', (
                 data['1_nombre'], data.get('2_nombre'), data['1_apellido'], data.get('2_apellido'),
                 data['correo_electronico'], hashed_password, data.get('talla'),
-                data.get('fecha_nacimiento'), data.get('foto'), data['rol'], 
+                data.get('fecha_nacimiento'), foto, data['rol'], 
                 data.get('verified', True)
             ))
             
             user_id = cur.lastrowid
+            add_reference(cur, foto)
             conn.commit()
             
             return jsonify({'message': 'Usuario creado exitosamente', 'user_id': user_id}), 201
@@ -1269,16 +1864,24 @@ def admin_create_user():
 
 @app.route('/api/admin/users/<int:user_id>', methods=['PUT'])
 @admin_required
+@upload_limit(PHOTO_MAX_BYTES)
 def admin_update_user(user_id):
     """Actualizar usuario existente"""
-    data = request.json
+    # JSON o multipart (con la foto de perfil como archivo)
+    data = request.get_json(silent=True) or request.form.to_dict()
+    foto, error = user_photo_from_request(data)
+    if error:
+        return jsonify({'error': error}), 400
+    if foto is not None:
+        data['foto'] = foto
     
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
             # Verificar que el usuario existe
-            cur.execute('SELECT id_usuario FROM usuario WHERE id_usuario = %s', (user_id,))
-            if not cur.fetchone():
+            cur.execute('SELECT id_usuario, foto FROM usuario WHERE id_usuario = %s', (user_id,))
+            previous = cur.fetchone()
+            if not previous:
                 return jsonify({'error': 'Usuario no encontrado'}), 404
             
             # Construir query de actualización dinámicamente
@@ -1295,17 +1898,22 @@ def admin_update_user(user_id):
             
             # Hash de nueva contraseña si se proporciona
             if 'contrasena' in data and data['contrasena']:
-                hashed_password = bcrypt.hashpw(data['contrasena'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+                hashed_password = password_hasher.hash(data['contrasena'])
                 update_fields.append("contrasena = %s")
                 params.append(hashed_password)
             
             if not update_fields:
                 return jsonify({'error': 'No hay campos para actualizar'}), 400
             
+            if 'foto' in data and previous['foto'] != data['foto']:
+                release_reference(cur, previous['foto'])
+                add_reference(cur, data['foto'])
+            
             params.append(user_id)
             query = f"UPDATE usuario SET {', '.join(update_fields)} WHERE id_usuario = %s"
             cur.execute(query, params)
             conn.commit()
+            cache.invalidate_tags(f'usuario:{user_id}', 'publicaciones')
             
             return jsonify({'message': 'Usuario actualizado exitosamente'})
     finally:
@@ -1332,8 +1940,12 @@ def admin_delete_user(user_id):
                     return jsonify({'error': 'No se puede eliminar el último administrador'}), 400
             
             # Eliminar usuario (las FK con CASCADE se encargan de las dependencias)
+            release_user_files(cur, user_id)
             cur.execute('DELETE FROM usuario WHERE id_usuario = %s', (user_id,))
             conn.commit()
+            # Sus publicaciones y valoraciones se eliminan en cascada
+            cache.invalidate_tags(f'usuario:{user_id}', 'publicaciones', 'valoraciones')
+            search_index.invalidate()
             
             return jsonify({'message': 'Usuario eliminado exitosamente'})
     finally:
@@ -1347,11 +1959,18 @@ def admin_get_publications():
     """Obtener todas las publicaciones con información completa"""
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
-    search = request.args.get('search', '')
+    search = (request.args.get('q') or request.args.get('search', '')).strip()
     tipo_filter = request.args.get('tipo', '')
     estado_filter = request.args.get('estado', '')
     
     offset = (page - 1) * limit
+
+    # La búsqueda de texto usa el índice del catálogo en lugar de LIKE '%term%'
+    ranked_ids = None
+    if search:
+        ranked_ids = search_index.search(search)
+        if not ranked_ids:
+            return jsonify({'publications': [], 'total': 0, 'page': page, 'limit': limit, 'pages': 0})
     
     conn = get_db_connection()
     try:
@@ -1360,10 +1979,9 @@ def admin_get_publications():
             where_conditions = []
             params = []
             
-            if search:
-                where_conditions.append("(p.descripcion LIKE %s OR pr.nombre LIKE %s OR u.1_nombre LIKE %s OR u.1_apellido LIKE %s)")
-                search_param = f"%{search}%"
-                params.extend([search_param, search_param, search_param, search_param])
+            if ranked_ids is not None:
+                where_conditions.append("p.id_publicacion IN (" + ", ".join(["%s"] * len(ranked_ids)) + ")")
+                params.extend(ranked_ids)
             
             if tipo_filter:
                 where_conditions.append("p.tipo_publicacion = %s")
@@ -1377,30 +1995,44 @@ def admin_get_publications():
             if where_conditions:
                 where_clause = "WHERE " + " AND ".join(where_conditions)
             
-            # Obtener total
-            count_query = f"""
-                SELECT COUNT(*) as total 
-                FROM publicacion p 
-                JOIN prenda pr ON p.id_publicacion = pr.id_publicacion 
-                JOIN usuario u ON p.id_usuario = u.id_usuario 
-                {where_clause}
-            """
-            cur.execute(count_query, params)
-            total = cur.fetchone()['total']
-            
-            # Obtener publicaciones
-            query = f"""
-                SELECT p.*, pr.*, 
-                       u.1_nombre, u.1_apellido, u.correo_electronico
-                FROM publicacion p 
-                JOIN prenda pr ON p.id_publicacion = pr.id_publicacion 
-                JOIN usuario u ON p.id_usuario = u.id_usuario 
-                {where_clause}
-                ORDER BY p.fecha_publicacion DESC
-                LIMIT %s OFFSET %s
-            """
-            cur.execute(query, params + [limit, offset])
-            publications = cur.fetchall()
+            if ranked_ids is not None:
+                # Con búsqueda: ordenar por relevancia y paginar en memoria (máx. 1000 resultados)
+                cur.execute(f"""
+                    SELECT p.*, pr.*, 
+                           u.1_nombre, u.1_apellido, u.correo_electronico
+                    FROM publicacion p 
+                    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion 
+                    JOIN usuario u ON p.id_usuario = u.id_usuario 
+                    {where_clause}
+                """, params)
+                matches = order_by_rank(cur.fetchall(), ranked_ids)
+                total = len(matches)
+                publications = matches[offset:offset + limit]
+            else:
+                # Obtener total
+                count_query = f"""
+                    SELECT COUNT(*) as total 
+                    FROM publicacion p 
+                    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion 
+                    JOIN usuario u ON p.id_usuario = u.id_usuario 
+                    {where_clause}
+                """
+                cur.execute(count_query, params)
+                total = cur.fetchone()['total']
+                
+                # Obtener publicaciones
+                query = f"""
+                    SELECT p.*, pr.*, 
+                           u.1_nombre, u.1_apellido, u.correo_electronico
+                    FROM publicacion p 
+                    JOIN prenda pr ON p.id_publicacion = pr.id_publicacion 
+                    JOIN usuario u ON p.id_usuario = u.id_usuario 
+                    {where_clause}
+                    ORDER BY p.fecha_publicacion DESC
+                    LIMIT %s OFFSET %s
+                """
+                cur.execute(query, params + [limit, offset])
+                publications = cur.fetchall()
             
             return jsonify({
                 'publications': publications,
@@ -1425,8 +2057,11 @@ def admin_delete_publication(pub_id):
                 return jsonify({'error': 'Publicación no encontrada'}), 404
             
             # Eliminar (CASCADE eliminará la prenda asociada)
+            release_publication_files(cur, pub_id)
             cur.execute('DELETE FROM publicacion WHERE id_publicacion = %s', (pub_id,))
             conn.commit()
+            search_index.remove(pub_id)
+            invalidate_publication_caches(pub_id)
             
             return jsonify({'message': 'Publicación eliminada exitosamente'})
     finally:
@@ -1522,9 +2157,10 @@ def admin_update_payment(payment_id):
 @app.route('/api/admin/messages', methods=['GET'])
 @admin_required
 def admin_get_messages():
-    """Obtener todos los mensajes"""
+    """Obtener todos los mensajes (con `archived=true`, los de mensaje_archivo)"""
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
+    table = 'mensaje_archivo' if request.args.get('archived') == 'true' else 'mensaje'
     
     offset = (page - 1) * limit
     
@@ -1532,18 +2168,18 @@ def admin_get_messages():
     try:
         with conn.cursor() as cur:
             # Total
-            cur.execute('SELECT COUNT(*) as total FROM mensaje')
+            cur.execute(f'SELECT COUNT(*) as total FROM {table}')
             total = cur.fetchone()['total']
             
-            # Mensajes
-            query = """
+            # Mensajes (el id crece con la fecha: se recorre la clave primaria sin ordenar)
+            query = f"""
                 SELECT m.*, 
                        u1.1_nombre as emisor_nombre, u1.1_apellido as emisor_apellido,
                        u2.1_nombre as receptor_nombre, u2.1_apellido as receptor_apellido
-                FROM mensaje m 
+                FROM {table} m 
                 JOIN usuario u1 ON m.id_emisor = u1.id_usuario 
                 JOIN usuario u2 ON m.id_receptor = u2.id_usuario 
-                ORDER BY m.fecha_envio DESC
+                ORDER BY m.id_mensaje DESC
                 LIMIT %s OFFSET %s
             """
             cur.execute(query, [limit, offset])
@@ -1566,12 +2202,19 @@ def admin_delete_message(message_id):
     conn = get_db_connection()
     try:
         with conn.cursor() as cur:
-            cur.execute('SELECT id_mensaje FROM mensaje WHERE id_mensaje = %s', (message_id,))
-            if not cur.fetchone():
+            for table in ('mensaje', 'mensaje_archivo'):
+                cur.execute(f'SELECT id_mensaje, id_emisor, id_receptor FROM {table} WHERE id_mensaje = %s', (message_id,))
+                message = cur.fetchone()
+                if message:
+                    break
+            else:
                 return jsonify({'error': 'Mensaje no encontrado'}), 404
             
-            cur.execute('DELETE FROM mensaje WHERE id_mensaje = %s', (message_id,))
+            cur.execute(f'DELETE FROM {table} WHERE id_mensaje = %s', (message_id,))
+            if message['id_emisor'] and message['id_receptor']:
+                conversations.refresh(cur, message['id_emisor'], message['id_receptor'])
             conn.commit()
+            invalidate_unread_counts(message['id_emisor'], message['id_receptor'])
             
             return jsonify({'message': 'Mensaje eliminado exitosamente'})
     finally:
@@ -1625,6 +2268,9 @@ def admin_get_stats():
             # Mensajes
             cur.execute('SELECT COUNT(*) as total FROM mensaje')
             stats['total_messages'] = cur.fetchone()['total']
+            cur.execute('SELECT COUNT(*) as total FROM mensaje_archivo')
+            stats['archived_messages'] = cur.fetchone()['total']
+            stats['total_messages'] += stats['archived_messages']
             
             # Valoraciones
             cur.execute('SELECT COUNT(*) as total FROM valoracion')
@@ -1638,6 +2284,23 @@ def admin_get_stats():
     finally:
         conn.close()
 
+@app.route('/api/admin/pool-stats', methods=['GET'])
+@admin_required
+def admin_get_pool_stats():
+    """Estadísticas del pool de conexiones, del pool de contraseñas y de las conexiones SSE"""
+    stats = db_pool.stats()
+    stats['passwords'] = password_hasher.stats()
+    stats['events'] = event_broker.hub.stats()
+    return jsonify(stats)
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@admin_required
+def admin_get_cache_stats():
+    """Obtener aciertos, fallos e invalidaciones de la caché de lecturas y de tokens verificados"""
+    stats = cache.stats()
+    stats['tokens'] = token_verifier.stats()
+    return jsonify(stats)
+
 # ==================== VALORACIONES ====================
 
 @app.route('/api/admin/ratings', methods=['GET'])
@@ -1682,86 +2345,103 @@ def admin_get_ratings():
 
 # ===== RUTAS DE MENSAJERÍA =====
 
+MESSAGES_DEFAULT_LIMIT = 30
+MESSAGES_MAX_LIMIT = 100
+
+
+def get_unread_count(user_id):
+    """Total de no leídos del usuario con caché; se invalida con la etiqueta `no_leidos:{id}`"""
+    def load():
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                return conversations.unread_total(cur, user_id)
+        finally:
+            conn.close()
+    return cache.get_or_set(f'no_leidos:{user_id}', load, ttl=UNREAD_COUNT_CACHE_TTL,
+                            tags=[f'no_leidos:{user_id}'])
+
+
+def invalidate_unread_counts(*user_ids):
+    cache.invalidate_tags(*(f'no_leidos:{user_id}' for user_id in user_ids))
+
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """Flujo SSE con mensajes nuevos, lecturas y cambios de transacciones del usuario.
+
+    EventSource no permite enviar encabezados, así que el token también se acepta en `?token=`.
+    La conexión inactiva solo recibe un comentario cada EVENTS_HEARTBEAT segundos."""
+    try:
+        token = request.args.get('token')
+        user_id = token_verifier.decode(token).get('sub') if token else authenticate()['id_usuario']
+    except AuthError as e:
+        return auth_error_response(e)
+    subscription = event_broker.hub.subscribe(int(user_id))
+    response = Response(event_stream(subscription, heartbeat=EVENTS_HEARTBEAT, max_seconds=EVENTS_MAX_SECONDS),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular el flujo en su buffer
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/conversations', methods=['GET'])
+@login_required
 def get_conversations():
     """Obtener todas las conversaciones del usuario"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
-            # Obtener conversaciones con información del último mensaje y mensajes no leídos
-            cur.execute('''
-                SELECT 
-                    other_user_id,
-                    other_user_name,
-                    last_message_time,
-                    last_message,
-                    unread_count
-                FROM (
-                    SELECT 
-                        CASE 
-                            WHEN m.id_emisor = %s THEN m.id_receptor 
-                            ELSE m.id_emisor 
-                        END as other_user_id,
-                        CASE 
-                            WHEN m.id_emisor = %s THEN CONCAT(ur.1_nombre, ' ', ur.1_apellido)
-                            ELSE CONCAT(ue.1_nombre, ' ', ue.1_apellido)
-                        END as other_user_name,
-                        MAX(m.fecha_envio) as last_message_time,
-                        '' as last_message,
-                        SUM(CASE WHEN m.id_receptor = %s AND m.leido = FALSE THEN 1 ELSE 0 END) as unread_count
-                    FROM mensaje m
-                    JOIN usuario ue ON m.id_emisor = ue.id_usuario
-                    JOIN usuario ur ON m.id_receptor = ur.id_usuario
-                    WHERE m.id_emisor = %s OR m.id_receptor = %s
-                    GROUP BY other_user_id, other_user_name
-                ) conv
-                ORDER BY last_message_time DESC
-            ''', (user_id, user_id, user_id, user_id, user_id))
-            
-            conversations = cur.fetchall()
-            return jsonify(conversations)
+            # Resumen mantenido al enviar y leer mensajes (tabla conversacion)
+            inbox = conversations.list_for_user(cur, user_id)
+            set_last_modified(inbox, 'last_message_time')
+            return jsonify(inbox)
             
     except Exception as e:
         return jsonify({'error': 'Error de autorización', 'detail': str(e)}), 401
     finally:
         conn.close()
 
+@app.route('/api/messages/unread-count', methods=['GET'])
+@login_required
+def unread_message_count():
+    """Total de mensajes no leídos para el contador del chat (sin consultar `mensaje`)"""
+    return jsonify({'unread_count': get_unread_count(g.user['id_usuario'])})
+
 @app.route('/api/messages/<int:other_user_id>', methods=['GET'])
+@login_required
 def get_messages_with_user(other_user_id):
-    """Obtener mensajes entre el usuario actual y otro usuario"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
+    """Obtener mensajes entre el usuario actual y otro usuario
+
+    Sin parámetros retorna todo el historial. Con `limit`, `before_id` o `after_id` retorna
+    una página {items, has_more}: la más reciente, la anterior a before_id (al desplazarse
+    hacia arriba) o los mensajes nuevos después de after_id."""
+    
+    paginated = any(name in request.args for name in ('limit', 'before_id', 'after_id'))
+    limit = before_id = after_id = None
+    if paginated:
+        try:
+            limit = min(max(int(request.args.get('limit', MESSAGES_DEFAULT_LIMIT)), 1), MESSAGES_MAX_LIMIT)
+            if request.args.get('before_id'):
+                before_id = int(request.args['before_id'])
+            if request.args.get('after_id'):
+                after_id = int(request.args['after_id'])
+        except ValueError:
+            return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
-            # Obtener mensajes entre los dos usuarios
-            cur.execute('''
-                SELECT m.*, 
-                       ue.1_nombre as emisor_nombre, ue.1_apellido as emisor_apellido,
-                       ur.1_nombre as receptor_nombre, ur.1_apellido as receptor_apellido
-                FROM mensaje m
-                JOIN usuario ue ON m.id_emisor = ue.id_usuario
-                JOIN usuario ur ON m.id_receptor = ur.id_usuario
-                WHERE (m.id_emisor = %s AND m.id_receptor = %s)
-                   OR (m.id_emisor = %s AND m.id_receptor = %s)
-                ORDER BY m.fecha_envio ASC
-            ''', (user_id, other_user_id, other_user_id, user_id))
-            
-            messages = cur.fetchall()
+            messages, has_more = conversations.fetch_messages(
+                cur, user_id, other_user_id, before_id=before_id, after_id=after_id, limit=limit)
+            set_last_modified(messages, 'fecha_envio')
+            if paginated:
+                return jsonify({'items': messages, 'has_more': has_more})
             return jsonify(messages)
             
     except Exception as e:
@@ -1770,22 +2450,21 @@ def get_messages_with_user(other_user_id):
         conn.close()
 
 @app.route('/api/messages', methods=['POST'])
+@login_required
 def send_message():
     """Enviar un mensaje a otro usuario"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         data = request.get_json()
         if not data or 'recipient_id' not in data or 'content' not in data:
             return jsonify({'error': 'Datos incompletos'}), 400
         
-        recipient_id = data['recipient_id']
+        try:
+            recipient_id = int(data['recipient_id'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'recipient_id inválido'}), 400
         content = data['content'].strip()
         
         if not content:
@@ -1805,6 +2484,7 @@ def send_message():
             ''', (user_id, recipient_id, content))
             
             message_id = cur.lastrowid
+            conversations.record_message(cur, message_id, user_id, recipient_id)
             conn.commit()
             
             # Obtener el mensaje completo para devolverlo
@@ -1819,6 +2499,8 @@ def send_message():
             ''', (message_id,))
             
             message = cur.fetchone()
+            invalidate_unread_counts(recipient_id)
+            publish_event([recipient_id, user_id], 'message', message)
             return jsonify(message), 201
             
     except Exception as e:
@@ -1827,16 +2509,12 @@ def send_message():
         conn.close()
 
 @app.route('/api/messages/<int:other_user_id>/read', methods=['PUT'])
+@login_required
 def mark_messages_as_read(other_user_id):
     """Marcar mensajes como leídos"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -1846,8 +2524,14 @@ def mark_messages_as_read(other_user_id):
                 SET leido = TRUE 
                 WHERE id_emisor = %s AND id_receptor = %s AND leido = FALSE
             ''', (other_user_id, user_id))
+            marked = cur.rowcount
+            conversations.mark_read(cur, user_id, other_user_id, marked)
             
             conn.commit()
+            if marked:
+                invalidate_unread_counts(user_id)
+                publish_event([other_user_id, user_id], 'read',
+                              {'reader_id': user_id, 'sender_id': other_user_id, 'count': marked})
             return jsonify({'message': 'Mensajes marcados como leídos'})
             
     except Exception as e:
@@ -1858,16 +2542,12 @@ def mark_messages_as_read(other_user_id):
 # ===== RUTAS DE TRANSACCIONES/COMPRAS =====
 
 @app.route('/api/transactions', methods=['GET'])
+@login_required
 def get_my_transactions():
     """Obtener transacciones del usuario (como comprador o vendedor)"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         transaction_type = request.args.get('type', 'all')  # all, buying, selling
         
@@ -1909,19 +2589,13 @@ def get_my_transactions():
         conn.close()
 
 @app.route('/api/transactions', methods=['POST'])
+@login_required
 def initiate_transaction():
     """Iniciar una transacción/compra"""
     print("[DEBUG] Iniciando transacción...")
     
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        print("[DEBUG] Error: No hay token de autorización")
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
-    
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         print(f"[DEBUG] Usuario autenticado: {user_id}")
         
         data = request.get_json()
@@ -1980,7 +2654,14 @@ def initiate_transaction():
                     INSERT INTO mensaje (id_emisor, id_receptor, contenido, fecha_envio, leido)
                     VALUES (%s, %s, %s, NOW(), FALSE)
                 ''', (user_id, publication['id_usuario'], f"Mensaje sobre la compra: {message}"))
+                message_id = cur.lastrowid
+                conversations.record_message(cur, message_id, user_id, publication['id_usuario'])
                 conn.commit()
+                invalidate_unread_counts(publication['id_usuario'])
+                cur.execute('SELECT * FROM mensaje WHERE id_mensaje = %s', (message_id,))
+                publish_event([user_id, publication['id_usuario']], 'message', cur.fetchone())
+
+            publish_transaction_event(cur, transaction_id)
             
             response = jsonify({
                 'ok': True,
@@ -2002,23 +2683,23 @@ def initiate_transaction():
         conn.close()
 
 @app.route('/api/transactions/<int:transaction_id>/payment-proof', methods=['POST'])
+@login_required
+@upload_limit(PROOF_MAX_BYTES, PROOF_KINDS)
 def upload_payment_proof(transaction_id):
     """Subir comprobante de pago"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
-        if 'proof' not in request.files:
-            return jsonify({'error': 'No se encontró archivo de comprobante'}), 400
-        
-        file = request.files['proof']
-        if file.filename == '':
-            return jsonify({'error': 'No se seleccionó archivo'}), 400
+        # Comprobante como archivo o como `upload_id` de una subida por partes finalizada
+        upload_id = request.form.get('upload_id') or (request.get_json(silent=True) or {}).get('upload_id')
+        if not upload_id:
+            if 'proof' not in request.files:
+                return jsonify({'error': 'No se encontró archivo de comprobante'}), 400
+
+            file = request.files['proof']
+            if file.filename == '':
+                return jsonify({'error': 'No se seleccionó archivo'}), 400
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -2032,24 +2713,32 @@ def upload_payment_proof(transaction_id):
             if not transaction:
                 return jsonify({'error': 'Transacción no encontrada o no autorizada'}), 404
             
-            # Guardar archivo
-            filename = secure_filename(file.filename)
-            file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-            unique_filename = f"comprobante_{transaction_id}_{uuid.uuid4().hex}.{file_extension}"
-
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
+            # Guardar archivo (direccionado por contenido, imagen o PDF según su firma)
+            if upload_id:
+                try:
+                    stored = chunked_uploads.resolve(upload_id, user_id, 'proof')
+                except UploadSessionError as e:
+                    return handle_upload_session_error(e)
+            else:
+                stored = save_uploaded_file(file, generate_variants=False)
+            if not stored:
+                return jsonify({'error': 'Tipo de archivo no permitido'}), 400
+            file_path = content_store.absolute_path(stored.path)
 
             # Guardar en la BD la ruta pública consistente con otras tablas (/uploads/..)
-            public_path = f"/uploads/{unique_filename}"
+            public_path = stored.url
             cur.execute('''
                 UPDATE transaccion 
                 SET estado = 'PAGO_ENVIADO', fecha_pago_enviado = NOW(), comprobante_pago = %s
                 WHERE id_transaccion = %s
             ''', (public_path, transaction_id))
+            add_reference(cur, public_path, stored.size)
             
             conn.commit()
-            # Enviar correo al vendedor con el comprobante adjunto
+            if upload_id:
+                chunked_uploads.discard(upload_id)
+            publish_transaction_event(cur, transaction_id)
+            # Encolar correo al vendedor con el comprobante adjunto
             try:
                 # Obtener información del vendedor
                 cur.execute('''
@@ -2069,7 +2758,9 @@ def upload_payment_proof(transaction_id):
                         "El archivo está adjuntado a este correo.\n\n"
                         "Saludos,\nEquipo InfinitiStyle"
                     )
-                    sent = send_email_with_attachments(seller_email, subject, body, attachments=[file_path])
+                    sent = email_outbox.enqueue(seller_email, subject, body, attachments=[file_path], cur=cur)
+                    conn.commit()
+                    email_outbox.notify()
                     if not sent:
                         print(f"[WARN] No se pudo enviar correo al vendedor {seller_email}.")
                 else:
@@ -2084,16 +2775,12 @@ def upload_payment_proof(transaction_id):
         conn.close()
 
 @app.route('/api/transactions/<int:transaction_id>/confirm-payment', methods=['PUT'])
+@login_required
 def confirm_payment_received(transaction_id):
     """Confirmar recepción de pago (por vendedor)"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -2117,6 +2804,7 @@ def confirm_payment_received(transaction_id):
             ''', (transaction_id,))
             
             conn.commit()
+            publish_transaction_event(cur, transaction_id)
             
             return jsonify({'message': 'Pago confirmado exitosamente'})
             
@@ -2126,16 +2814,12 @@ def confirm_payment_received(transaction_id):
         conn.close()
 
 @app.route('/api/transactions/<int:transaction_id>/ship', methods=['PUT'])
+@login_required
 def mark_as_shipped(transaction_id):
     """Marcar como enviado (por vendedor)"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         data = request.get_json() or {}
         tracking_info = data.get('tracking_info', '')
@@ -2162,6 +2846,7 @@ def mark_as_shipped(transaction_id):
             ''', (tracking_info, transaction_id))
             
             conn.commit()
+            publish_transaction_event(cur, transaction_id)
             
             return jsonify({'message': 'Marcado como enviado exitosamente'})
             
@@ -2171,16 +2856,12 @@ def mark_as_shipped(transaction_id):
         conn.close()
 
 @app.route('/api/transactions/<int:transaction_id>/delivered', methods=['PUT'])
+@login_required
 def confirm_delivery(transaction_id):
     """Confirmar entrega (por comprador)"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -2210,6 +2891,8 @@ def confirm_delivery(transaction_id):
             ''', (transaction['id_publicacion'],))
             
             conn.commit()
+            invalidate_publication_caches(transaction['id_publicacion'])
+            publish_transaction_event(cur, transaction_id)
             
             return jsonify({'message': 'Entrega confirmada exitosamente', 'transaction': transaction})
             
@@ -2219,16 +2902,12 @@ def confirm_delivery(transaction_id):
         conn.close()
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['GET'])
+@login_required
 def get_transaction_details(transaction_id):
     """Obtener detalles de una transacción específica"""
-    auth = request.headers.get('Authorization', '')
-    if not auth.startswith('Bearer '):
-        return jsonify({'error': 'No autorizado'}), 401
-    token = auth.split(' ', 1)[1]
     
     try:
-        payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=[JWT_ALGORITHM])
-        user_id = payload.get('sub')
+        user_id = g.user['id_usuario']
         
         conn = get_db_connection()
         with conn.cursor() as cur:
@@ -2256,106 +2935,8 @@ def get_transaction_details(transaction_id):
     finally:
         conn.close()
 
-def ensure_transaction_table():
-    """Asegurar que existe la tabla de transacciones"""
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cur:
-            # Verificar si la tabla ya existe
-            cur.execute("SHOW TABLES LIKE 'transaccion'")
-            exists = cur.fetchone()
-            
-            desired_estado_enum = "ENUM('PENDIENTE_PAGO','PAGO_ENVIADO','PAGO_CONFIRMADO','ENVIADO','ENTREGADO','CANCELADO')"
-            if exists:
-                # Tabla existe: verificar y actualizar columnas si es necesario (no borrar datos)
-                cur.execute("DESCRIBE transaccion")
-                columns = cur.fetchall()
-                estado_column = None
-                for col in columns:
-                    if col['Field'] == 'estado':
-                        estado_column = col
-                        break
-
-                print(f"[DEBUG] Tabla transaccion existe. Columna estado: {estado_column}")
-
-                # Si la columna 'estado' existe pero su definición no incluye todas las opciones, modificarla
-                if estado_column:
-                    col_type = estado_column.get('Type', '')
-                    # Normalizar y comprobar si faltan valores en el enum
-                    if 'PAGO_CONFIRMADO' not in col_type or 'PAGO_ENVIADO' not in col_type:
-                        try:
-                            print("[INFO] Actualizando definición de la columna 'estado' para incluir valores faltantes...")
-                            cur.execute(f"ALTER TABLE transaccion MODIFY COLUMN estado {desired_estado_enum} NOT NULL DEFAULT 'PENDIENTE_PAGO'")
-                            print("[INFO] Columna 'estado' actualizada")
-                        except Exception as e:
-                            print(f"[WARN] No se pudo actualizar la columna 'estado': {e}")
-                else:
-                    print("[WARN] La columna 'estado' no existe en 'transaccion' (se intentará crear tabla si es necesario)")
-
-            else:
-                # La tabla no existe: crearla
-                print("[INFO] Creando tabla transaccion con definición correcta...")
-                cur.execute('''
-                    CREATE TABLE transaccion (
-                        id_transaccion INT PRIMARY KEY AUTO_INCREMENT,
-                        id_publicacion INT NOT NULL,
-                        id_comprador INT NOT NULL,
-                        estado ENUM('PENDIENTE_PAGO','PAGO_ENVIADO','PAGO_CONFIRMADO','ENVIADO','ENTREGADO','CANCELADO') NOT NULL DEFAULT 'PENDIENTE_PAGO',
-                        fecha_inicio DATETIME NOT NULL,
-                        fecha_pago_enviado DATETIME NULL,
-                        fecha_pago_confirmado DATETIME NULL,
-                        fecha_envio DATETIME NULL,
-                        fecha_entrega DATETIME NULL,
-                        comprobante_pago TEXT NULL,
-                        info_seguimiento TEXT NULL,
-                        mensaje_inicial TEXT NULL,
-                        calificado BOOLEAN DEFAULT FALSE,
-                        FOREIGN KEY (id_publicacion) REFERENCES publicacion(id_publicacion) ON DELETE CASCADE,
-                        FOREIGN KEY (id_comprador) REFERENCES usuario(id_usuario) ON DELETE CASCADE,
-                        INDEX idx_comprador (id_comprador),
-                        INDEX idx_publicacion (id_publicacion)
-                    )
-                ''')
-                print("[INFO] Tabla transaccion creada exitosamente con ENUM correcto")
-                # verificar creación
-                cur.execute("DESCRIBE transaccion")
-                new_columns = cur.fetchall()
-                for col in new_columns:
-                    if col['Field'] == 'estado':
-                        print(f"[INFO] Nueva columna estado: {col}")
-                        break
-            
-            # Agregar columna leido a mensaje si no existe
-            try:
-                cur.execute('ALTER TABLE mensaje ADD COLUMN leido BOOLEAN DEFAULT FALSE')
-            except Exception as column_error:
-                # La columna ya existe, ignorar el error
-                if "Duplicate column name" not in str(column_error):
-                    raise column_error
-            
-            # Agregar columna calificado a transaccion si no existe
-            try:
-                cur.execute('ALTER TABLE transaccion ADD COLUMN calificado BOOLEAN DEFAULT FALSE')
-            except Exception as column_error:
-                # La columna ya existe, ignorar el error
-                if "Duplicate column name" not in str(column_error):
-                    raise column_error
-            
-            conn.commit()
-            print("[OK] Tabla de transacciones y columnas aseguradas")
-    except Exception as e:
-        print(f"[ERROR] Error al crear tabla de transacciones: {e}")
-    finally:
-        conn.close()
-
 if __name__ == '__main__':
-    # Asegurar columnas para verificación
-    ensure_verification_columns()
-    # Asegurar columnas de foto con tamaño apropiado
-    ensure_foto_columns()
-    # Asegurar tabla de lista de deseos
-    ensure_wishlist_table()
-    # Asegurar tabla de transacciones
-    ensure_transaction_table()
+    # Aplicar migraciones pendientes (una sola consulta si el esquema está al día)
+    migrate_on_boot(get_db_connection)
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,157 @@
+"""Archivo de mensajes antiguos.
+
+Mueve de `mensaje` a `mensaje_archivo` los mensajes leídos con más de
+MESSAGES_ARCHIVE_AFTER_DAYS días, para que la tabla caliente y sus índices sigan siendo
+pequeños. Los no leídos se quedan en `mensaje` hasta que se lean (los contadores de
+conversacion y mensajes_no_leidos se descuentan al marcarlos en esa tabla).
+
+Se recorre `mensaje` por clave primaria en lotes de MESSAGES_ARCHIVE_BATCH filas; cada lote
+se copia y se borra en su propia transacción y entre lotes se espera
+MESSAGES_ARCHIVE_PAUSE segundos, para no retener bloqueos ni saturar la réplica. Los ids
+crecen con la fecha, así que el recorrido se detiene en el primer mensaje más reciente que
+el corte. El historial (conversations.fetch_messages) lee de ambas tablas.
+
+Uso:
+    python archive_messages.py --dry-run        # contar sin mover
+    python archive_messages.py --days 365       # archivar con otro corte
+"""
+import argparse
+import datetime
+import sys
+import threading
+import time
+
+from config import MESSAGES_ARCHIVE_AFTER_DAYS, MESSAGES_ARCHIVE_BATCH, MESSAGES_ARCHIVE_PAUSE
+
+LOCK_NAME = 'styleinfinite_messages_archive'
+
+
+def _move(conn, ids):
+    """Copia y borra un lote en una transacción; retorna cuántos mensajes se movieron"""
+    placeholders = ', '.join(['%s'] * len(ids))
+    with conn.cursor() as cur:
+        cur.execute(f'INSERT IGNORE INTO mensaje_archivo SELECT * FROM mensaje WHERE id_mensaje IN ({placeholders})', ids)
+        # Solo se borra lo que quedó copiado
+        cur.execute(f'''
+            DELETE m FROM mensaje m JOIN mensaje_archivo a ON a.id_mensaje = m.id_mensaje
+            WHERE m.id_mensaje IN ({placeholders})
+        ''', ids)
+        moved = cur.rowcount
+    conn.commit()
+    return moved
+
+
+def archive(conn, days=MESSAGES_ARCHIVE_AFTER_DAYS, batch_size=MESSAGES_ARCHIVE_BATCH,
+            pause=MESSAGES_ARCHIVE_PAUSE, dry_run=False, max_batches=None):
+    """Archiva los mensajes leídos anteriores al corte.
+
+    Retorna un diccionario con mensajes revisados, archivados (o que se archivarían en
+    dry_run), no leídos conservados y lotes procesados."""
+    stats = {'scanned': 0, 'archived': 0, 'unread': 0, 'batches': 0}
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    last_id = 0
+    while max_batches is None or stats['batches'] < max_batches:
+        with conn.cursor() as cur:
+            cur.execute('''
+                SELECT id_mensaje, fecha_envio, leido FROM mensaje
+                WHERE id_mensaje > %s ORDER BY id_mensaje LIMIT %s
+            ''', (last_id, batch_size))
+            rows = cur.fetchall()
+        conn.commit()  # no retener la instantánea entre lotes
+        if not rows:
+            break
+        reached_cutoff = False
+        ids = []
+        for row in rows:
+            if row['fecha_envio'] is not None and row['fecha_envio'] >= cutoff:
+                reached_cutoff = True
+                break
+            stats['scanned'] += 1
+            last_id = row['id_mensaje']
+            if row['leido']:
+                ids.append(row['id_mensaje'])
+            else:
+                stats['unread'] += 1
+        if ids:
+            stats['batches'] += 1
+            stats['archived'] += len(ids) if dry_run else _move(conn, ids)
+        if reached_cutoff or len(rows) < batch_size:
+            break
+        if ids and pause:
+            time.sleep(pause)
+    return stats
+
+
+def run_locked(conn, **kwargs):
+    """Ejecuta `archive` si ningún otro proceso lo está haciendo; retorna None si no"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT GET_LOCK(%s, 0) AS got', (LOCK_NAME,))
+        row = cur.fetchone()
+    got = row['got'] if isinstance(row, dict) else row[0]
+    if not got:
+        return None
+    try:
+        return archive(conn, **kwargs)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+
+
+def format_stats(stats, dry_run=False):
+    action = 'por archivar' if dry_run else 'archivados'
+    return (f"{stats['scanned']} mensajes antiguos revisados, {stats['archived']} {action} "
+            f"en {stats['batches']} lotes, {stats['unread']} no leídos conservados")
+
+
+def start_periodic(get_connection, interval_hours, days=MESSAGES_ARCHIVE_AFTER_DAYS):
+    """Hilo de fondo que archiva cada `interval_hours` (0 = desactivado)"""
+    if interval_hours <= 0 or days <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval_hours * 3600)
+            conn = get_connection()
+            try:
+                stats = run_locked(conn, days=days)
+                if stats is not None and stats['archived']:
+                    print(f"[INFO] Archivo de mensajes: {format_stats(stats)}")
+            except Exception as e:
+                print(f"[ERROR] Archivo de mensajes: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='messages-archive', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mover mensajes antiguos a mensaje_archivo')
+    parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin mover')
+    parser.add_argument('--days', type=float, default=MESSAGES_ARCHIVE_AFTER_DAYS,
+                        help='Antigüedad mínima de un mensaje para archivarlo')
+    parser.add_argument('--batch', type=int, default=MESSAGES_ARCHIVE_BATCH, help='Mensajes por lote')
+    parser.add_argument('--pause', type=float, default=MESSAGES_ARCHIVE_PAUSE, help='Segundos entre lotes')
+    parser.add_argument('--max-batches', type=int, default=None, help='Detenerse tras N lotes')
+    args = parser.parse_args(argv)
+    if args.days <= 0:
+        print('[WARN] El archivo de mensajes está desactivado (--days 0)')
+        return 1
+
+    from migrate import connect
+    conn = connect()
+    try:
+        stats = run_locked(conn, days=args.days, batch_size=args.batch, pause=args.pause,
+                           dry_run=args.dry_run, max_batches=args.max_batches)
+    finally:
+        conn.close()
+    if stats is None:
+        print('[WARN] Otro proceso está archivando mensajes')
+        return 1
+    print(f"[OK] {format_stats(stats, args.dry_run)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""Verificación de tokens JWT con caché de tokens ya decodificados."""
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+
+
+class AuthError(Exception):
+    """Error de autenticación con el mensaje y código HTTP a devolver"""
+
+    def __init__(self, message, status=401, detail=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.detail = detail
+
+
+class TokenVerifier:
+    """Verifica cada token una sola vez y guarda el payload en un LRU acotado hasta su `exp`."""
+
+    def __init__(self, secret_key, algorithm, max_entries=4096):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # token -> (exp_timestamp, payload)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token):
+        now = time.time()
+        with self._lock:
+            item = self._cache.get(token)
+            if item is not None:
+                if item[0] > now:
+                    self._cache.move_to_end(token)
+                    self.hits += 1
+                    return item[1]
+                del self._cache[token]
+            self.misses += 1
+        try:
+            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except jwt.InvalidTokenError as e:
+            raise AuthError('Token inválido', detail=str(e))
+        exp = payload.get('exp')
+        if exp is not None:
+            with self._lock:
+                self._cache[token] = (float(exp), payload)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return payload
+
+    def from_header(self, header):
+        """Payload del encabezado `Authorization: Bearer <token>`"""
+        if not header or not header.startswith('Bearer '):
+            raise AuthError('No autorizado')
+        return self.decode(header.split(' ', 1)[1])
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,307 @@
+"""Caché de lectura con invalidación por etiquetas.
+
+Backends:
+- LocalCacheBackend: LRU en memoria del proceso con TTL y tamaño máximo.
+- RedisCacheBackend: cualquier servidor que hable el protocolo de Redis (RESP), sin
+  dependencias extra; útil para compartir la caché entre varios workers.
+
+Invalidación: cada etiqueta tiene un número de versión guardado en el backend. Una entrada
+guarda las versiones de sus etiquetas al escribirse y se considera vencida si alguna cambió,
+así `invalidate_tags('publicaciones')` es un solo INCR sin recorrer claves.
+"""
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class CacheBackendError(Exception):
+    """Error de comunicación con el backend de caché"""
+
+
+class LocalCacheBackend:
+    """LRU en memoria. Las versiones de etiqueta van en un LRU aparte de `max_counters`.
+
+    Una etiqueta desalojada debe contar como invalidada: las que no están en memoria valen
+    `_floor`, que al desalojar pasa a ser mayor que cualquier versión entregada hasta
+    entonces, así ninguna entrada guardada antes del desalojo vuelve a coincidir."""
+
+    def __init__(self, max_entries=1024, max_counters=None):
+        self.max_entries = max_entries
+        self.max_counters = max_counters or max_entries * 4
+        self._data = OrderedDict()  # clave -> (expira_en o None, valor)
+        self._counters = OrderedDict()  # versiones de etiqueta (LRU)
+        self._floor = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    values.append(None)
+                    continue
+                expires, value = item
+                if expires is not None and expires <= now:
+                    del self._data[key]
+                    values.append(None)
+                    continue
+                self._data.move_to_end(key)
+                values.append(value)
+        return values
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_counters(self, keys):
+        with self._lock:
+            values = []
+            for key in keys:
+                if key in self._counters:
+                    self._counters.move_to_end(key)
+                    values.append(self._counters[key])
+                else:
+                    values.append(self._floor)
+            return values
+
+    def incr(self, key):
+        with self._lock:
+            value = self._counters.get(key, self._floor) + 1
+            self._counters[key] = value
+            self._counters.move_to_end(key)
+            while len(self._counters) > self.max_counters:
+                _, evicted = self._counters.popitem(last=False)
+                self._floor = max(self._floor, evicted) + 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        with self._lock:
+            return len(self._data)
+
+
+class RedisCacheBackend:
+    """Cliente RESP mínimo (GET/SET/DEL/INCR/MGET) con una conexión protegida por un lock."""
+
+    def __init__(self, url='redis://localhost:6379/0', timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or '/0').lstrip('/') or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._sock = sock
+        self._file = sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def _close(self):
+        try:
+            if self._sock is not None:
+                self._sock.close()
+        finally:
+            self._sock = None
+            self._file = None
+
+    def _call(self, *args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise CacheBackendError('Conexión cerrada por el servidor')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise CacheBackendError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise CacheBackendError(f'Respuesta RESP desconocida: {line!r}')
+
+    def command(self, *args):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except (OSError, CacheBackendError):
+                self._close()
+                raise CacheBackendError(f'Error ejecutando {args[0]} en Redis')
+
+    def get_many(self, keys):
+        if not keys:
+            return []
+        raw = self.command('MGET', *keys)
+        return [pickle.loads(value) if value is not None else None for value in raw]
+
+    def set(self, key, value, ttl=None):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if ttl:
+            self.command('SET', key, payload, 'PX', int(ttl * 1000))
+        else:
+            self.command('SET', key, payload)
+
+    def delete(self, key):
+        self.command('DEL', key)
+
+    def get_counters(self, keys):
+        if not keys:
+            return []
+        return [int(value) if value is not None else 0 for value in self.command('MGET', *keys)]
+
+    def incr(self, key):
+        return self.command('INCR', key)
+
+    def size(self):
+        return self.command('DBSIZE')
+
+
+class Cache:
+    """Fachada de caché con etiquetas y contadores de aciertos/fallos"""
+
+    def __init__(self, backend, namespace='si', default_ttl=60):
+        self.backend = backend
+        self.namespace = namespace
+        self.default_ttl = default_ttl
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _key(self, key):
+        return f"{self.namespace}:v:{key}"
+
+    def _tag_key(self, tag):
+        return f"{self.namespace}:t:{tag}"
+
+    def _tag_versions(self, tags):
+        if not tags:
+            return {}
+        versions = self.backend.get_counters([self._tag_key(tag) for tag in tags])
+        return dict(zip(tags, versions))
+
+    def get(self, key):
+        """Retorna (encontrado, valor)"""
+        try:
+            item = self.backend.get_many([self._key(key)])[0]
+            if item is not None:
+                tag_versions, value = item
+                if self._tag_versions(list(tag_versions)) == tag_versions:
+                    self._count('hits')
+                    return True, value
+        except CacheBackendError as e:
+            self._count('errors')
+            print(f"[WARN] Caché no disponible: {e}")
+        self._count('misses')
+        return False, None
+
+    def set(self, key, value, ttl=None, tags=()):
+        try:
+            tag_versions = self._tag_versions(list(tags))
+            self.backend.set(self._key(key), (tag_versions, value), ttl or self.default_ttl)
+            self._count('sets')
+        except CacheBackendError as e:
+            self._count('errors')
+            print(f"[WARN] Caché no disponible: {e}")
+
+    def get_or_set(self, key, loader, ttl=None, tags=()):
+        """Lectura con relleno: devuelve el valor en caché o lo calcula con `loader()` y lo guarda.
+
+        Un None de `loader()` (p. ej. una fila que no existe) se devuelve sin guardarlo."""
+        found, value = self.get(key)
+        if found:
+            return value
+        # Las versiones se leen antes de calcular el valor: si una escritura invalida la
+        # etiqueta mientras tanto, la entrada nace vencida en lugar de servir datos viejos
+        try:
+            tag_versions = self._tag_versions(list(tags))
+        except CacheBackendError:
+            return loader()
+        value = loader()
+        if value is None:
+            return None
+        try:
+            self.backend.set(self._key(key), (tag_versions, value), ttl or self.default_ttl)
+            self._count('sets')
+        except CacheBackendError as e:
+            self._count('errors')
+            print(f"[WARN] Caché no disponible: {e}")
+        return value
+
+    def delete(self, key):
+        try:
+            self.backend.delete(self._key(key))
+        except CacheBackendError as e:
+            self._count('errors')
+            print(f"[WARN] Caché no disponible: {e}")
+
+    def invalidate_tags(self, *tags):
+        for tag in tags:
+            try:
+                self.backend.incr(self._tag_key(tag))
+                self._count('invalidations')
+            except CacheBackendError as e:
+                self._count('errors')
+                print(f"[WARN] No se pudo invalidar la etiqueta {tag}: {e}")
+
+    def stats(self):
+        with self._stats_lock:
+            data = dict(self._stats)
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['backend'] = type(self.backend).__name__
+        try:
+            data['entries'] = self.backend.size()
+        except CacheBackendError:
+            data['entries'] = None
+        return data
+
+
+def create_cache(backend='local', redis_url=None, max_entries=1024, default_ttl=60):
+    if backend == 'redis':
+        return Cache(RedisCacheBackend(redis_url or 'redis://localhost:6379/0'), default_ttl=default_ttl)
+    return Cache(LocalCacheBackend(max_entries=max_entries), default_ttl=default_ttl)
@@ -0,0 +1,279 @@
+"""Subidas por partes reanudables para fotos de publicaciones y comprobantes de pago.
+
+Protocolo:
+    POST   /api/uploads                 {kind, size} -> {upload_id, offset: 0, ...}
+    PUT    /api/uploads/<id>            bytes de la parte, con `Content-Range: bytes a-b/total`
+    GET    /api/uploads/<id>            offset actual, para reanudar tras un corte
+    POST   /api/uploads/<id>/complete   valida el tipo, calcula el hash y guarda en uploads/
+    DELETE /api/uploads/<id>            cancelar
+Luego las rutas de publicaciones y comprobantes reciben `upload_id` en lugar del archivo.
+
+Las partes se escriben en `uploads/.partial/<id>.part` y el progreso es el tamaño de ese
+archivo, así que una parte cortada a la mitad conserva lo recibido y cualquier worker que
+comparta la carpeta puede continuar la subida. Las sesiones vencen a las
+UPLOAD_SESSION_TTL horas y se borran solas. Mientras la sesión sigue vigente, el archivo
+finalizado cuenta como referenciado para gc_uploads.py (ver `finalized_paths`).
+"""
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from storage import PARTIAL_DIR, SNIFF_BYTES, CHUNK_SIZE, StoredFile, sniff_extension
+
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+EXPIRE_EVERY_SECONDS = 600
+
+
+class UploadSessionError(Exception):
+    """Error del protocolo de subida; `offset` indica desde dónde debe continuar el cliente"""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.offset = offset
+
+
+def parse_content_range(value):
+    """(inicio, fin, total) de un encabezado `Content-Range: bytes a-b/total`"""
+    match = CONTENT_RANGE_RE.match((value or '').strip())
+    if not match:
+        raise UploadSessionError('Content-Range inválido, use "bytes inicio-fin/total"')
+    start, end, total = (int(part) for part in match.groups())
+    if end < start or end >= total:
+        raise UploadSessionError('Content-Range inválido')
+    return start, end, total
+
+
+class ChunkedUploads:
+    def __init__(self, store, limits, ttl_seconds=24 * 3600, max_chunk=8 * 1024 * 1024):
+        self.store = store
+        self.limits = limits          # kind -> (bytes máximos, extensiones permitidas)
+        self.ttl_seconds = ttl_seconds
+        self.max_chunk = max_chunk
+        self._dir = os.path.join(store.root, PARTIAL_DIR)
+        os.makedirs(self._dir, exist_ok=True)
+        self._locks = [threading.Lock() for _ in range(32)]
+        self._last_expire = 0.0
+
+    def _paths(self, upload_id):
+        if not UPLOAD_ID_RE.match(upload_id or ''):
+            raise UploadSessionError('Subida no encontrada o vencida', 404)
+        base = os.path.join(self._dir, upload_id)
+        return base + '.json', base + '.part'
+
+    def _lock_for(self, upload_id):
+        return self._locks[hash(upload_id) % len(self._locks)]
+
+    def _read_meta(self, upload_id):
+        meta_path, _ = self._paths(upload_id)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _save(self, meta):
+        meta_path, _ = self._paths(meta['upload_id'])
+        tmp_path = f"{meta_path}.tmp{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+    def _load(self, upload_id, user_id):
+        meta = self._read_meta(upload_id)
+        if meta is None or meta['user_id'] != user_id:
+            raise UploadSessionError('Subida no encontrada o vencida', 404)
+        if meta['expires'] < time.time():
+            self.discard(upload_id)
+            raise UploadSessionError('Subida no encontrada o vencida', 404)
+        return meta
+
+    def _offset(self, meta):
+        if meta.get('ruta'):
+            return meta['size']
+        try:
+            return os.path.getsize(self._paths(meta['upload_id'])[1])
+        except FileNotFoundError:
+            return 0
+
+    def describe(self, meta):
+        data = {
+            'upload_id': meta['upload_id'],
+            'kind': meta['kind'],
+            'size': meta['size'],
+            'offset': self._offset(meta),
+            'complete': bool(meta.get('ruta')),
+            'chunk_size': self.max_chunk,
+            'expires_at': datetime.datetime.utcfromtimestamp(meta['expires']).isoformat() + 'Z',
+        }
+        if meta.get('ruta'):
+            data['url'] = StoredFile(meta['ruta'], meta['digest'], meta['size'], False).url
+        return data
+
+    def create(self, user_id, kind, size):
+        if kind not in self.limits:
+            raise UploadSessionError(f"Tipo de subida inválido, use uno de: {', '.join(self.limits)}")
+        max_bytes = self.limits[kind][0]
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError('size debe ser un entero positivo')
+        if size > max_bytes:
+            raise UploadSessionError(f'El archivo supera el máximo de {max_bytes / 1024 / 1024:.0f} MB', 413)
+        self.maybe_expire()
+        upload_id = uuid.uuid4().hex
+        _, part_path = self._paths(upload_id)
+        open(part_path, 'wb').close()
+        now = time.time()
+        meta = {'upload_id': upload_id, 'user_id': user_id, 'kind': kind, 'size': size, 'ext': None,
+                'creado': now, 'expires': now + self.ttl_seconds, 'ruta': None, 'digest': None}
+        self._save(meta)
+        return self.describe(meta)
+
+    def status(self, upload_id, user_id):
+        return self.describe(self._load(upload_id, user_id))
+
+    def write(self, upload_id, user_id, stream, content_range, content_length=None):
+        """Escribe una parte. Si llega cortada se conserva lo recibido y el offset lo refleja."""
+        start, end, total = parse_content_range(content_range)
+        length = end - start + 1
+        if length > self.max_chunk:
+            raise UploadSessionError(f'Cada parte admite como máximo {self.max_chunk} bytes', 413)
+        if content_length is not None and content_length != length:
+            raise UploadSessionError('Content-Length no coincide con Content-Range')
+        _, part_path = self._paths(upload_id)
+        # La sesión se lee dentro del candado: un complete() concurrente mueve el parcial
+        # y marca `ruta`, y _check_type no debe guardar una copia vieja de la sesión
+        with self._lock_for(upload_id):
+            meta = self._load(upload_id, user_id)
+            if meta.get('ruta'):
+                raise UploadSessionError('La subida ya fue finalizada', 409, meta['size'])
+            if total != meta['size']:
+                raise UploadSessionError('El total de Content-Range no coincide con el tamaño declarado')
+            offset = self._offset(meta)
+            if start != offset:
+                if end < offset:
+                    # Reintento de una parte ya recibida
+                    return self.describe(meta)
+                raise UploadSessionError('La parte no continúa desde el offset actual', 409, offset)
+            with open(part_path, 'r+b') as f:
+                f.seek(start)
+                remaining = length
+                while remaining:
+                    chunk = stream.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            if meta['ext'] is None:
+                self._check_type(meta, part_path)
+        return self.describe(meta)
+
+    def _check_type(self, meta, part_path):
+        """Valida la firma en cuanto hay bytes suficientes; si no es válida descarta lo recibido"""
+        with open(part_path, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+        if len(head) < min(SNIFF_BYTES, meta['size']):
+            return
+        ext = sniff_extension(head)
+        if ext is None or ext not in self.limits[meta['kind']][1]:
+            open(part_path, 'wb').close()
+            raise UploadSessionError('Tipo de archivo no permitido', 415, 0)
+        meta['ext'] = ext
+        self._save(meta)
+
+    def complete(self, upload_id, user_id):
+        """Mueve el archivo completo al almacenamiento. Retorna (datos de la sesión, StoredFile)."""
+        with self._lock_for(upload_id):
+            meta = self._load(upload_id, user_id)
+            if meta.get('ruta'):
+                return self.describe(meta), self.resolve(upload_id, user_id, meta['kind'])
+            offset = self._offset(meta)
+            if offset != meta['size'] or meta['ext'] is None:
+                raise UploadSessionError(f"Faltan {meta['size'] - offset} bytes por subir", 409, offset)
+            stored = self.store.ingest(self._paths(upload_id)[1], meta['ext'])
+            # El parcial conserva el mtime de la última parte; el período de gracia del
+            # recolector debe contar desde que se finaliza
+            os.utime(self.store.absolute_path(stored.path))
+            meta['ruta'] = stored.path
+            meta['digest'] = stored.digest
+            self._save(meta)
+        return self.describe(meta), stored
+
+    def resolve(self, upload_id, user_id, kind):
+        """StoredFile de una subida finalizada, para usarla en lugar de un archivo multipart"""
+        meta = self._load(upload_id, user_id)
+        if meta['kind'] != kind:
+            raise UploadSessionError('La subida no corresponde a este tipo de archivo')
+        if not meta.get('ruta'):
+            raise UploadSessionError('La subida no está finalizada', 409, self._offset(meta))
+        if not os.path.exists(self.store.absolute_path(meta['ruta'])):
+            raise UploadSessionError('Subida no encontrada o vencida', 404)
+        return StoredFile(meta['ruta'], meta['digest'], meta['size'], created=False)
+
+    def discard(self, upload_id):
+        """Borra la sesión y su archivo parcial (el archivo ya finalizado queda en uploads/)"""
+        for path in self._paths(upload_id):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def maybe_expire(self):
+        if time.monotonic() - self._last_expire >= EXPIRE_EVERY_SECONDS:
+            self._last_expire = time.monotonic()
+            self.expire()
+
+    def expire(self):
+        """Borra las sesiones vencidas y los parciales sin sesión. Retorna cuántas se borraron."""
+        now = time.time()
+        removed = 0
+        with os.scandir(self._dir) as entries:
+            for entry in entries:
+                upload_id, _, ext = entry.name.partition('.')
+                if not UPLOAD_ID_RE.match(upload_id):
+                    continue
+                if ext == 'json':
+                    meta = self._read_meta(upload_id)
+                    if meta is None or meta['expires'] < now:
+                        self.discard(upload_id)
+                        removed += 1
+                elif ext == 'part' and not os.path.exists(self._paths(upload_id)[0]):
+                    try:
+                        if now - entry.stat().st_mtime > self.ttl_seconds:
+                            os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+        if removed:
+            print(f"[INFO] {removed} subidas por partes vencidas eliminadas")
+        return removed
+
+
+def finalized_paths(root):
+    """Rutas de las subidas finalizadas cuya sesión sigue vigente.
+
+    Ninguna fila las referencia hasta que la ruta de la publicación o del comprobante recibe
+    el `upload_id`, así que el recolector las trata como referenciadas mientras tanto."""
+    paths = set()
+    now = time.time()
+    try:
+        entries = os.scandir(os.path.join(root, PARTIAL_DIR))
+    except FileNotFoundError:
+        return paths
+    with entries:
+        for entry in entries:
+            upload_id, _, ext = entry.name.partition('.')
+            if ext != 'json' or not UPLOAD_ID_RE.match(upload_id):
+                continue
+            try:
+                with open(entry.path, encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            if meta.get('ruta') and meta.get('expires', 0) >= now:
+                paths.add(meta['ruta'])
+    return paths
@@ -8,12 +8,91 @@ DB_PASSWORD = os.getenv('DATABASE_PASSWORD', os.getenv('DB_PASSWORD', ''))
 DB_NAME = os.getenv('DATABASE_NAME', os.getenv('DB_NAME', 'StyleInfinite'))
 DB_PORT = int(os.getenv('DATABASE_PORT', os.getenv('DB_PORT', 3306)))
 
+# Pool de conexiones MySQL
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 5))
+
+# Índice de búsqueda del catálogo: recarga completa para ver cambios de otros workers
+SEARCH_INDEX_REFRESH_SECONDS = float(os.getenv('SEARCH_INDEX_REFRESH_SECONDS', 300))
+# Caché de lecturas: 'local' (LRU en memoria) o 'redis' (compartida entre workers)
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'local')
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1024))
+CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', 60))
+# Duración en caché de los conteos de facetas del catálogo
+FACETS_CACHE_TTL = float(os.getenv('FACETS_CACHE_TTL', 30))
+
 SECRET_KEY = os.getenv('SECRET_KEY', '')
+
+# Contraseñas: costo de bcrypt y pool de hilos dedicado
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_WORKERS = int(os.getenv('PASSWORD_WORKERS', 2))
+PASSWORD_QUEUE_LIMIT = int(os.getenv('PASSWORD_QUEUE_LIMIT', 16))
+PASSWORD_TIMEOUT = float(os.getenv('PASSWORD_TIMEOUT', 10))
 JWT_ALGORITHM = 'HS256'
+# Tokens ya verificados que se guardan en memoria (hasta su expiración)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 4096))
+# Segundos que se reutiliza el rol de un usuario antes de volver a leerlo de la base
+ROLE_CACHE_TTL = float(os.getenv('ROLE_CACHE_TTL', 60))
 
 SMTP_HOST = os.getenv('MAIL_SERVER', os.getenv('SMTP_HOST', ''))
 SMTP_PORT = int(os.getenv('MAIL_PORT', os.getenv('SMTP_PORT', 587)))
 SMTP_USER = os.getenv('MAIL_USERNAME', os.getenv('SMTP_USER', ''))
 SMTP_PASSWORD = os.getenv('MAIL_PASSWORD', os.getenv('SMTP_PASSWORD', ''))
 SMTP_FROM = os.getenv('MAIL_FROM', os.getenv('SMTP_FROM', SMTP_USER or 'no-reply@example.com'))
-MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True').lower() in ('1', 'true', 'yes')
\ No newline at end of file
+MAIL_USE_TLS = os.getenv('MAIL_USE_TLS', 'True').lower() in ('1', 'true', 'yes')
+
+# Cola de correos: el worker corre en un hilo del proceso web salvo EMAIL_WORKER_ENABLED=False
+# (entonces se ejecuta aparte con `python mailer.py`)
+EMAIL_WORKER_ENABLED = os.getenv('EMAIL_WORKER_ENABLED', 'True').lower() in ('1', 'true', 'yes')
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 20))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 5))
+EMAIL_POLL_INTERVAL = float(os.getenv('EMAIL_POLL_INTERVAL', 10))
+
+# Archivos de /uploads: nunca cambian de contenido (se nombran por su hash), así que se
+# cachean un año como immutable
+UPLOADS_MAX_AGE = int(os.getenv('UPLOADS_MAX_AGE', 31536000))
+# '' = Flask envía el archivo; 'x-sendfile' (Apache/lighttpd) o 'x-accel' (nginx) delegan
+# el envío al servidor web, que debe exponer la carpeta en UPLOADS_ACCEL_PREFIX
+UPLOADS_SENDFILE_MODE = os.getenv('UPLOADS_SENDFILE_MODE', '').strip().lower()
+UPLOADS_ACCEL_PREFIX = os.getenv('UPLOADS_ACCEL_PREFIX', '/protected-uploads/')
+
+# Derivados de imágenes (images.py): hilos que los generan al subir y cuántas imágenes
+# pueden esperar; las que no caben se generan al pedirse por primera vez
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_QUEUE_LIMIT = int(os.getenv('IMAGE_QUEUE_LIMIT', 64))
+
+# Recolector de uploads huérfanos (gc_uploads.py): antigüedad mínima para borrar y cada
+# cuántas horas corre dentro del proceso web (0 = solo con cron / a mano)
+UPLOADS_GC_GRACE_HOURS = float(os.getenv('UPLOADS_GC_GRACE_HOURS', 24))
+UPLOADS_GC_INTERVAL_HOURS = float(os.getenv('UPLOADS_GC_INTERVAL_HOURS', 0))
+
+# Subidas: tamaño máximo de cualquier petición y de cada archivo según el endpoint
+MAX_REQUEST_BYTES = int(os.getenv('MAX_REQUEST_BYTES', 16 * 1024 * 1024))
+PHOTO_MAX_BYTES = int(os.getenv('PHOTO_MAX_BYTES', 8 * 1024 * 1024))
+PROOF_MAX_BYTES = int(os.getenv('PROOF_MAX_BYTES', 10 * 1024 * 1024))
+
+# Subidas por partes: horas que dura una sesión sin terminar y tamaño máximo de cada parte
+UPLOAD_SESSION_TTL = float(os.getenv('UPLOAD_SESSION_TTL', 24))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv('UPLOAD_CHUNK_MAX_BYTES', 4 * 1024 * 1024))
+
+# Eventos en tiempo real (SSE): 'local' reparte dentro del proceso; 'redis' comparte los
+# eventos entre varios workers mediante PUBLISH/SUBSCRIBE
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'local')
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', CACHE_REDIS_URL)
+# Segundos entre comentarios de keep-alive y duración máxima de una conexión antes de reconectar
+EVENTS_HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 25))
+EVENTS_MAX_SECONDS = float(os.getenv('EVENTS_MAX_SECONDS', 3600))
+
+# Segundos que se reutiliza el contador de mensajes no leídos (se invalida al enviar o leer)
+UNREAD_COUNT_CACHE_TTL = float(os.getenv('UNREAD_COUNT_CACHE_TTL', 30))
+
+# Archivo de mensajes leídos con más de N días en mensaje_archivo (0 = desactivado), en lotes
+# de MESSAGES_ARCHIVE_BATCH con MESSAGES_ARCHIVE_PAUSE segundos entre lotes
+MESSAGES_ARCHIVE_AFTER_DAYS = float(os.getenv('MESSAGES_ARCHIVE_AFTER_DAYS', 180))
+MESSAGES_ARCHIVE_BATCH = int(os.getenv('MESSAGES_ARCHIVE_BATCH', 1000))
+MESSAGES_ARCHIVE_PAUSE = float(os.getenv('MESSAGES_ARCHIVE_PAUSE', 0.5))
+MESSAGES_ARCHIVE_INTERVAL_HOURS = float(os.getenv('MESSAGES_ARCHIVE_INTERVAL_HOURS', 0))
\ No newline at end of file
@@ -0,0 +1,256 @@
+"""Resumen de conversaciones mantenido junto con cada mensaje.
+
+La tabla `conversacion` tiene una fila por par de usuarios (`id_usuario_1` < `id_usuario_2`)
+con el último mensaje, su vista previa y fecha, y un contador de no leídos por cada lado.
+send_message e initiate_transaction la actualizan con `record_message` y
+mark_messages_as_read con `mark_read`, en la misma transacción que el cambio en `mensaje`;
+así la bandeja de entrada es una lectura por índice en lugar de agrupar todos los mensajes
+del usuario.
+
+`mensajes_no_leidos` guarda el total de no leídos de cada usuario para el contador del
+chat (/api/messages/unread-count), y se actualiza en las mismas transacciones.
+
+El historial de una conversación se pagina por id_mensaje (`fetch_messages`) sobre el índice
+(id_emisor, id_receptor, id_mensaje): una lectura por sentido de la conversación, y otra en
+`mensaje_archivo` cuando la página llega a los mensajes archivados.
+
+Uso:
+    python conversations.py rebuild   # recalcular la tabla desde `mensaje`
+"""
+import sys
+
+PREVIEW_CHARS = 255
+
+
+def pair(user_a, user_b):
+    """Clave de la conversación: los dos ids en orden ascendente"""
+    return (user_a, user_b) if user_a <= user_b else (user_b, user_a)
+
+
+def record_message(cur, message_id, sender_id, recipient_id):
+    """Registra un mensaje nuevo como último de su conversación y suma un no leído al receptor.
+
+    Si dos envíos se confirman en distinto orden, el mayor id_mensaje queda como último."""
+    user_1, user_2 = pair(sender_id, recipient_id)
+    unread_1 = 1 if recipient_id == user_1 else 0
+    unread_2 = 1 - unread_1
+    # MySQL evalúa las asignaciones en orden: id_ultimo_mensaje se actualiza al final
+    cur.execute('''
+        INSERT INTO conversacion (id_usuario_1, id_usuario_2, id_ultimo_mensaje, id_ultimo_emisor,
+                                  vista_previa, fecha_ultimo_mensaje, no_leidos_1, no_leidos_2)
+        SELECT %s, %s, id_mensaje, id_emisor, LEFT(COALESCE(contenido, ''), %s), fecha_envio, %s, %s
+        FROM mensaje WHERE id_mensaje = %s
+        ON DUPLICATE KEY UPDATE
+            id_ultimo_emisor = IF(VALUES(id_ultimo_mensaje) > id_ultimo_mensaje, VALUES(id_ultimo_emisor), id_ultimo_emisor),
+            vista_previa = IF(VALUES(id_ultimo_mensaje) > id_ultimo_mensaje, VALUES(vista_previa), vista_previa),
+            fecha_ultimo_mensaje = IF(VALUES(id_ultimo_mensaje) > id_ultimo_mensaje, VALUES(fecha_ultimo_mensaje), fecha_ultimo_mensaje),
+            no_leidos_1 = no_leidos_1 + VALUES(no_leidos_1),
+            no_leidos_2 = no_leidos_2 + VALUES(no_leidos_2),
+            id_ultimo_mensaje = GREATEST(id_ultimo_mensaje, VALUES(id_ultimo_mensaje))
+    ''', (user_1, user_2, PREVIEW_CHARS, unread_1, unread_2, message_id))
+    cur.execute('''
+        INSERT INTO mensajes_no_leidos (id_usuario, no_leidos) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE no_leidos = no_leidos + 1
+    ''', (recipient_id,))
+
+
+def mark_read(cur, reader_id, other_id, count):
+    """Descuenta `count` mensajes leídos por `reader_id` en su conversación con `other_id`"""
+    if count <= 0:
+        return
+    user_1, user_2 = pair(reader_id, other_id)
+    column = 'no_leidos_1' if reader_id == user_1 else 'no_leidos_2'
+    cur.execute(f'''
+        UPDATE conversacion SET {column} = GREATEST({column} - %s, 0)
+        WHERE id_usuario_1 = %s AND id_usuario_2 = %s
+    ''', (count, user_1, user_2))
+    cur.execute('UPDATE mensajes_no_leidos SET no_leidos = GREATEST(no_leidos - %s, 0) WHERE id_usuario = %s',
+                (count, reader_id))
+
+
+def unread_total(cur, user_id):
+    """Total de mensajes no leídos de `user_id` (una lectura por clave primaria)"""
+    cur.execute('SELECT no_leidos FROM mensajes_no_leidos WHERE id_usuario = %s', (user_id,))
+    row = cur.fetchone()
+    return row['no_leidos'] if row else 0
+
+
+def recount_unread(cur, user_id):
+    """Recalcula el total de no leídos de `user_id` desde sus conversaciones"""
+    cur.execute('''
+        INSERT INTO mensajes_no_leidos (id_usuario, no_leidos)
+        SELECT %s, COALESCE(SUM(no_leidos), 0) FROM (
+            SELECT no_leidos_1 AS no_leidos FROM conversacion WHERE id_usuario_1 = %s
+            UNION ALL
+            SELECT no_leidos_2 FROM conversacion WHERE id_usuario_2 = %s AND id_usuario_1 <> id_usuario_2
+        ) t
+        ON DUPLICATE KEY UPDATE no_leidos = VALUES(no_leidos)
+    ''', (user_id, user_id, user_id))
+
+
+def list_for_user(cur, user_id):
+    """Conversaciones de `user_id`, la más reciente primero, en el formato de /api/conversations"""
+    cur.execute('''
+        SELECT c.other_user_id,
+               CONCAT(u.1_nombre, ' ', u.1_apellido) AS other_user_name,
+               c.fecha_ultimo_mensaje AS last_message_time,
+               c.vista_previa AS last_message,
+               c.id_ultimo_mensaje AS last_message_id,
+               c.id_ultimo_emisor AS last_sender_id,
+               c.unread_count
+        FROM (
+            SELECT id_usuario_2 AS other_user_id, id_ultimo_mensaje, id_ultimo_emisor, vista_previa,
+                   fecha_ultimo_mensaje, no_leidos_1 AS unread_count
+            FROM conversacion WHERE id_usuario_1 = %s
+            UNION ALL
+            SELECT id_usuario_1, id_ultimo_mensaje, id_ultimo_emisor, vista_previa,
+                   fecha_ultimo_mensaje, no_leidos_2
+            FROM conversacion WHERE id_usuario_2 = %s AND id_usuario_1 <> id_usuario_2
+        ) c
+        JOIN usuario u ON u.id_usuario = c.other_user_id
+        ORDER BY c.fecha_ultimo_mensaje DESC, c.id_ultimo_mensaje DESC
+    ''', (user_id, user_id))
+    return cur.fetchall()
+
+
+# Último mensaje y no leídos por par, incluidos los archivados; el lado 2 solo recibe cuando
+# el receptor es el id mayor
+REBUILD_SQL = '''
+    INSERT INTO conversacion (id_usuario_1, id_usuario_2, id_ultimo_mensaje, id_ultimo_emisor,
+                              vista_previa, fecha_ultimo_mensaje, no_leidos_1, no_leidos_2)
+    SELECT p.id_usuario_1, p.id_usuario_2, m.id_mensaje, m.id_emisor,
+           LEFT(COALESCE(m.contenido, ''), %s), m.fecha_envio, p.no_leidos_1, p.no_leidos_2
+    FROM (
+        SELECT LEAST(id_emisor, id_receptor) AS id_usuario_1,
+               GREATEST(id_emisor, id_receptor) AS id_usuario_2,
+               MAX(id_mensaje) AS id_ultimo_mensaje,
+               SUM(id_receptor <= id_emisor AND NOT COALESCE(leido, FALSE)) AS no_leidos_1,
+               SUM(id_receptor > id_emisor AND NOT COALESCE(leido, FALSE)) AS no_leidos_2
+        FROM (SELECT * FROM mensaje UNION ALL SELECT * FROM mensaje_archivo) mensaje
+        WHERE id_emisor IS NOT NULL AND id_receptor IS NOT NULL'''
+REBUILD_GROUP_SQL = '''
+        GROUP BY id_usuario_1, id_usuario_2
+    ) p
+    JOIN (SELECT * FROM mensaje UNION ALL SELECT * FROM mensaje_archivo) m ON m.id_mensaje = p.id_ultimo_mensaje'''
+
+
+def _read_messages(cur, table, directions, condition, extra, order, limit):
+    """Mensajes de `table` en ambos sentidos de la conversación, como máximo limit + 1"""
+    branches, params = [], []
+    for sender, recipient in directions:
+        # Cada sentido se lee en orden de id sobre su propio rango del índice
+        branch = f"SELECT * FROM {table} WHERE id_emisor = %s AND id_receptor = %s{condition} ORDER BY id_mensaje {order}"
+        params.extend([sender, recipient] + extra)
+        if limit is not None:
+            branch += ' LIMIT %s'
+            params.append(limit + 1)
+        branches.append(f"({branch})")
+    query = ' UNION ALL '.join(branches) + f' ORDER BY id_mensaje {order}'
+    if limit is not None:
+        query += ' LIMIT %s'
+        params.append(limit + 1)
+    cur.execute(query, params)
+    return list(cur.fetchall())
+
+
+def fetch_messages(cur, user_id, other_id, before_id=None, after_id=None, limit=None):
+    """Mensajes entre dos usuarios en orden cronológico y si quedan más en esa dirección.
+
+    Con `after_id` retorna los siguientes a ese mensaje; si no, los más recientes (anteriores
+    a `before_id` si se indica). Sin `limit` retorna todos los que cumplan la condición.
+    Se lee primero `mensaje` y solo si la página alcanza ids archivados también
+    `mensaje_archivo` (archive_messages.py)."""
+    forward = after_id is not None
+    order = 'ASC' if forward else 'DESC'
+    condition, extra = '', []
+    if forward:
+        condition, extra = ' AND id_mensaje > %s', [after_id]
+    elif before_id is not None:
+        condition, extra = ' AND id_mensaje < %s', [before_id]
+    directions = [(user_id, other_id), (other_id, user_id)] if user_id != other_id else [(user_id, user_id)]
+    messages = _read_messages(cur, 'mensaje', directions, condition, extra, order, limit)
+
+    cur.execute('SELECT MAX(id_mensaje) AS max_id FROM mensaje_archivo')
+    archived_max = cur.fetchone()['max_id']
+    if archived_max is not None:
+        if forward:
+            reaches_archive = after_id < archived_max
+        elif limit is not None and len(messages) > limit:
+            # Página completa en la tabla caliente: el archivo solo importa si hay ids intercalados
+            reaches_archive = messages[-1]['id_mensaje'] < archived_max
+        else:
+            reaches_archive = True
+        if reaches_archive:
+            archived = _read_messages(cur, 'mensaje_archivo', directions, condition, extra, order, limit)
+            merged = {message['id_mensaje']: message for message in archived + messages}
+            messages = sorted(merged.values(), key=lambda message: message['id_mensaje'], reverse=not forward)
+            if limit is not None:
+                messages = messages[:limit + 1]
+
+    has_more = limit is not None and len(messages) > limit
+    if has_more:
+        messages = messages[:limit]
+    if not forward:
+        messages.reverse()
+
+    # Los nombres son siempre de los mismos dos usuarios: una consulta en lugar de dos joins por fila
+    cur.execute('SELECT id_usuario, 1_nombre, 1_apellido FROM usuario WHERE id_usuario IN (%s, %s)',
+                (user_id, other_id))
+    names = {row['id_usuario']: row for row in cur.fetchall()}
+    for message in messages:
+        sender = names.get(message['id_emisor'], {})
+        recipient = names.get(message['id_receptor'], {})
+        message['emisor_nombre'] = sender.get('1_nombre')
+        message['emisor_apellido'] = sender.get('1_apellido')
+        message['receptor_nombre'] = recipient.get('1_nombre')
+        message['receptor_apellido'] = recipient.get('1_apellido')
+    return messages, has_more
+
+
+def refresh(cur, user_a, user_b):
+    """Recalcula una conversación desde `mensaje` (p. ej. después de borrar un mensaje)"""
+    user_1, user_2 = pair(user_a, user_b)
+    cur.execute('DELETE FROM conversacion WHERE id_usuario_1 = %s AND id_usuario_2 = %s', (user_1, user_2))
+    cur.execute(REBUILD_SQL + ' AND LEAST(id_emisor, id_receptor) = %s AND GREATEST(id_emisor, id_receptor) = %s'
+                + REBUILD_GROUP_SQL, (PREVIEW_CHARS, user_1, user_2))
+    for user_id in {user_1, user_2}:
+        recount_unread(cur, user_id)
+
+UNREAD_REBUILD_SQL = '''
+    INSERT INTO mensajes_no_leidos (id_usuario, no_leidos)
+    SELECT id_receptor, COUNT(*) FROM mensaje
+    WHERE id_receptor IS NOT NULL AND id_emisor IS NOT NULL AND NOT COALESCE(leido, FALSE)
+    GROUP BY id_receptor'''
+
+
+def rebuild(conn):
+    """Vacía y vuelve a llenar `conversacion` y `mensajes_no_leidos` desde `mensaje`.
+
+    Retorna cuántas conversaciones hay."""
+    with conn.cursor() as cur:
+        cur.execute('DELETE FROM conversacion')
+        cur.execute(REBUILD_SQL + REBUILD_GROUP_SQL, (PREVIEW_CHARS,))
+        total = cur.rowcount
+        cur.execute('DELETE FROM mensajes_no_leidos')
+        cur.execute(UNREAD_REBUILD_SQL)
+    conn.commit()
+    return total
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ['rebuild']:
+        print(__doc__)
+        return 1
+    from migrate import connect
+    conn = connect()
+    try:
+        total = rebuild(conn)
+    finally:
+        conn.close()
+    print(f"[OK] {total} conversaciones recalculadas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import threading
+import time
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolTimeoutError(Exception):
+    """No hay conexiones disponibles en el pool dentro del tiempo de espera"""
+
+
+class PooledConnection:
+    """Envoltura de una conexión pymysql: `close()` la devuelve al pool en lugar de cerrarla.
+
+    Después de `close()` la envoltura suelta la conexión: usarla lanza InterfaceError en
+    lugar de operar sobre una conexión que ya puede tener otra petición."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._released = False
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise pymysql.err.InterfaceError(0, 'La conexión ya fue devuelta al pool')
+        return getattr(raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        raw, self._raw = self._raw, None
+        self._pool._release(raw)
+
+
+class ConnectionPool:
+    """Pool de conexiones MySQL acotado y seguro entre hilos.
+
+    Mantiene hasta `size` conexiones inactivas para reutilizar y permite abrir
+    `max_overflow` conexiones extra en picos de carga, que se cierran al devolverse.
+    Al entregar una conexión se descarta si lleva más de `idle_timeout` segundos sin
+    usarse y se hace un ping si lleva más de `ping_interval` segundos inactiva.
+    """
+
+    def __init__(self, creator, size=5, max_overflow=10, timeout=30, idle_timeout=300, ping_interval=5):
+        self._creator = creator
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self._idle = []  # lista de (conexion, ultimo_uso), la más reciente al final
+        self._open = 0
+        self._lock = threading.Condition()
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'ping_failures': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def connection(self):
+        """Obtiene una conexión del pool (o crea una nueva si hay capacidad)"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw = None
+            with self._lock:
+                while not self._idle and self._open >= self.size + self.max_overflow:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeoutError('Pool de conexiones agotado')
+                    self._stats['waits'] += 1
+                    self._lock.wait(remaining)
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                else:
+                    self._open += 1
+            if raw is None:
+                return PooledConnection(self, self._create())
+            if self._is_usable(raw, last_used):
+                with self._lock:
+                    self._stats['reused'] += 1
+                return PooledConnection(self, raw)
+            self._discard(raw)
+
+    def _create(self):
+        try:
+            raw = self._creator()
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._stats['created'] += 1
+        return raw
+
+    def _is_usable(self, raw, last_used):
+        idle_for = time.monotonic() - last_used
+        if self.idle_timeout and idle_for > self.idle_timeout:
+            return False
+        if idle_for > self.ping_interval:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                with self._lock:
+                    self._stats['ping_failures'] += 1
+                return False
+        return True
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._open -= 1
+            self._stats['discarded'] += 1
+            self._lock.notify()
+
+    def _release(self, raw):
+        # Cerrar cualquier transacción abierta para no filtrar estado ni snapshots entre peticiones
+        try:
+            if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((raw, time.monotonic()))
+                self._lock.notify()
+                return
+        # Conexión de overflow: cerrarla en vez de guardarla
+        self._discard(raw)
+
+    def dispose(self):
+        """Cierra todas las conexiones inactivas"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'size': self.size,
+                'max_overflow': self.max_overflow,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+            })
+            return data
+
+
+def create_pool(host, user, password, database, port, **pool_options):
+    def creator():
+        return pymysql.connect(host=host, user=user, password=password, database=database, port=port,
+                               cursorclass=pymysql.cursors.DictCursor)
+    return ConnectionPool(creator, **pool_options)
@@ -0,0 +1,195 @@
+"""Eventos en tiempo real para los usuarios conectados (Server-Sent Events).
+
+Cada conexión a /api/events se suscribe al EventHub del proceso con el id de su usuario y
+espera en una cola sin tocar la base de datos; las rutas publican mensajes nuevos,
+confirmaciones de lectura y cambios de estado de transacciones después del commit.
+
+Brokers:
+- LocalBroker: reparte solo dentro del proceso (un único worker).
+- RedisBroker: publica en un canal de Redis y cada proceso escucha ese canal y reparte a
+  sus propias conexiones, así varios workers comparten los eventos.
+"""
+import json
+import queue
+import threading
+import time
+
+from cache import RedisCacheBackend, CacheBackendError
+
+CHANNEL = 'styleinfinite:eventos'
+_CLOSED = object()
+
+
+def format_event(event_id, event_type, data):
+    """Bloque `text/event-stream` de un evento (`data` ya serializado en JSON)"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, hub, user_id, max_pending):
+        self.hub = hub
+        self.user_id = user_id
+        self._queue = queue.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, item):
+        """Encola un evento; si el cliente no lo consume a tiempo se cierra la suscripción"""
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def get(self, timeout):
+        """Siguiente (id, tipo, datos), None si venció el timeout o _CLOSED"""
+        if self.overflowed:
+            return _CLOSED
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """Suscripciones del proceso agrupadas por usuario"""
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscribers = {}  # user_id -> set(Subscription)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, user_id, self.max_pending)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def dispatch(self, user_ids, event_type, data):
+        """Entrega un evento (datos en JSON) a las conexiones de este proceso"""
+        with self._lock:
+            self._next_id += 1
+            event_id = self._next_id
+            self._stats['published'] += 1
+            targets = [sub for user_id in user_ids for sub in self._subscribers.get(user_id, ())]
+        delivered = dropped = 0
+        for subscription in targets:
+            if subscription.deliver((event_id, event_type, data)):
+                delivered += 1
+            else:
+                # Cliente lento: se desconecta y al reconectar vuelve a cargar el estado
+                dropped += 1
+                subscription.overflowed = True
+                subscription.close()
+        with self._lock:
+            self._stats['delivered'] += delivered
+            self._stats['dropped'] += dropped
+
+    def connections(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['connections'] = sum(len(subs) for subs in self._subscribers.values())
+            data['users'] = len(self._subscribers)
+        return data
+
+
+class LocalBroker:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, user_ids, event_type, data):
+        self.hub.dispatch(user_ids, event_type, data)
+
+    def start(self):
+        pass
+
+
+class RedisBroker:
+    """Publica con PUBLISH y reparte lo recibido por SUBSCRIBE en un hilo de fondo"""
+
+    def __init__(self, hub, url):
+        self.hub = hub
+        self.url = url
+        self._publisher = RedisCacheBackend(url)
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def publish(self, user_ids, event_type, data):
+        payload = json.dumps({'users': list(user_ids), 'type': event_type, 'data': data})
+        try:
+            self._publisher.command('PUBLISH', CHANNEL, payload)
+        except CacheBackendError as e:
+            # Sin Redis al menos se entregan los eventos de este proceso
+            print(f"[WARN] No se pudo publicar el evento {event_type} en Redis: {e}")
+            self.hub.dispatch(user_ids, event_type, data)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen_forever, name='events-redis', daemon=True)
+            self._thread.start()
+
+    def _listen_forever(self):
+        delay = 1
+        while True:
+            conn = RedisCacheBackend(self.url, timeout=None)
+            try:
+                conn._connect()
+                conn._call('SUBSCRIBE', CHANNEL)
+                print(f"[INFO] Escuchando eventos en Redis ({CHANNEL})")
+                delay = 1
+                while True:
+                    reply = conn._read_reply()
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b'message':
+                        event = json.loads(reply[2])
+                        self.hub.dispatch(event['users'], event['type'], event['data'])
+            except (OSError, CacheBackendError, ValueError) as e:
+                print(f"[WARN] Suscripción de eventos en Redis interrumpida: {e}; reintentando en {delay}s")
+            finally:
+                conn._close()
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+
+def stream(subscription, heartbeat=25, max_seconds=3600, retry_ms=5000):
+    """Generador de la respuesta SSE. Envía un comentario cada `heartbeat` segundos para
+    que los proxies no corten la conexión y la cierra a los `max_seconds` para que el
+    cliente reconecte (y su token se vuelva a validar)."""
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f"retry: {retry_ms}\n\n"
+        yield format_event(0, 'ready', json.dumps({'user_id': subscription.user_id}))
+        while time.monotonic() < deadline:
+            item = subscription.get(timeout=heartbeat)
+            if item is _CLOSED:
+                break
+            if item is None:
+                yield ': ping\n\n'
+                continue
+            yield format_event(*item)
+    finally:
+        subscription.close()
+
+
+def create_broker(backend='local', redis_url=None, max_pending=100):
+    hub = EventHub(max_pending=max_pending)
+    if backend == 'redis':
+        return RedisBroker(hub, redis_url or 'redis://localhost:6379/0')
+    return LocalBroker(hub)
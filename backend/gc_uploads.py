@@ -0,0 +1,205 @@
+"""Recolector de archivos huérfanos de `uploads/`.
+
+Un archivo es huérfano si ninguna fila de prenda.foto, transaccion.comprobante_pago ni
+usuario.foto apunta a él y no es una subida por partes finalizada cuya sesión sigue vigente
+(aún sin fila, ver chunked_uploads.finalized_paths). Los derivados (`<hash>__md.webp`) pertenecen a su original y se
+borran junto con él. Solo se eliminan archivos cuya última modificación supera el período
+de gracia: una subida reciente puede no tener aún su fila confirmada, y el almacenamiento
+actualiza el mtime cuando se vuelve a subir un contenido existente.
+
+Uso:
+    python gc_uploads.py --dry-run         # informar sin borrar
+    python gc_uploads.py --grace-hours 48  # borrar huérfanos con más de 48 horas
+
+Se puede programar con cron o dentro del proceso web con UPLOADS_GC_INTERVAL_HOURS; un
+bloqueo en MySQL evita que dos ejecuciones corran a la vez.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import pymysql
+
+from chunked_uploads import finalized_paths
+from config import UPLOADS_GC_GRACE_HOURS
+from images import DERIVATIVE_RE
+from storage import REFERENCE_COLUMNS, PUBLIC_PREFIX, TMP_DIR, PARTIAL_DIR, path_from_url
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+LOCK_NAME = 'styleinfinite_uploads_gc'
+DELETE_BATCH = 500
+
+
+def owner_key(relpath):
+    """Ruta sin extensión del archivo original al que pertenece `relpath`"""
+    directory, name = os.path.split(relpath)
+    match = DERIVATIVE_RE.match(name)
+    stem = match.group('stem') if match else name.rsplit('.', 1)[0]
+    return f"{directory}/{stem}" if directory else stem
+
+
+def referenced_keys(conn):
+    """Conjunto de owner_key de todos los archivos referenciados.
+
+    Las filas se leen con un cursor sin buffer, así que nunca se cargan todas en memoria."""
+    keys = set()
+    for table, column in REFERENCE_COLUMNS:
+        with conn.cursor(pymysql.cursors.SSCursor) as cur:
+            cur.execute(f"SELECT {column} FROM {table} WHERE LEFT({column}, %s) = %s",
+                        (len(PUBLIC_PREFIX), PUBLIC_PREFIX))
+            for (url,) in cur:
+                path = path_from_url(url)
+                if path:
+                    keys.add(owner_key(path))
+    return keys
+
+
+def iter_files(root, prefix=''):
+    """(ruta relativa, DirEntry) de cada archivo bajo `root`, sin leer directorios enteros a memoria"""
+    with os.scandir(os.path.join(root, prefix) if prefix else root) as entries:
+        for entry in entries:
+            relpath = f"{prefix}/{entry.name}" if prefix else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(root, relpath)
+            elif entry.is_file(follow_symlinks=False):
+                yield relpath, entry
+
+
+def _remove_empty_dirs(root, relpath):
+    directory = os.path.dirname(relpath)
+    while directory:
+        try:
+            os.rmdir(os.path.join(root, directory))
+        except OSError:
+            return
+        directory = os.path.dirname(directory)
+
+
+def _forget(conn, paths):
+    """Borra de `archivo` las filas sin referencias de los archivos eliminados"""
+    if not paths:
+        return
+    with conn.cursor() as cur:
+        placeholders = ', '.join(['%s'] * len(paths))
+        cur.execute(f"DELETE FROM archivo WHERE referencias = 0 AND ruta IN ({placeholders})", paths)
+    conn.commit()
+
+
+def collect(conn, root=UPLOAD_FOLDER, grace_seconds=UPLOADS_GC_GRACE_HOURS * 3600, dry_run=False):
+    """Elimina los archivos huérfanos más antiguos que el período de gracia.
+
+    Retorna un diccionario con archivos revisados, eliminados (o que se eliminarían en
+    dry_run), huérfanos recientes conservados y bytes recuperados."""
+    stats = {'scanned': 0, 'deleted': 0, 'recent': 0, 'bytes': 0, 'errors': 0}
+    keys = referenced_keys(conn)
+    keys.update(owner_key(path) for path in finalized_paths(root))
+    pending = []
+    for relpath, entry in iter_files(root):
+        stats['scanned'] += 1
+        top = relpath.split('/', 1)[0]
+        if top == PARTIAL_DIR:
+            # Las subidas por partes vencen por su cuenta (chunked_uploads.py)
+            continue
+        in_tmp = top == TMP_DIR
+        if not in_tmp and (entry.name.startswith('.') or owner_key(relpath) in keys):
+            continue
+        try:
+            # Releer el mtime justo antes de borrar: otra subida puede haberlo renovado
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            continue
+        if time.time() - st.st_mtime < grace_seconds:
+            stats['recent'] += 1
+            continue
+        stats['deleted'] += 1
+        stats['bytes'] += st.st_size
+        if dry_run:
+            print(f"[INFO] Se eliminaría {relpath} ({st.st_size} bytes)")
+            continue
+        try:
+            os.remove(entry.path)
+        except OSError as e:
+            stats['errors'] += 1
+            print(f"[WARN] No se pudo eliminar {relpath}: {e}")
+            continue
+        if not in_tmp:
+            _remove_empty_dirs(root, relpath)
+            pending.append(relpath)
+        if len(pending) >= DELETE_BATCH:
+            _forget(conn, pending)
+            pending = []
+    if not dry_run:
+        _forget(conn, pending)
+    return stats
+
+
+def run_locked(conn, **kwargs):
+    """Ejecuta `collect` si ningún otro proceso lo está haciendo; retorna None si no"""
+    with conn.cursor() as cur:
+        cur.execute('SELECT GET_LOCK(%s, 0) AS got', (LOCK_NAME,))
+        row = cur.fetchone()
+    got = row['got'] if isinstance(row, dict) else row[0]
+    if not got:
+        return None
+    try:
+        return collect(conn, **kwargs)
+    finally:
+        with conn.cursor() as cur:
+            cur.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+
+
+def format_stats(stats, dry_run=False):
+    action = 'por eliminar' if dry_run else 'eliminados'
+    return (f"{stats['scanned']} archivos revisados, {stats['deleted']} huérfanos {action} "
+            f"({stats['bytes'] / 1024 / 1024:.1f} MB), {stats['recent']} recientes conservados, "
+            f"{stats['errors']} errores")
+
+
+def start_periodic(get_connection, interval_hours, root=UPLOAD_FOLDER):
+    """Hilo de fondo que ejecuta el recolector cada `interval_hours` (0 = desactivado)"""
+    if interval_hours <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval_hours * 3600)
+            conn = get_connection()
+            try:
+                stats = run_locked(conn, root=root)
+                if stats is not None:
+                    print(f"[INFO] Recolector de uploads: {format_stats(stats)}")
+            except Exception as e:
+                print(f"[ERROR] Recolector de uploads: {e}")
+            finally:
+                conn.close()
+
+    thread = threading.Thread(target=loop, name='uploads-gc', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Eliminar archivos subidos que ya no se referencian')
+    parser.add_argument('--dry-run', action='store_true', help='Solo informar, sin borrar')
+    parser.add_argument('--grace-hours', type=float, default=UPLOADS_GC_GRACE_HOURS,
+                        help='Antigüedad mínima de un huérfano para borrarlo')
+    parser.add_argument('--root', default=UPLOAD_FOLDER, help='Carpeta de uploads')
+    args = parser.parse_args(argv)
+
+    from migrate import connect
+    conn = connect()
+    try:
+        stats = run_locked(conn, root=args.root, grace_seconds=args.grace_hours * 3600, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    if stats is None:
+        print('[WARN] Otro proceso está ejecutando el recolector')
+        return 1
+    print(f"[OK] {format_stats(stats, args.dry_run)}")
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
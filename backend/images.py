@@ -0,0 +1,135 @@
+"""Derivados redimensionados de las imágenes subidas (miniaturas para el catálogo).
+
+Cada derivado se guarda junto al original como `<nombre>__<tamaño>.<formato>`, con la
+orientación EXIF aplicada y sin metadatos. Se generan en segundo plano al subir la imagen
+y, si falta alguno, al pedirse por primera vez. Pillow es opcional: sin él se sirve
+siempre el original.
+"""
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import IMAGE_WORKERS, IMAGE_QUEUE_LIMIT
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - Pillow es opcional
+    Image = None
+    ImageOps = None
+
+# Anchos fijos de los derivados
+IMAGE_SIZES = {'sm': 320, 'md': 640, 'lg': 1280}
+# formato -> (formato de Pillow, extensión, mimetype, opciones de guardado)
+IMAGE_FORMATS = {
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+SOURCE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp', 'gif'}
+DERIVATIVE_RE = re.compile(r'^(?P<stem>.+)__(?P<size>[a-z]+)\.(?P<ext>webp|jpg)$')
+
+# Locks por franjas: evita generar dos veces el mismo derivado sin guardar un lock por archivo
+_locks = [threading.Lock() for _ in range(32)]
+
+# Pool compartido para la generación en segundo plano; los cupos cubren trabajos en curso + en cola
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='images')
+_slots = threading.BoundedSemaphore(IMAGE_WORKERS + IMAGE_QUEUE_LIMIT)
+
+
+def available():
+    return Image is not None
+
+
+def is_derivative(filename):
+    return DERIVATIVE_RE.match(os.path.basename(filename)) is not None
+
+
+def can_derive(filename):
+    return available() and '.' in filename and filename.rsplit('.', 1)[1].lower() in SOURCE_EXTENSIONS \
+        and not is_derivative(filename)
+
+
+def derivative_name(filename, size, fmt):
+    stem = filename.rsplit('.', 1)[0]
+    return f"{stem}__{size}.{IMAGE_FORMATS[fmt][1]}"
+
+
+def _lock_for(path):
+    return _locks[hash(path) % len(_locks)]
+
+
+def _render(source_path, target_path, width, fmt):
+    pil_format, _, _, options = IMAGE_FORMATS[fmt]
+    with Image.open(source_path) as img:
+        if img.format == 'JPEG':
+            # Decodificar ya reducido: mucho más rápido con fotos de celular
+            img.draft('RGB', (width, width * 4))
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if fmt == 'jpeg' and has_alpha:
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img.convert('RGBA'), mask=img.convert('RGBA').split()[-1])
+            img = background
+        elif img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+        tmp_path = f"{target_path}.tmp{threading.get_ident()}"
+        # Sin exif ni icc: Pillow no copia metadatos salvo que se pidan
+        img.save(tmp_path, pil_format, **options)
+    os.replace(tmp_path, target_path)
+
+
+def ensure_derivative(folder, filename, size, fmt):
+    """Nombre del derivado (generándolo si no existe) o None si no se puede derivar"""
+    if size not in IMAGE_SIZES or fmt not in IMAGE_FORMATS or not can_derive(filename):
+        return None
+    source_path = os.path.join(folder, filename)
+    name = derivative_name(filename, size, fmt)
+    target_path = os.path.join(folder, name)
+    if os.path.exists(target_path):
+        return name
+    if not os.path.exists(source_path):
+        return None
+    with _lock_for(target_path):
+        if not os.path.exists(target_path):
+            try:
+                _render(source_path, target_path, IMAGE_SIZES[size], fmt)
+            except (OSError, ValueError, Image.DecompressionBombError) as e:
+                print(f"[WARN] No se pudo generar {name}: {e}")
+                return None
+    return name
+
+
+def generate_all(folder, filename):
+    for size in IMAGE_SIZES:
+        for fmt in IMAGE_FORMATS:
+            ensure_derivative(folder, filename, size, fmt)
+
+
+def generate_in_background(folder, filename):
+    """Genera todos los derivados sin bloquear la petición que subió la imagen.
+
+    Retorna el Future del trabajo, o None si no aplica o el pool está lleno (en ese caso
+    cada derivado se genera al pedirse por primera vez)."""
+    if not can_derive(filename):
+        return None
+    if not _slots.acquire(blocking=False):
+        print(f"[WARN] Cola de derivados llena; {filename} se procesará a pedido")
+        return None
+    try:
+        future = _executor.submit(generate_all, folder, filename)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def variant_urls(public_path):
+    """Lista de {size, width, url} para una ruta `/uploads/<archivo>`; vacía si no aplica"""
+    if not public_path or not public_path.startswith('/uploads/') or not can_derive(public_path):
+        return []
+    return [{'size': size, 'width': width, 'url': f"{public_path}?size={size}"}
+            for size, width in IMAGE_SIZES.items()]
@@ -0,0 +1,302 @@
+"""Asesor de índices para desarrollo.
+
+Reproduce las peticiones de lectura de la API contra la app (cliente de pruebas de Flask),
+captura el SQL que emiten realmente las rutas y ejecuta EXPLAIN sobre cada consulta
+distinta, marcando los recorridos completos de tabla (type=ALL) y los ordenamientos en
+disco/temporales (Using filesort / Using temporary). Como el catálogo sale de las rutas,
+no hay copias del SQL que mantener sincronizadas; tests/test_index_advisor.py verifica que
+cada GET de app.py esté en ROUTES.
+
+Las peticiones se hacen como el primer usuario con rol Administrador (o --user-id) y los
+ids de ejemplo se toman de la base. Las escrituras se bloquean: solo se reproducen lecturas.
+
+Uso:
+    python index_advisor.py                   # todas las rutas de ROUTES
+    python index_advisor.py --only messages   # solo las rutas que contienen 'messages'
+    python index_advisor.py --sql "SELECT ..."
+"""
+import argparse
+import datetime
+import os
+import re
+import sys
+
+from migrate import connect
+
+# Peticiones de solo lectura a reproducir. {user}, {other}, {pub}, {tx} y {msg} se
+# reemplazan por ids existentes; {cursor} por el `next_cursor` de una respuesta anterior.
+ROUTES = [
+    ('GET', '/api/me', None),
+    ('GET', '/api/profile/{user}', None),
+    ('GET', '/api/publications', None),
+    ('GET', '/api/publications?limit=20', None),
+    ('GET', '/api/publications?limit=20&cursor={cursor}', None),
+    ('GET', '/api/publications?limit=20&estado=Disponible&tipo_publicacion=Venta', None),
+    ('GET', '/api/publications?limit=20&talla=M&valor_min=10000&valor_max=50000', None),
+    ('GET', '/api/publications?q=camisa', None),
+    ('GET', '/api/publications/facets', None),
+    ('GET', '/api/publications/facets?estado=Disponible&talla=M', None),
+    ('GET', '/api/publications/{pub}', None),
+    ('GET', '/api/valoraciones/{user}', None),
+    ('GET', '/api/wishlist', None),
+    ('GET', '/api/wishlist/ids', None),
+    ('GET', '/api/wishlist/check/{pub}', None),
+    ('POST', '/api/wishlist/check', {'ids': ['{pub}']}),
+    ('GET', '/api/conversations', None),
+    ('GET', '/api/messages/unread-count', None),
+    ('GET', '/api/messages/{other}', None),
+    ('GET', '/api/messages/{other}?limit=30', None),
+    ('GET', '/api/messages/{other}?limit=30&before_id={msg}', None),
+    ('GET', '/api/messages/{other}?limit=30&after_id=1', None),
+    ('GET', '/api/transactions', None),
+    ('GET', '/api/transactions?type=buying', None),
+    ('GET', '/api/transactions?type=selling', None),
+    ('GET', '/api/transactions/{tx}', None),
+    ('GET', '/api/admin/users', None),
+    ('GET', '/api/admin/users?search=a&role=Usuario&verified=true', None),
+    ('GET', '/api/admin/publications', None),
+    ('GET', '/api/admin/publications?q=a&tipo=Venta&estado=Disponible', None),
+    ('GET', '/api/admin/payments', None),
+    ('GET', '/api/admin/payments?estado=PENDIENTE', None),
+    ('GET', '/api/admin/messages', None),
+    ('GET', '/api/admin/messages?archived=true', None),
+    ('GET', '/api/admin/stats', None),
+    ('GET', '/api/admin/ratings', None),
+]
+
+# GET de app.py que no consultan la base (o no terminan) y por eso no se reproducen
+SKIPPED_ROUTES = {
+    '/openapi.yaml': 'archivo estático',
+    '/uploads/<path:filename>': 'archivo estático',
+    '/api/uploads/<upload_id>': 'estado en disco de la subida por partes',
+    '/api/events': 'flujo SSE sin fin',
+    '/api/admin/pool-stats': 'estadísticas en memoria',
+    '/api/admin/cache-stats': 'estadísticas en memoria',
+}
+
+# Búsquedas de las rutas de escritura, que no se pueden reproducir sin modificar datos
+WRITE_PATH_QUERIES = {
+    'login / register / verify / password (usuario por correo)': (
+        'SELECT id_usuario, contrasena, verified FROM usuario WHERE correo_electronico=%s',
+        ('usuario@example.com',),
+    ),
+}
+
+READ_STATEMENT_RE = re.compile(r'^[\s(]*(SELECT|WITH)\b', re.IGNORECASE)
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+
+class ReadOnlyViolation(Exception):
+    pass
+
+
+class _RecordingCursor:
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, sql, params=None):
+        if not READ_STATEMENT_RE.match(sql):
+            raise ReadOnlyViolation(f"escritura bloqueada: {' '.join(sql.split())[:80]}")
+        self._statements.append((sql, params))
+        return self._cursor.execute(sql, params)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _RecordingConnection:
+    def __init__(self, conn, statements):
+        self._conn = conn
+        self._statements = statements
+
+    def cursor(self, *args):
+        return _RecordingCursor(self._conn.cursor(*args), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class _RecordingPool:
+    """Envuelve el pool de app.py y registra cada consulta de las conexiones que entrega"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.statements = []
+
+    def connection(self):
+        return _RecordingConnection(self._pool.connection(), self.statements)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+
+def route_pattern(path):
+    """Ruta sin query string con los parámetros normalizados (`<int:x>` y `{x}` -> `*`)"""
+    path = path.split('?', 1)[0]
+    return re.sub(r'<[^>]+>|\{\w+\}', '*', path)
+
+
+def sample_ids(cur, user_id=None):
+    """Ids existentes para rellenar los parámetros de ROUTES"""
+    def scalar(sql, params=()):
+        cur.execute(sql, params)
+        row = cur.fetchone()
+        return next(iter(row.values())) if row else None
+
+    if user_id is None:
+        user_id = scalar("SELECT MIN(id_usuario) FROM usuario WHERE rol = 'Administrador'")
+    if user_id is None:
+        user_id = scalar('SELECT MIN(id_usuario) FROM usuario')
+    other = scalar('''
+        SELECT IF(id_usuario_1 = %s, id_usuario_2, id_usuario_1) FROM conversacion
+        WHERE id_usuario_1 = %s OR id_usuario_2 = %s ORDER BY fecha_ultimo_mensaje DESC LIMIT 1
+    ''', (user_id, user_id, user_id))
+    return {
+        'user': user_id,
+        'other': other or scalar('SELECT MIN(id_usuario) FROM usuario WHERE id_usuario <> %s', (user_id,)) or 0,
+        'pub': scalar('SELECT MAX(id_publicacion) FROM publicacion') or 0,
+        'tx': scalar('''
+            SELECT MAX(t.id_transaccion) FROM transaccion t
+            JOIN publicacion p ON t.id_publicacion = p.id_publicacion
+            WHERE t.id_comprador = %s OR p.id_usuario = %s
+        ''', (user_id, user_id)) or 0,
+        'msg': scalar('SELECT MAX(id_mensaje) FROM mensaje') or 1,
+    }
+
+
+def _fill(value, samples):
+    if isinstance(value, str):
+        whole = PLACEHOLDER_RE.fullmatch(value)
+        if whole and isinstance(samples.get(whole.group(1)), int):
+            return samples[whole.group(1)]
+        return PLACEHOLDER_RE.sub(lambda m: str(samples.get(m.group(1), '')), value)
+    if isinstance(value, list):
+        return [_fill(item, samples) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill(item, samples) for key, item in value.items()}
+    return value
+
+
+def capture(routes, user_id=None):
+    """Reproduce `routes` contra la app y retorna [(nombre, sql, params)] sin repetidos"""
+    # Sin hilos de fondo ni caché compartida: cada ruta debe llegar a la base
+    os.environ['EMAIL_WORKER_ENABLED'] = 'False'
+    os.environ['UPLOADS_GC_INTERVAL_HOURS'] = '0'
+    os.environ['MESSAGES_ARCHIVE_INTERVAL_HOURS'] = '0'
+    import jwt
+    import app as api
+    from cache import create_cache
+
+    api.app.testing = True  # propagar ReadOnlyViolation en lugar de responder 500
+    api.cache = create_cache('local')
+    recorder = _RecordingPool(api.db_pool)
+    api.db_pool = recorder
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            samples = sample_ids(cur, user_id)
+    finally:
+        conn.close()
+    token = jwt.encode({'sub': samples['user'], 'name': 'index_advisor',
+                        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+                       api.app.config['SECRET_KEY'], algorithm=api.JWT_ALGORITHM)
+    headers = {'Authorization': f"Bearer {token}"}
+
+    queries = []
+    seen = set()
+    client = api.app.test_client()
+    for method, path, body in routes:
+        if '{cursor}' in path and not samples.get('cursor'):
+            print(f"[WARN] {method} {path}: no hay suficientes filas para una segunda página")
+            continue
+        name = f"{method} {_fill(path, samples)}"
+        recorder.statements.clear()
+        try:
+            response = client.open(_fill(path, samples), method=method, json=_fill(body, samples), headers=headers)
+        except Exception as e:
+            # Las consultas que alcanzó a emitir la ruta se analizan igual
+            print(f"[WARN] {name}: {e}")
+        else:
+            if response.status_code >= 400:
+                print(f"[WARN] {name}: HTTP {response.status_code}")
+            data = response.get_json(silent=True)
+            if isinstance(data, dict) and data.get('next_cursor'):
+                samples['cursor'] = data['next_cursor']
+        for sql, params in recorder.statements:
+            key = ' '.join(sql.split())
+            if key in seen:
+                continue
+            seen.add(key)
+            queries.append((name, sql, params))
+    return queries
+
+
+def analyze(cur, sql, params):
+    """Ejecuta EXPLAIN y retorna (filas del plan, lista de advertencias)"""
+    cur.execute('EXPLAIN ' + sql, params)
+    plan = cur.fetchall()
+    warnings = []
+    for row in plan:
+        table = row.get('table')
+        extra = row.get('Extra') or ''
+        if row.get('type') == 'ALL':
+            warnings.append(f"recorrido completo de `{table}` (~{row.get('rows')} filas)")
+        if 'Using filesort' in extra:
+            warnings.append(f"filesort en `{table}`")
+        if 'Using temporary' in extra:
+            warnings.append(f"tabla temporal en `{table}`")
+    return plan, warnings
+
+
+def print_plan(name, sql, plan, warnings):
+    print(f"== {name}")
+    print(f"   {' '.join(sql.split())[:160]}")
+    for row in plan:
+        print(f"   {row.get('table')!s:<6} type={row.get('type')!s:<7} key={row.get('key')!s:<32} "
+              f"rows={row.get('rows')!s:<8} {row.get('Extra') or ''}")
+    for warning in warnings:
+        print(f"   [WARN] {warning}")
+    if not warnings:
+        print("   [OK] sin recorridos completos ni filesort")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='EXPLAIN de las consultas de la API')
+    parser.add_argument('--only', default=None, help='Filtrar rutas por texto (p. ej. messages)')
+    parser.add_argument('--user-id', type=int, default=None, help='Usuario con el que se hacen las peticiones')
+    parser.add_argument('--sql', default=None, help='Analizar una consulta arbitraria')
+    args = parser.parse_args(argv)
+
+    if args.sql:
+        queries = [('consulta', args.sql, ())]
+    else:
+        routes = [route for route in ROUTES if not args.only or args.only in route[1]]
+        queries = capture(routes, args.user_id)
+        queries += [(name, sql, params) for name, (sql, params) in WRITE_PATH_QUERIES.items()
+                    if not args.only or args.only in name]
+
+    flagged = 0
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            for name, sql, params in queries:
+                plan, warnings = analyze(cur, sql, params)
+                print_plan(name, sql, plan, warnings)
+                flagged += bool(warnings)
+    finally:
+        conn.close()
+    print(f"\n{flagged} de {len(queries)} consultas con advertencias")
+    return 1 if flagged else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""Cola de correos salientes (tabla `email_outbox`) y worker de envío.
+
+Las rutas solo insertan el correo en la cola, idealmente en la misma transacción que el
+cambio que lo origina, y responden de inmediato. Un hilo de fondo reclama lotes de
+correos pendientes y los envía reutilizando una sola sesión SMTP, con reintentos y
+espera exponencial ante fallos temporales.
+
+Uso (worker en primer plano, por ejemplo contra un servidor SMTP de depuración):
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=False python mailer.py
+    python mailer.py --once
+"""
+import argparse
+import json
+import mimetypes
+import os
+import smtplib
+import socket
+import sys
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+
+from config import SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM, MAIL_USE_TLS
+from config import EMAIL_BATCH_SIZE, EMAIL_MAX_ATTEMPTS, EMAIL_POLL_INTERVAL
+
+# Fallos de la conexión (no respuestas del servidor): la sesión ya no sirve y se reconecta.
+# SMTPException hereda de OSError, así que no se puede capturar OSError en general.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout)
+
+
+def build_message(sender, to_address, subject, body, attachments=None):
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = sender
+    msg['To'] = to_address
+    msg.set_content(body)
+    for path in attachments or ():
+        try:
+            ctype, _ = mimetypes.guess_type(path)
+            maintype, subtype = (ctype or 'application/octet-stream').split('/', 1)
+            with open(path, 'rb') as f:
+                msg.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=os.path.basename(path))
+        except OSError as e:
+            print(f"[WARN] Error adjuntando archivo {path}: {e}")
+    return msg
+
+
+def is_permanent(error):
+    """Errores que no se arreglan reintentando: respuestas 5xx del servidor (remitente,
+    destinatarios o datos rechazados). Los 4xx y los fallos de conexión se reintentan."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(500 <= code < 600 for code in codes)
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def breaks_session(error):
+    """True si tras el error la sesión SMTP no se puede reutilizar (tras una respuesta de
+    error smtplib ya envió RSET y la sesión sigue abierta)"""
+    return isinstance(error, CONNECTION_ERRORS) or not isinstance(error, smtplib.SMTPException)
+
+
+class SmtpSession:
+    """Sesión SMTP reutilizable: conecta, hace STARTTLS y login una vez y la mantiene abierta."""
+
+    def __init__(self, host, port, user='', password='', use_tls=True, timeout=30, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+        self.connections = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self._server = server
+        self.connections += 1
+
+    def send(self, msg):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+        if self._server is None:
+            self._connect()
+        try:
+            self._server.send_message(msg)
+        except CONNECTION_ERRORS:
+            # El servidor cerró la sesión inactiva: reconectar una vez. Las respuestas de
+            # error (4xx/5xx) no se reintentan aquí: las clasifica process_batch.
+            self.close()
+            self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self._server is None:
+            return
+        try:
+            self._server.quit()
+        except (smtplib.SMTPException, OSError):
+            self._server.close()
+        finally:
+            self._server = None
+
+
+class EmailOutbox:
+    def __init__(self, get_connection, smtp_host, smtp_port, smtp_user='', smtp_password='', sender='',
+                 use_tls=True, batch_size=20, max_attempts=5, backoff_base=30, backoff_max=3600,
+                 poll_interval=10, lease_seconds=300, run_worker=True):
+        self._get_connection = get_connection
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.configured = bool(smtp_host)
+        self.run_worker = run_worker
+        self._session = SmtpSession(smtp_host, smtp_port, smtp_user, smtp_password, use_tls=use_tls)
+        self._worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    # --- lado de las rutas ---
+
+    def enqueue(self, to_address, subject, body, attachments=None, cur=None):
+        """Encola un correo. Con `cur` se inserta en la transacción del llamador (llamar a
+        `notify()` después del commit); sin él se usa una conexión propia. Retorna False si
+        el SMTP no está configurado."""
+        if not self.configured:
+            print(f"SMTP no configurado. Email para {to_address}:\n{subject}\n{body}\nAdjuntos: {attachments}")
+            return False
+        params = (to_address, subject, body, json.dumps(attachments) if attachments else None)
+        sql = ('INSERT INTO email_outbox (destinatario, asunto, cuerpo, adjuntos, proximo_intento, creado_en) '
+               'VALUES (%s, %s, %s, %s, NOW(), NOW())')
+        if cur is not None:
+            cur.execute(sql, params)
+            return True
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as own_cur:
+                own_cur.execute(sql, params)
+            conn.commit()
+        finally:
+            conn.close()
+        self.notify()
+        return True
+
+    def notify(self):
+        """Despierta al worker (arrancándolo si hace falta)"""
+        self.start()
+        self._wake.set()
+
+    # --- worker ---
+
+    def start(self):
+        """Arranca el hilo de envío (no hace nada si el worker corre en otro proceso)"""
+        if not self.configured or not self.run_worker:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='email-outbox', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_forever(self):
+        print(f"[INFO] Worker de correo iniciado ({self._worker_id})")
+        while not self._stop.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception as e:
+                print(f"[ERROR] Worker de correo: {e}")
+                processed = 0
+            if processed:
+                continue
+            self._session.close_if_idle()
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+        self._session.close()
+
+    def _claim(self):
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as cur:
+                # Las filas ENVIANDO con el plazo vencido quedaron de un worker que murió
+                cur.execute('''
+                    UPDATE email_outbox
+                    SET estado = 'ENVIANDO', reclamado_por = %s,
+                        proximo_intento = NOW() + INTERVAL %s SECOND
+                    WHERE estado IN ('PENDIENTE', 'ENVIANDO') AND proximo_intento <= NOW()
+                    ORDER BY id_email
+                    LIMIT %s
+                ''', (self._worker_id, self.lease_seconds, self.batch_size))
+                cur.execute('''
+                    SELECT id_email, destinatario, asunto, cuerpo, adjuntos, intentos
+                    FROM email_outbox
+                    WHERE estado = 'ENVIANDO' AND reclamado_por = %s
+                    ORDER BY id_email
+                ''', (self._worker_id,))
+                rows = cur.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def _record(self, results):
+        conn = self._get_connection()
+        try:
+            with conn.cursor() as cur:
+                for row, error in results:
+                    if error is None:
+                        cur.execute('''
+                            UPDATE email_outbox
+                            SET estado = 'ENVIADO', enviado_en = NOW(), intentos = intentos + 1,
+                                reclamado_por = NULL, ultimo_error = NULL
+                            WHERE id_email = %s
+                        ''', (row['id_email'],))
+                        continue
+                    attempts = row['intentos'] + 1
+                    if is_permanent(error) or attempts >= self.max_attempts:
+                        estado, delay = 'FALLIDO', 0
+                        self._stats['failed'] += 1
+                    else:
+                        estado = 'PENDIENTE'
+                        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                        self._stats['retried'] += 1
+                    cur.execute('''
+                        UPDATE email_outbox
+                        SET estado = %s, intentos = %s, ultimo_error = %s, reclamado_por = NULL,
+                            proximo_intento = NOW() + INTERVAL %s SECOND
+                        WHERE id_email = %s
+                    ''', (estado, attempts, str(error)[:1000], delay, row['id_email']))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def process_batch(self):
+        """Envía un lote de correos pendientes. Retorna cuántos se procesaron."""
+        rows = self._claim()
+        if not rows:
+            return 0
+        results = []
+        for row in rows:
+            attachments = json.loads(row['adjuntos']) if row.get('adjuntos') else None
+            msg = build_message(self.sender, row['destinatario'], row['asunto'], row['cuerpo'], attachments)
+            try:
+                self._session.send(msg)
+                self._stats['sent'] += 1
+                results.append((row, None))
+            except Exception as e:
+                print(f"[WARN] Error enviando correo {row['id_email']} a {row['destinatario']}: {e}")
+                results.append((row, e))
+                if breaks_session(e):
+                    self._session.close()
+        self._record(results)
+        return len(rows)
+
+    def stats(self):
+        data = dict(self._stats)
+        data['smtp_connections'] = self._session.connections
+        data['running'] = self._thread is not None and self._thread.is_alive()
+        return data
+
+
+def create_outbox(get_connection, run_worker=True):
+    return EmailOutbox(get_connection, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASSWORD, SMTP_FROM,
+                       use_tls=MAIL_USE_TLS, batch_size=EMAIL_BATCH_SIZE, max_attempts=EMAIL_MAX_ATTEMPTS,
+                       poll_interval=EMAIL_POLL_INTERVAL, run_worker=run_worker)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Worker de la cola de correos')
+    parser.add_argument('--once', action='store_true', help='Procesar un solo lote y salir')
+    args = parser.parse_args(argv)
+
+    from migrate import connect
+    outbox = create_outbox(connect)
+    if not outbox.configured:
+        print('[ERROR] SMTP no configurado (MAIL_SERVER)')
+        return 1
+    if args.once:
+        print(f"[OK] {outbox.process_batch()} correos procesados")
+        outbox._session.close()
+        return 0
+    try:
+        outbox.run_forever()
+    except KeyboardInterrupt:
+        outbox.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""Migraciones de esquema versionadas.
+
+Cada archivo de `migrations/` se llama `NNNN_descripcion.sql` y se aplica una sola vez,
+en orden, registrando su versión en la tabla `schema_version`.
+
+Uso:
+    python migrate.py status
+    python migrate.py upgrade [--to N]
+"""
+import argparse
+import os
+import re
+import sys
+
+import pymysql
+
+from config import DB_HOST, DB_USER, DB_PASSWORD, DB_NAME, DB_PORT
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([\w\-]+)\.sql$')
+
+# Errores que se toleran al aplicar una migración sobre una base creada antes de este
+# sistema (la tabla, columna o índice ya existían).
+IGNORABLE_ERRORS = {
+    1050,  # Table already exists
+    1060,  # Duplicate column name
+    1061,  # Duplicate key name
+    1091,  # Can't DROP; check that column/key exists
+}
+NO_SUCH_TABLE = 1146
+LOCK_NAME = 'styleinfinite_schema_migrations'
+
+
+def connect():
+    return pymysql.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME, port=DB_PORT,
+                           cursorclass=pymysql.cursors.DictCursor)
+
+
+def discover_migrations():
+    """Retorna la lista ordenada de (version, nombre, ruta) de los archivos de migración"""
+    migrations = []
+    seen = set()
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in seen:
+            raise RuntimeError(f'Versión de migración duplicada: {version}')
+        seen.add(version)
+        migrations.append((version, match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return migrations
+
+
+def split_statements(sql):
+    """Divide un archivo SQL en sentencias, ignorando comentarios de línea"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def current_version(cur):
+    """Versión aplicada más alta, o None si la tabla schema_version aún no existe"""
+    try:
+        cur.execute('SELECT MAX(version) AS version FROM schema_version')
+    except pymysql.err.ProgrammingError as e:
+        if e.args[0] == NO_SUCH_TABLE:
+            return None
+        raise
+    row = cur.fetchone()
+    return row['version'] if row and row['version'] is not None else 0
+
+
+def ensure_version_table(cur):
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            nombre VARCHAR(255) NOT NULL,
+            aplicada_en DATETIME NOT NULL
+        )
+    ''')
+
+
+def apply_migration(cur, version, name, path):
+    with open(path, encoding='utf-8') as f:
+        statements = split_statements(f.read())
+    for statement in statements:
+        try:
+            cur.execute(statement)
+        except pymysql.MySQLError as e:
+            if e.args[0] not in IGNORABLE_ERRORS:
+                raise
+            print(f"[INFO] Migración {version:04d}: se omite sentencia ya aplicada ({e.args[1]})")
+    cur.execute('INSERT INTO schema_version (version, nombre, aplicada_en) VALUES (%s, %s, NOW())', (version, name))
+
+
+def upgrade(conn, target=None):
+    """Aplica las migraciones pendientes hasta `target` (o todas). Retorna las versiones aplicadas."""
+    applied = []
+    with conn.cursor() as cur:
+        # Evitar que varios procesos migren a la vez
+        cur.execute('SELECT GET_LOCK(%s, 60) AS got', (LOCK_NAME,))
+        if not cur.fetchone()['got']:
+            raise RuntimeError('No se pudo obtener el bloqueo de migraciones')
+        try:
+            ensure_version_table(cur)
+            version_actual = current_version(cur) or 0
+            for version, name, path in discover_migrations():
+                if version <= version_actual or (target is not None and version > target):
+                    continue
+                print(f"[INFO] Aplicando migración {version:04d}_{name}")
+                apply_migration(cur, version, name, path)
+                conn.commit()
+                applied.append(version)
+        finally:
+            cur.execute('SELECT RELEASE_LOCK(%s)', (LOCK_NAME,))
+    return applied
+
+
+def migrate_on_boot(get_connection):
+    """Ruta rápida de arranque: una sola consulta si el esquema ya está al día"""
+    migrations = discover_migrations()
+    latest = migrations[-1][0] if migrations else 0
+    conn = get_connection()
+    try:
+        with conn.cursor() as cur:
+            version = current_version(cur)
+        if version is not None and version >= latest:
+            return []
+        applied = upgrade(conn)
+        print(f"[OK] Esquema actualizado a la versión {latest:04d} ({len(applied)} migraciones aplicadas)")
+        return applied
+    finally:
+        conn.close()
+
+
+def status(conn):
+    with conn.cursor() as cur:
+        version = current_version(cur) or 0
+    for v, name, _ in discover_migrations():
+        mark = 'aplicada ' if v <= version else 'pendiente'
+        print(f"{v:04d}  {mark}  {name}")
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migraciones de esquema de StyleInfinite')
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('status', help='Mostrar migraciones aplicadas y pendientes')
+    up = sub.add_parser('upgrade', help='Aplicar migraciones pendientes')
+    up.add_argument('--to', type=int, default=None, help='Versión máxima a aplicar')
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == 'upgrade':
+            applied = upgrade(conn, target=args.to)
+            print(f"[OK] {len(applied)} migraciones aplicadas")
+        else:
+            status(conn)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""Migración de las fotos de perfil guardadas en base64 dentro de `usuario.foto` a archivos.
+
+Cada foto se decodifica por bloques al almacenamiento de `uploads/` (direccionado por
+contenido, ver storage.py) y la columna pasa a guardar la URL. Se procesa un usuario por
+vez con commit por fila, así que se puede interrumpir y volver a ejecutar: solo quedan
+pendientes las filas que aún empiezan por `data:`.
+
+Uso:
+    python migrate_photos.py              # migrar todo
+    python migrate_photos.py --dry-run    # solo contar y mostrar tamaños
+    python migrate_photos.py --limit 100  # migrar como máximo 100 usuarios
+"""
+import argparse
+import base64
+import binascii
+import os
+import re
+import sys
+
+from migrate import connect
+from storage import ContentStore, UploadRejected, IMAGE_KINDS, add_reference
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+DATA_URL_RE = re.compile(r'^data:(?P<mime>image/[\w.+-]+)?(?:;[\w=.+-]+)*;base64,', re.IGNORECASE)
+MIME_EXTENSIONS = {'image/png': 'png', 'image/jpeg': 'jpg', 'image/jpg': 'jpg', 'image/gif': 'gif', 'image/webp': 'webp'}
+# Bloque de base64 a decodificar por vez (múltiplo de 4)
+CHUNK_CHARS = 4 * 64 * 1024
+
+
+def is_data_url(value):
+    return isinstance(value, str) and value[:5].lower() == 'data:'
+
+
+def _decode_chunks(value, start):
+    pending = ''
+    for offset in range(start, len(value), CHUNK_CHARS):
+        chunk = pending + ''.join(value[offset:offset + CHUNK_CHARS].split())
+        usable = len(chunk) - len(chunk) % 4
+        pending = chunk[usable:]
+        try:
+            yield base64.b64decode(chunk[:usable], validate=True)
+        except binascii.Error as e:
+            raise ValueError(f'Base64 inválido: {e}')
+    if pending:
+        raise ValueError('Base64 truncado')
+
+
+def save_data_url(value, store, max_bytes=None, kinds=IMAGE_KINDS):
+    """Decodifica por bloques una imagen `data:image/...;base64,` al almacenamiento.
+
+    Los bytes pasan por el mismo UploadSpool que las subidas multipart: la extensión sale de
+    la firma del contenido (no del tipo declarado) y se aplica `max_bytes`. Retorna el
+    StoredFile; como el nombre depende del contenido, repetir la operación no duplica el
+    archivo. Lanza ValueError si el valor no es base64 válido y UploadRejected (413/415) si
+    es demasiado grande o no es una imagen permitida."""
+    match = DATA_URL_RE.match(value or '')
+    if not match:
+        raise ValueError('No es una imagen en base64')
+    if (match.group('mime') or '').lower() not in MIME_EXTENSIONS:
+        raise ValueError('Tipo de imagen no permitido')
+    spool = store.spool(max_bytes, kinds)
+    try:
+        for chunk in _decode_chunks(value, match.end()):
+            spool.write(chunk)
+        return store.adopt(spool)
+    finally:
+        spool.close()
+
+
+def pending_ids(cur, after_id, batch):
+    cur.execute('''
+        SELECT id_usuario, LENGTH(foto) AS bytes
+        FROM usuario
+        WHERE id_usuario > %s AND LEFT(foto, 5) = 'data:'
+        ORDER BY id_usuario
+        LIMIT %s
+    ''', (after_id, batch))
+    return cur.fetchall()
+
+
+def migrate_user(conn, cur, store, user_id):
+    """Migra la foto de un usuario. Retorna la URL nueva o None si ya no era base64."""
+    cur.execute('SELECT foto, MD5(foto) AS huella FROM usuario WHERE id_usuario = %s', (user_id,))
+    row = cur.fetchone()
+    if not row or not is_data_url(row['foto']):
+        return None
+    stored = save_data_url(row['foto'], store)
+    # Solo reemplazar si la foto no cambió mientras se decodificaba
+    cur.execute('UPDATE usuario SET foto = %s WHERE id_usuario = %s AND MD5(foto) = %s',
+                (stored.url, user_id, row['huella']))
+    if not cur.rowcount:
+        conn.rollback()
+        return None
+    add_reference(cur, stored.url, stored.size)
+    conn.commit()
+    return stored.url
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Mover fotos de perfil en base64 a archivos')
+    parser.add_argument('--dry-run', action='store_true', help='No escribir archivos ni modificar la base')
+    parser.add_argument('--batch', type=int, default=100, help='Usuarios leídos por consulta')
+    parser.add_argument('--limit', type=int, default=None, help='Máximo de usuarios a migrar')
+    args = parser.parse_args(argv)
+
+    store = ContentStore(UPLOAD_FOLDER)
+    migrated = failed = 0
+    total_bytes = 0
+    after_id = 0
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            while args.limit is None or migrated + failed < args.limit:
+                rows = pending_ids(cur, after_id, args.batch)
+                if not rows:
+                    break
+                for row in rows:
+                    if args.limit is not None and migrated + failed >= args.limit:
+                        break
+                    after_id = row['id_usuario']
+                    total_bytes += row['bytes'] or 0
+                    if args.dry_run:
+                        migrated += 1
+                        continue
+                    try:
+                        url = migrate_user(conn, cur, store, row['id_usuario'])
+                    except (ValueError, UploadRejected) as e:
+                        failed += 1
+                        print(f"[WARN] Usuario {row['id_usuario']}: {e}")
+                        continue
+                    if url:
+                        migrated += 1
+                        print(f"[INFO] Usuario {row['id_usuario']}: {url}")
+    finally:
+        conn.close()
+    action = 'por migrar' if args.dry_run else 'migradas'
+    print(f"[OK] {migrated} fotos {action} ({total_bytes / 1024 / 1024:.1f} MB en base64), {failed} con errores")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,4 @@
+-- Columnas para la verificación de cuentas por correo
+ALTER TABLE usuario ADD COLUMN verified BOOLEAN DEFAULT FALSE;
+ALTER TABLE usuario ADD COLUMN verification_code VARCHAR(32) DEFAULT NULL;
+ALTER TABLE usuario ADD COLUMN verification_exp DATETIME DEFAULT NULL;
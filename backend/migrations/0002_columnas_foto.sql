@@ -0,0 +1,3 @@
+-- Permitir imágenes largas (base64) en las columnas foto
+ALTER TABLE usuario MODIFY COLUMN foto LONGTEXT;
+ALTER TABLE prenda MODIFY COLUMN foto LONGTEXT;
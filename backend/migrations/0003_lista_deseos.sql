@@ -0,0 +1,10 @@
+-- Tabla para lista de deseos / wishlist
+CREATE TABLE IF NOT EXISTS lista_deseos (
+    id_lista_deseos INT AUTO_INCREMENT PRIMARY KEY,
+    id_usuario INT NOT NULL,
+    id_publicacion INT NOT NULL,
+    fecha_agregado TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    FOREIGN KEY (id_publicacion) REFERENCES publicacion(id_publicacion) ON DELETE CASCADE,
+    UNIQUE KEY unique_wishlist (id_usuario, id_publicacion)
+);
@@ -0,0 +1,25 @@
+-- Tabla de transacciones/compras y columnas relacionadas
+CREATE TABLE IF NOT EXISTS transaccion (
+    id_transaccion INT PRIMARY KEY AUTO_INCREMENT,
+    id_publicacion INT NOT NULL,
+    id_comprador INT NOT NULL,
+    estado ENUM('PENDIENTE_PAGO','PAGO_ENVIADO','PAGO_CONFIRMADO','ENVIADO','ENTREGADO','CANCELADO') NOT NULL DEFAULT 'PENDIENTE_PAGO',
+    fecha_inicio DATETIME NOT NULL,
+    fecha_pago_enviado DATETIME NULL,
+    fecha_pago_confirmado DATETIME NULL,
+    fecha_envio DATETIME NULL,
+    fecha_entrega DATETIME NULL,
+    comprobante_pago TEXT NULL,
+    info_seguimiento TEXT NULL,
+    mensaje_inicial TEXT NULL,
+    calificado BOOLEAN DEFAULT FALSE,
+    FOREIGN KEY (id_publicacion) REFERENCES publicacion(id_publicacion) ON DELETE CASCADE,
+    FOREIGN KEY (id_comprador) REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    INDEX idx_comprador (id_comprador),
+    INDEX idx_publicacion (id_publicacion)
+);
+
+-- Bases existentes: asegurar que el ENUM de estado incluye todos los valores
+ALTER TABLE transaccion MODIFY COLUMN estado ENUM('PENDIENTE_PAGO','PAGO_ENVIADO','PAGO_CONFIRMADO','ENVIADO','ENTREGADO','CANCELADO') NOT NULL DEFAULT 'PENDIENTE_PAGO';
+ALTER TABLE transaccion ADD COLUMN calificado BOOLEAN DEFAULT FALSE;
+ALTER TABLE mensaje ADD COLUMN leido BOOLEAN DEFAULT FALSE;
@@ -0,0 +1,21 @@
+-- Índices secundarios para las consultas más frecuentes de app.py
+
+-- login, registro, verificación y cambio de contraseña buscan por correo
+CREATE INDEX idx_usuario_correo ON usuario (correo_electronico);
+
+-- get_publications: filtros por estado / tipo y ORDER BY fecha_publicacion DESC
+CREATE INDEX idx_publicacion_fecha ON publicacion (fecha_publicacion, id_publicacion);
+CREATE INDEX idx_publicacion_estado_fecha ON publicacion (estado, fecha_publicacion, id_publicacion);
+CREATE INDEX idx_publicacion_tipo_fecha ON publicacion (tipo_publicacion, fecha_publicacion, id_publicacion);
+
+-- get_publications: filtros por talla y rango de valor sobre prenda
+CREATE INDEX idx_prenda_talla_valor ON prenda (talla, valor, id_publicacion);
+CREATE INDEX idx_prenda_valor ON prenda (valor, id_publicacion);
+
+-- get_messages_with_user: pares (emisor, receptor) ordenados por fecha
+CREATE INDEX idx_mensaje_par_fecha ON mensaje (id_emisor, id_receptor, fecha_envio);
+-- get_conversations: mensajes recibidos y conteo de no leídos
+CREATE INDEX idx_mensaje_receptor_leido ON mensaje (id_receptor, leido, fecha_envio);
+
+-- valoraciones: GET por usuario valorado ordenado por fecha
+CREATE INDEX idx_valoracion_valorado_fecha ON valoracion (usuario_valorado_id, fecha_valoracion);
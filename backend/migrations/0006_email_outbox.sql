@@ -0,0 +1,16 @@
+-- Cola de correos salientes: las rutas solo insertan aquí y un worker los envía
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id_email BIGINT PRIMARY KEY AUTO_INCREMENT,
+    destinatario VARCHAR(320) NOT NULL,
+    asunto VARCHAR(255) NOT NULL,
+    cuerpo MEDIUMTEXT NOT NULL,
+    adjuntos TEXT NULL,
+    estado ENUM('PENDIENTE','ENVIANDO','ENVIADO','FALLIDO') NOT NULL DEFAULT 'PENDIENTE',
+    intentos INT NOT NULL DEFAULT 0,
+    proximo_intento DATETIME NOT NULL,
+    reclamado_por VARCHAR(64) NULL,
+    ultimo_error TEXT NULL,
+    creado_en DATETIME NOT NULL,
+    enviado_en DATETIME NULL,
+    INDEX idx_email_outbox_pendientes (estado, proximo_intento)
+);
@@ -0,0 +1,8 @@
+-- Archivos subidos (direccionados por contenido) y cuántas filas los referencian
+CREATE TABLE IF NOT EXISTS archivo (
+    ruta VARCHAR(255) PRIMARY KEY,
+    bytes BIGINT NULL,
+    referencias INT NOT NULL DEFAULT 0,
+    creado_en DATETIME NOT NULL,
+    INDEX idx_archivo_referencias (referencias)
+);
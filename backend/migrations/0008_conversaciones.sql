@@ -0,0 +1,32 @@
+-- Resumen por par de usuarios para /api/conversations (ver conversations.py)
+CREATE TABLE IF NOT EXISTS conversacion (
+    id_usuario_1 INT NOT NULL,
+    id_usuario_2 INT NOT NULL,
+    id_ultimo_mensaje INT NOT NULL,
+    id_ultimo_emisor INT NULL,
+    vista_previa VARCHAR(255) NOT NULL DEFAULT '',
+    fecha_ultimo_mensaje DATETIME NULL,
+    no_leidos_1 INT NOT NULL DEFAULT 0,
+    no_leidos_2 INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_usuario_1, id_usuario_2),
+    INDEX idx_conversacion_usuario_2 (id_usuario_2, id_usuario_1),
+    FOREIGN KEY (id_usuario_1) REFERENCES usuario(id_usuario) ON DELETE CASCADE,
+    FOREIGN KEY (id_usuario_2) REFERENCES usuario(id_usuario) ON DELETE CASCADE
+);
+
+-- Llenar con los mensajes existentes: último mensaje y no leídos de cada lado
+INSERT IGNORE INTO conversacion (id_usuario_1, id_usuario_2, id_ultimo_mensaje, id_ultimo_emisor,
+                                 vista_previa, fecha_ultimo_mensaje, no_leidos_1, no_leidos_2)
+SELECT p.id_usuario_1, p.id_usuario_2, m.id_mensaje, m.id_emisor,
+       LEFT(COALESCE(m.contenido, ''), 255), m.fecha_envio, p.no_leidos_1, p.no_leidos_2
+FROM (
+    SELECT LEAST(id_emisor, id_receptor) AS id_usuario_1,
+           GREATEST(id_emisor, id_receptor) AS id_usuario_2,
+           MAX(id_mensaje) AS id_ultimo_mensaje,
+           SUM(id_receptor <= id_emisor AND NOT COALESCE(leido, FALSE)) AS no_leidos_1,
+           SUM(id_receptor > id_emisor AND NOT COALESCE(leido, FALSE)) AS no_leidos_2
+    FROM mensaje
+    WHERE id_emisor IS NOT NULL AND id_receptor IS NOT NULL
+    GROUP BY id_usuario_1, id_usuario_2
+) p
+JOIN mensaje m ON m.id_mensaje = p.id_ultimo_mensaje;
@@ -0,0 +1,4 @@
+-- get_messages_with_user pagina por id_mensaje dentro de cada sentido del par
+CREATE INDEX idx_mensaje_par_id ON mensaje (id_emisor, id_receptor, id_mensaje);
+-- Reemplazado por el anterior (ya no se ordena el historial por fecha)
+DROP INDEX idx_mensaje_par_fecha ON mensaje;
@@ -0,0 +1,11 @@
+-- Total de mensajes no leídos por usuario para /api/messages/unread-count
+CREATE TABLE IF NOT EXISTS mensajes_no_leidos (
+    id_usuario INT PRIMARY KEY,
+    no_leidos INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (id_usuario) REFERENCES usuario(id_usuario) ON DELETE CASCADE
+);
+
+INSERT IGNORE INTO mensajes_no_leidos (id_usuario, no_leidos)
+SELECT id_receptor, COUNT(*) FROM mensaje
+WHERE id_receptor IS NOT NULL AND id_emisor IS NOT NULL AND NOT COALESCE(leido, FALSE)
+GROUP BY id_receptor;
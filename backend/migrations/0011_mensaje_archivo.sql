@@ -0,0 +1,5 @@
+-- Mensajes antiguos ya leídos (ver archive_messages.py). Misma estructura que `mensaje`:
+-- una migración que cambie columnas de `mensaje` debe aplicarlas también aquí.
+CREATE TABLE IF NOT EXISTS mensaje_archivo LIKE mensaje;
+-- En el archivo no hay no leídos
+ALTER TABLE mensaje_archivo DROP INDEX idx_mensaje_receptor_leido;
@@ -0,0 +1,82 @@
+"""Hash y verificación de contraseñas con bcrypt en un pool de hilos acotado.
+
+bcrypt libera el GIL mientras calcula, así que unos pocos hilos dedicados bastan para
+que los inicios de sesión no bloqueen al resto de las peticiones. Si el pool y su cola
+están llenos, la operación se rechaza de inmediato con PasswordPoolBusy (HTTP 503) en
+lugar de acumular peticiones esperando.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+
+class PasswordPoolBusy(Exception):
+    """El pool de contraseñas está saturado o no respondió a tiempo"""
+
+
+def hash_cost(hashed):
+    """Factor de costo de un hash bcrypt ($2b$12$...), o None si no se reconoce"""
+    if isinstance(hashed, bytes):
+        hashed = hashed.decode('utf-8', 'replace')
+    parts = (hashed or '').split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_queue=16, timeout=10.0):
+        self.rounds = rounds
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        # Cupos para trabajos en curso + en cola
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._capacity = workers + max_queue
+        self._lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'timeouts': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PasswordPoolBusy('Demasiadas operaciones de contraseña en curso')
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            self._count('timeouts')
+            raise PasswordPoolBusy('La operación de contraseña tardó demasiado')
+
+    def hash(self, password):
+        """Hash bcrypt (str) con el costo configurado"""
+        hashed = self._run(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds))
+        self._count('hashed')
+        return hashed.decode('utf-8')
+
+    def verify(self, password, hashed):
+        """True si la contraseña coincide. Lanza ValueError si el hash almacenado está corrupto."""
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        ok = self._run(bcrypt.checkpw, password.encode('utf-8'), hashed)
+        self._count('verified')
+        return ok
+
+    def needs_rehash(self, hashed):
+        """True si el hash se generó con un costo distinto al configurado"""
+        return hash_cost(hashed) != self.rounds
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data['rounds'] = self.rounds
+        data['capacity'] = self._capacity
+        return data
@@ -0,0 +1,157 @@
+"""Índice invertido en memoria para la búsqueda del catálogo.
+
+Tokeniza en español sin acentos (camisón == camison), descarta palabras vacías,
+reduce plurales simples y permite coincidencia por prefijo. Los resultados se
+ordenan por relevancia (TF-IDF con pesos por campo).
+"""
+import bisect
+import math
+import re
+import threading
+import time
+import unicodedata
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'mi', 'muy',
+    'o', 'para', 'por', 'que', 'se', 'sin', 'su', 'sus', 'un', 'una', 'unas', 'unos', 'y',
+}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Peso de cada campo en el puntaje
+FIELD_WEIGHTS = {
+    'nombre': 3.0,
+    'descripcion_prenda': 1.0,
+    'descripcion': 1.0,
+    'vendedor': 0.5,
+}
+# Una coincidencia por prefijo vale menos que la palabra completa
+PREFIX_FACTOR = 0.6
+MAX_PREFIX_EXPANSION = 50
+
+
+def normalize(text):
+    """Minúsculas y sin acentos ni diacríticos"""
+    decomposed = unicodedata.normalize('NFD', str(text or '').lower())
+    return ''.join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+
+
+def stem(token):
+    """Reducción mínima de plurales en español"""
+    if len(token) > 5 and token.endswith('es'):
+        return token[:-2]
+    if len(token) > 3 and token.endswith('s'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [stem(tok) for tok in TOKEN_RE.findall(normalize(text)) if tok not in STOPWORDS]
+
+
+class SearchIndex:
+    """Índice invertido seguro entre hilos con recarga completa periódica.
+
+    Cada proceso mantiene su propio índice: las altas, cambios y bajas hechas por este
+    proceso se aplican al instante y `refresh_seconds` limita cuánto tarda en verse un
+    cambio hecho por otro worker.
+    """
+
+    def __init__(self, loader, refresh_seconds=300):
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.RLock()
+        self._postings = {}   # token -> {doc_id: peso}
+        self._doc_terms = {}  # doc_id -> set(tokens)
+        self._terms = []      # tokens ordenados para búsqueda por prefijo
+        self._terms_dirty = False
+        self._loaded_at = None
+
+    def _ensure_loaded(self):
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        documents = self._loader()
+        with self._lock:
+            self._postings = {}
+            self._doc_terms = {}
+            for doc_id, fields in documents:
+                self._add(doc_id, fields)
+            self._terms_dirty = True
+            self._loaded_at = time.monotonic()
+
+    def _add(self, doc_id, fields):
+        weights = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(fields.get(field)):
+                weights[token] = weights.get(token, 0.0) + weight
+        for token, weight in weights.items():
+            self._postings.setdefault(token, {})[doc_id] = weight
+        self._doc_terms[doc_id] = set(weights)
+
+    def _remove(self, doc_id):
+        for token in self._doc_terms.pop(doc_id, ()):
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.pop(doc_id, None)
+            if not docs:
+                del self._postings[token]
+
+    def upsert(self, doc_id, fields):
+        with self._lock:
+            if self._loaded_at is None:
+                return  # se indexará en la primera carga
+            self._remove(doc_id)
+            self._add(doc_id, fields)
+            self._terms_dirty = True
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+            self._terms_dirty = True
+
+    def invalidate(self):
+        """Fuerza una recarga completa en la próxima búsqueda"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _expand(self, token):
+        """Términos del índice que coinciden con el token (exacto o por prefijo)"""
+        if self._terms_dirty:
+            self._terms = sorted(self._postings)
+            self._terms_dirty = False
+        matches = {}
+        if token in self._postings:
+            matches[token] = 1.0
+        start = bisect.bisect_left(self._terms, token)
+        for term in self._terms[start:start + MAX_PREFIX_EXPANSION]:
+            if not term.startswith(token):
+                break
+            matches.setdefault(term, PREFIX_FACTOR)
+        return matches
+
+    def search(self, query, limit=1000):
+        """Retorna los ids de documento que contienen todos los términos, ordenados por relevancia"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            total_docs = max(len(self._doc_terms), 1)
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, factor in self._expand(token).items():
+                    docs = self._postings[term]
+                    idf = math.log(1 + total_docs / len(docs))
+                    for doc_id, weight in docs.items():
+                        score = factor * idf * (1 + math.log(weight))
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {doc_id: s + token_scores[doc_id] for doc_id, s in scores.items() if doc_id in token_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return [doc_id for doc_id, _ in ranked[:limit]]
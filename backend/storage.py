@@ -0,0 +1,299 @@
+"""Almacenamiento de archivos subidos direccionado por contenido.
+
+Cada archivo se nombra por el SHA-256 de su contenido y se reparte en subdirectorios
+(`ab/cd/abcd....jpg`), así dos subidas iguales ocupan un solo archivo. El hash se calcula
+mientras se escribe, sin leer el archivo dos veces.
+
+La tabla `archivo` lleva cuántas filas (prenda.foto, transaccion.comprobante_pago,
+usuario.foto) apuntan a cada archivo. Los archivos sin referencias no se borran aquí: los
+elimina el recolector tras un período de gracia, para no competir con una subida
+simultánea del mismo contenido.
+
+Las subidas multipart se escriben directo a `.tmp/` con UploadSpool mientras Werkzeug
+procesa la petición: el tipo se valida por la firma de los primeros bytes y el tamaño por
+bloque, así un archivo no permitido se rechaza sin terminar de recibirlo.
+
+Uso:
+    python storage.py recount   # recalcular las referencias desde las tablas
+"""
+import hashlib
+import os
+import sys
+import threading
+
+CHUNK_SIZE = 64 * 1024
+PUBLIC_PREFIX = '/uploads/'
+TMP_DIR = '.tmp'
+# Subidas por partes en curso (chunked_uploads.py)
+PARTIAL_DIR = '.partial'
+
+# Firmas (magic bytes) de los tipos aceptados -> extensión con que se guardan
+SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'%PDF-', 'pdf'),
+)
+SNIFF_BYTES = 16
+IMAGE_KINDS = frozenset({'png', 'jpg', 'gif', 'webp'})
+
+# Columnas que guardan rutas públicas `/uploads/...`
+REFERENCE_COLUMNS = (
+    ('prenda', 'foto'),
+    ('transaccion', 'comprobante_pago'),
+    ('usuario', 'foto'),
+)
+
+
+class StoredFile:
+    def __init__(self, path, digest, size, created):
+        self.path = path          # relativa a la carpeta de uploads, con '/'
+        self.digest = digest
+        self.size = size
+        self.created = created    # False si el contenido ya existía (deduplicado)
+
+    @property
+    def url(self):
+        return PUBLIC_PREFIX + self.path
+
+
+def iter_stream(stream, chunk_size=CHUNK_SIZE):
+    """Bloques de bytes de un objeto tipo archivo"""
+    return iter(lambda: stream.read(chunk_size), b'')
+
+
+def path_from_url(url):
+    """Ruta relativa a partir de una URL `/uploads/...`, o None si no es un archivo subido"""
+    if not url or not isinstance(url, str) or not url.startswith(PUBLIC_PREFIX):
+        return None
+    return url[len(PUBLIC_PREFIX):].split('?', 1)[0]
+
+
+class UploadRejected(Exception):
+    """Subida rechazada por tipo o tamaño; `status` es el código HTTP a responder"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def sniff_extension(head):
+    """Extensión según la firma de los primeros bytes, o None si no es un tipo conocido"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+class UploadSpool:
+    """Archivo temporal donde Werkzeug escribe una parte multipart.
+
+    Calcula el SHA-256 y cuenta los bytes a medida que llegan, y valida la firma con el
+    primer bloque: si el tipo no está en `kinds` o se supera `max_bytes` lanza
+    UploadRejected y borra lo escrito. `ContentStore.adopt` lo mueve a su ruta final sin
+    volver a copiarlo."""
+
+    def __init__(self, path, max_bytes=None, kinds=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.kinds = kinds
+        self.size = 0
+        self.ext = None
+        self.adopted = False
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self._file = open(path, 'wb+')
+
+    def _reject(self, message, status):
+        self.close()
+        raise UploadRejected(message, status)
+
+    def _sniff(self):
+        self.ext = sniff_extension(self._head)
+        if self.ext is None or (self.kinds is not None and self.ext not in self.kinds):
+            self._reject('Tipo de archivo no permitido', 415)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self._reject(f'El archivo supera el máximo de {self.max_bytes / 1024 / 1024:.0f} MB', 413)
+        if self.ext is None:
+            self._head = (self._head + data)[:SNIFF_BYTES]
+            if len(self._head) == SNIFF_BYTES:
+                self._sniff()
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def seek(self, offset, whence=0):
+        # Werkzeug vuelve al inicio al terminar la parte: aquí se validan los archivos más
+        # cortos que la firma
+        if self.ext is None:
+            self._sniff()
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def tell(self):
+        return self._file.tell()
+
+    def flush(self):
+        self._file.flush()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    @property
+    def digest(self):
+        return self._hash.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self.adopted and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class ContentStore:
+    def __init__(self, root, shard_depth=2):
+        self.root = root
+        self.shard_depth = shard_depth
+        self._tmp = os.path.join(root, TMP_DIR)
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def relative_path(self, digest, ext):
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return '/'.join(shards + [f"{digest}.{ext}"])
+
+    def absolute_path(self, path):
+        return os.path.join(self.root, *path.split('/'))
+
+    def temp_path(self):
+        return os.path.join(self._tmp, f"{os.getpid()}-{threading.get_ident()}-{os.urandom(4).hex()}")
+
+    def _place(self, tmp_path, hexdigest, size, ext):
+        path = self.relative_path(hexdigest, ext)
+        target = self.absolute_path(path)
+        if os.path.exists(target):
+            # Mismo contenido ya guardado: actualizar mtime para que el recolector no lo
+            # considere antiguo mientras se registra la nueva referencia
+            os.utime(target)
+            return StoredFile(path, hexdigest, size, created=False)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return StoredFile(path, hexdigest, size, created=True)
+
+    def save(self, chunks, ext):
+        """Escribe los bloques de bytes calculando el hash y retorna un StoredFile"""
+        ext = ext.lower().lstrip('.')
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.temp_path()
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            return self._place(tmp_path, digest.hexdigest(), size, ext)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def ingest(self, path, ext):
+        """Mueve al almacenamiento un archivo ya escrito (p. ej. una subida por partes),
+        calculando su hash con una lectura secuencial. Retorna el StoredFile."""
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter_stream(f):
+                digest.update(chunk)
+                size += len(chunk)
+        stored = self._place(path, digest.hexdigest(), size, ext)
+        if os.path.exists(path):
+            os.remove(path)
+        return stored
+
+    def spool(self, max_bytes=None, kinds=None):
+        """Archivo temporal para una parte multipart (ver UploadSpool)"""
+        return UploadSpool(self.temp_path(), max_bytes, kinds)
+
+    def adopt(self, spool):
+        """Mueve un UploadSpool ya validado a su ruta por contenido y retorna el StoredFile"""
+        if spool.ext is None:
+            spool.seek(0)
+        spool.flush()
+        stored = self._place(spool.path, spool.digest, spool.size, spool.ext)
+        spool.adopted = stored.created
+        spool.close()
+        return stored
+
+
+def add_reference(cur, url, size=None):
+    """Suma una referencia al archivo de `url` (no hace nada si no es un archivo subido)"""
+    path = path_from_url(url)
+    if not path:
+        return
+    cur.execute('''
+        INSERT INTO archivo (ruta, bytes, referencias, creado_en)
+        VALUES (%s, %s, 1, NOW())
+        ON DUPLICATE KEY UPDATE referencias = referencias + 1, bytes = COALESCE(VALUES(bytes), bytes)
+    ''', (path, size))
+
+
+def release_reference(cur, url):
+    """Resta una referencia al archivo de `url`"""
+    path = path_from_url(url)
+    if not path:
+        return
+    cur.execute('UPDATE archivo SET referencias = GREATEST(referencias - 1, 0) WHERE ruta = %s', (path,))
+
+
+def recount(conn):
+    """Recalcula `archivo.referencias` desde las columnas que guardan rutas de uploads"""
+    counts = {}
+    with conn.cursor() as cur:
+        for table, column in REFERENCE_COLUMNS:
+            cur.execute(f"SELECT {column} AS url, COUNT(*) AS n FROM {table} "
+                        f"WHERE LEFT({column}, %s) = %s GROUP BY {column}",
+                        (len(PUBLIC_PREFIX), PUBLIC_PREFIX))
+            for row in cur.fetchall():
+                path = path_from_url(row['url'])
+                counts[path] = counts.get(path, 0) + row['n']
+        cur.execute('UPDATE archivo SET referencias = 0')
+        for path, n in counts.items():
+            cur.execute('''
+                INSERT INTO archivo (ruta, referencias, creado_en) VALUES (%s, %s, NOW())
+                ON DUPLICATE KEY UPDATE referencias = VALUES(referencias)
+            ''', (path, n))
+    conn.commit()
+    return counts
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ['recount']:
+        print(__doc__)
+        return 1
+    from migrate import connect
+    conn = connect()
+    try:
+        counts = recount(conn)
+    finally:
+        conn.close()
+    print(f"[OK] {len(counts)} archivos referenciados, {sum(counts.values())} referencias")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+# Los módulos del backend se importan como módulos planos (igual que en app.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Al importar app en las pruebas: sin hilos de fondo ni servicios externos
+os.environ['EMAIL_WORKER_ENABLED'] = 'False'
+os.environ['UPLOADS_GC_INTERVAL_HOURS'] = '0'
+os.environ['MESSAGES_ARCHIVE_INTERVAL_HOURS'] = '0'
+os.environ['CACHE_BACKEND'] = 'local'
+os.environ['EVENTS_BACKEND'] = 'local'
+
+
+class FakeCursor:
+    """Cursor tipo DictCursor que registra las sentencias y responde con filas preparadas"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = 0
+        self.lastrowid = None
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def execute(self, sql, params=()):
+        self.conn.executed.append((' '.join(sql.split()), tuple(params or ())))
+        responder = self.conn.responder
+        self._rows = list(responder(sql, params) if responder else [])
+        self.rowcount = len(self._rows)
+        self.lastrowid = self.conn.lastrowid
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, responder=None, lastrowid=None):
+        self.responder = responder
+        self.lastrowid = lastrowid
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """Reemplaza a app.db_pool: cada conexión responde con el mismo `responder`"""
+
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.connections = []
+
+    def connection(self):
+        self.connections.append(FakeConnection(self.responder))
+        return self.connections[-1]
+
+    @property
+    def executed(self):
+        return [statement for conn in self.connections for statement in conn.executed]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Módulo app con base de datos falsa y caché y tokens propios de cada prueba"""
+    import app
+    from auth import TokenVerifier
+    from cache import create_cache
+
+    monkeypatch.setattr(app, 'db_pool', FakePool())
+    monkeypatch.setattr(app, 'cache', create_cache('local'))
+    monkeypatch.setattr(app, 'token_verifier', TokenVerifier(app.app.config['SECRET_KEY'], app.JWT_ALGORITHM))
+    return app
+
+
+def bearer(api, user_id, expires_in=3600):
+    """Encabezados con un JWT válido para `user_id`, firmado como lo hace login"""
+    import jwt
+    token = jwt.encode({'sub': user_id, 'name': 'prueba',
+                        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=expires_in)},
+                       api.app.config['SECRET_KEY'], algorithm=api.JWT_ALGORITHM)
+    return {'Authorization': f'Bearer {token}'}
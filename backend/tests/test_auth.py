@@ -0,0 +1,93 @@
+import time
+
+import jwt
+import pytest
+
+import auth
+from auth import AuthError, TokenVerifier
+from conftest import bearer
+
+SECRET = 'secreto'
+
+
+def token(exp, sub=1):
+    return jwt.encode({'sub': sub, 'exp': exp}, SECRET, algorithm='HS256')
+
+
+def test_token_en_cache_hasta_su_exp(monkeypatch):
+    verifier = TokenVerifier(SECRET, 'HS256')
+    value = token(int(time.time()) + 60)
+    calls = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(auth.jwt, 'decode', lambda *a, **k: calls.append(1) or real_decode(*a, **k))
+
+    assert verifier.decode(value)['sub'] == 1
+    assert verifier.from_header(f'Bearer {value}')['sub'] == 1
+    assert len(calls) == 1 and verifier.stats() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+    # Pasado el exp la entrada guardada no se usa y el token se vuelve a verificar
+    now = time.time()
+    monkeypatch.setattr(auth.time, 'time', lambda: now + 120)
+    verifier.decode(value)
+    assert len(calls) == 2 and verifier.stats()['misses'] == 2
+
+
+def test_token_vencido_o_invalido():
+    verifier = TokenVerifier(SECRET, 'HS256')
+    with pytest.raises(AuthError) as error:
+        verifier.decode(token(int(time.time()) - 10))
+    assert error.value.status == 401 and 'expired' in error.value.detail
+    with pytest.raises(AuthError):
+        verifier.decode(jwt.encode({'sub': 1}, 'otra clave', algorithm='HS256'))
+    for header in ('', 'Basic abc', 'Bearer'):
+        with pytest.raises(AuthError):
+            verifier.from_header(header)
+    assert verifier.stats()['entries'] == 0
+
+
+def test_cache_acotado():
+    verifier = TokenVerifier(SECRET, 'HS256', max_entries=2)
+    exp = int(time.time()) + 60
+    first, second, third = (token(exp, sub) for sub in (1, 2, 3))
+    for value in (first, second, first, third):
+        verifier.decode(value)
+    assert list(verifier._cache) == [first, third]
+
+
+def test_login_required_y_login_optional(api):
+    client = api.app.test_client()
+    assert client.put('/api/profile', json={}).status_code == 401
+    response = client.put('/api/profile', json={}, headers={'Authorization': 'Bearer basura'})
+    assert response.status_code == 401 and response.get_json()['error'] == 'Token inválido'
+    assert client.put('/api/profile', json={}, headers=bearer(api, 2, expires_in=-10)).status_code == 401
+
+    # login_optional deja pasar sin usuario
+    response = client.get('/api/me', headers={'Authorization': 'Bearer basura'})
+    assert response.status_code == 401 and response.get_json() == {'logged_in': False}
+
+
+def test_rol_en_cache_se_invalida_al_editar_el_usuario(api):
+    roles = {1: 'Administrador', 2: 'Usuario'}
+
+    def responder(sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT rol FROM usuario'):
+            return [{'rol': roles[params[0]]}]
+        if sql.startswith('SELECT id_usuario, foto FROM usuario'):
+            return [{'id_usuario': params[0], 'foto': None}]
+        if sql.startswith('UPDATE usuario SET rol = %s'):
+            roles[params[1]] = params[0]
+        return []
+
+    api.db_pool.responder = responder
+    client = api.app.test_client()
+    as_user = bearer(api, 2)
+    assert client.delete('/api/admin/publications/9', headers=as_user).status_code == 403
+    assert client.delete('/api/admin/publications/9', headers=as_user).status_code == 403
+    role_reads = [sql for sql, _ in api.db_pool.executed if sql.startswith('SELECT rol')]
+    assert len(role_reads) == 1
+
+    response = client.put('/api/admin/users/2', json={'rol': 'Administrador'}, headers=bearer(api, 1))
+    assert response.status_code == 200
+    # Sin esperar el TTL: el nuevo rol se lee en la petición siguiente
+    assert client.delete('/api/admin/publications/9', headers=as_user).status_code == 404
@@ -0,0 +1,174 @@
+import socketserver
+import threading
+
+import pytest
+
+from cache import Cache, CacheBackendError, LocalCacheBackend, RedisCacheBackend
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    """Servidor RESP mínimo con los comandos que usa RedisCacheBackend"""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        assert line[:1] == b'*'
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def bulk(self, value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, args = args[0].upper(), args[1:]
+            server.commands.append(name.decode())
+            data = server.data
+            if name == b'AUTH':
+                reply = b'+OK\r\n' if args[0] == b'secreto' else b'-WRONGPASS invalid password\r\n'
+            elif name == b'SELECT':
+                reply = b'+OK\r\n'
+            elif name == b'SET':
+                data[args[0]] = args[1]
+                reply = b'+OK\r\n'
+            elif name == b'MGET':
+                reply = b'*%d\r\n' % len(args) + b''.join(self.bulk(data.get(key)) for key in args)
+            elif name == b'DEL':
+                reply = b':%d\r\n' % int(data.pop(args[0], None) is not None)
+            elif name == b'INCR':
+                data[args[0]] = b'%d' % (int(data.get(args[0], b'0')) + 1)
+                reply = b':' + data[args[0]] + b'\r\n'
+            elif name == b'DBSIZE':
+                reply = b':%d\r\n' % len(data)
+            elif name == b'QUIT':
+                return
+            else:
+                reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), RespHandler)
+        self.data = {}
+        self.commands = []
+
+
+@pytest.fixture
+def resp_server():
+    server = RespServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_invalidacion_por_etiquetas():
+    cache = Cache(LocalCacheBackend())
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get_or_set('catalogo', loader, tags=['publicaciones']) == 1
+    assert cache.get_or_set('catalogo', loader, tags=['publicaciones']) == 1
+    cache.invalidate_tags('otra')
+    assert cache.get('catalogo') == (True, 1)
+    cache.invalidate_tags('publicaciones')
+    assert cache.get('catalogo') == (False, None)
+    assert cache.get_or_set('catalogo', loader, tags=['publicaciones']) == 2
+    stats = cache.stats()
+    assert stats['hits'] == 2 and stats['invalidations'] == 2
+
+
+def test_invalidacion_durante_la_carga():
+    cache = Cache(LocalCacheBackend())
+
+    def loader():
+        # Una escritura invalida la etiqueta mientras se calcula el valor
+        cache.invalidate_tags('publicaciones')
+        return 'viejo'
+
+    assert cache.get_or_set('catalogo', loader, tags=['publicaciones']) == 'viejo'
+    assert cache.get('catalogo') == (False, None)
+
+
+def test_etiqueta_desalojada_cuenta_como_invalidada():
+    backend = LocalCacheBackend(max_entries=10, max_counters=2)
+    cache = Cache(backend)
+    cache.invalidate_tags('a')
+    cache.set('x', 'valor', tags=['a'])
+    cache.set('y', 'sin invalidar', tags=['nunca'])
+    # Al crear dos etiquetas más, 'a' sale del LRU de versiones
+    cache.invalidate_tags('b', 'c')
+    assert len(backend._counters) == 2
+    assert cache.get('x') == (False, None)
+    assert cache.get('y') == (False, None)
+    # Las versiones siguen creciendo después de un desalojo
+    cache.set('z', 'nuevo', tags=['a'])
+    assert cache.get('z') == (True, 'nuevo')
+    cache.invalidate_tags('a')
+    assert cache.get('z') == (False, None)
+
+
+def test_lru_de_entradas():
+    backend = LocalCacheBackend(max_entries=2)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get_many(['a'])
+    backend.set('c', 3)
+    assert backend.get_many(['a', 'b', 'c']) == [1, None, 3]
+
+
+def test_redis_backend(resp_server):
+    port = resp_server.server_address[1]
+    cache = Cache(RedisCacheBackend(f'redis://:secreto@127.0.0.1:{port}/2'))
+    value = {'items': [1, 2], 'texto': 'ñandú'}
+    assert cache.get_or_set('catalogo', lambda: value, ttl=30, tags=['publicaciones']) == value
+    assert cache.get('catalogo') == (True, value)
+    assert cache.backend.get_counters(['si:t:publicaciones', 'si:t:nada']) == [0, 0]
+    cache.invalidate_tags('publicaciones')
+    assert cache.backend.get_counters(['si:t:publicaciones']) == [1]
+    assert cache.get('catalogo') == (False, None)
+    cache.delete('catalogo')
+    assert cache.backend.get_many(['si:v:catalogo']) == [None]
+    assert cache.stats()['entries'] == 1
+    assert resp_server.commands[:2] == ['AUTH', 'SELECT']
+    assert 'SET' in resp_server.commands and 'INCR' in resp_server.commands
+
+
+def test_redis_backend_reconecta_tras_un_error(resp_server):
+    port = resp_server.server_address[1]
+    backend = RedisCacheBackend(f'redis://:incorrecta@127.0.0.1:{port}/0')
+    with pytest.raises(CacheBackendError):
+        backend.incr('x')
+    assert backend._sock is None
+    backend.password = 'secreto'
+    assert backend.incr('x') == 1
+    assert backend.incr('x') == 2
+
+
+def test_redis_no_disponible():
+    cache = Cache(RedisCacheBackend('redis://127.0.0.1:1/0', timeout=0.2))
+    assert cache.get_or_set('k', lambda: 'calculado', tags=['t']) == 'calculado'
+    assert cache.get('k') == (False, None)
+    assert cache.stats()['errors'] >= 1
+
+
+def test_none_no_se_guarda():
+    cache = Cache(LocalCacheBackend())
+    assert cache.get_or_set('perfil:99', lambda: None, tags=['usuario:99']) is None
+    assert cache.get('perfil:99') == (False, None)
@@ -0,0 +1,146 @@
+import io
+import os
+import threading
+import time
+
+import pytest
+
+from chunked_uploads import ChunkedUploads, UploadSessionError, finalized_paths, parse_content_range
+from storage import ContentStore, IMAGE_KINDS
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+
+class CutStream(io.BytesIO):
+    """Cuerpo de una parte que se corta tras `keep` bytes"""
+
+    def __init__(self, data, keep):
+        super().__init__(data[:keep])
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    store = ContentStore(str(tmp_path))
+    return ChunkedUploads(store, {'photo': (len(PNG) * 2, IMAGE_KINDS)}, ttl_seconds=3600, max_chunk=400)
+
+
+def put(uploads, upload_id, start, end, data=None):
+    body = PNG[start:end + 1] if data is None else data
+    return uploads.write(upload_id, 1, io.BytesIO(body), f'bytes {start}-{end}/{len(PNG)}', end - start + 1)
+
+
+def test_parse_content_range():
+    assert parse_content_range('bytes 0-99/200') == (0, 99, 200)
+    for value in ('bytes 10-5/20', 'bytes 0-20/20', 'items 0-1/2', None):
+        with pytest.raises(UploadSessionError):
+            parse_content_range(value)
+
+
+def test_reanuda_desde_el_offset_tras_un_corte(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    assert put(uploads, upload_id, 0, 399)['offset'] == 400
+
+    # La conexión se corta a mitad de la segunda parte: se conserva lo recibido
+    cut = uploads.write(upload_id, 1, CutStream(PNG[400:800], 150), f'bytes 400-799/{len(PNG)}')
+    assert cut['offset'] == 550
+    assert uploads.status(upload_id, 1)['offset'] == 550
+
+    # Una parte que no continúa desde el offset se rechaza indicando desde dónde seguir
+    with pytest.raises(UploadSessionError) as e:
+        put(uploads, upload_id, 600, 899)
+    assert e.value.status == 409 and e.value.offset == 550
+
+    # Reenviar una parte ya recibida no cambia nada
+    assert put(uploads, upload_id, 0, 399)['offset'] == 550
+
+    put(uploads, upload_id, 550, 949)
+    put(uploads, upload_id, 950, len(PNG) - 1)
+    data, stored = uploads.complete(upload_id, 1)
+    assert data['complete'] and stored.size == len(PNG)
+    with open(uploads.store.absolute_path(stored.path), 'rb') as f:
+        assert f.read() == PNG
+    assert uploads.resolve(upload_id, 1, 'photo').path == stored.path
+
+
+def test_completar_antes_de_tiempo(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    put(uploads, upload_id, 0, 399)
+    with pytest.raises(UploadSessionError) as e:
+        uploads.complete(upload_id, 1)
+    assert e.value.status == 409 and e.value.offset == 400
+
+
+def test_rechaza_tipo_y_tamanos(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    with pytest.raises(UploadSessionError) as e:
+        put(uploads, upload_id, 0, 99, b'%PDF-1.4' + b'\x00' * 92)
+    assert e.value.status == 415 and e.value.offset == 0
+    assert uploads.status(upload_id, 1)['offset'] == 0
+    with pytest.raises(UploadSessionError) as e:
+        put(uploads, upload_id, 0, 499)
+    assert e.value.status == 413
+    with pytest.raises(UploadSessionError) as e:
+        uploads.create(1, 'photo', len(PNG) * 3)
+    assert e.value.status == 413
+
+
+def test_otro_usuario_no_ve_la_subida(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    with pytest.raises(UploadSessionError) as e:
+        uploads.status(upload_id, 2)
+    assert e.value.status == 404
+
+
+def test_parte_que_compite_con_complete(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    for start in range(0, len(PNG), 400):
+        put(uploads, upload_id, start, min(start + 399, len(PNG) - 1))
+
+    # complete() queda detenido dentro del candado mientras mueve el parcial
+    ingesting, resume = threading.Event(), threading.Event()
+    ingest = uploads.store.ingest
+
+    def slow_ingest(*args):
+        ingesting.set()
+        resume.wait(5)
+        return ingest(*args)
+
+    uploads.store.ingest = slow_ingest
+    completer = threading.Thread(target=uploads.complete, args=(upload_id, 1))
+    completer.start()
+    ingesting.wait(5)
+    errors = []
+
+    def retry_first_part():
+        try:
+            put(uploads, upload_id, 0, 399)
+        except UploadSessionError as e:
+            errors.append(e)
+
+    writer = threading.Thread(target=retry_first_part)
+    writer.start()
+    time.sleep(0.05)
+    resume.set()
+    completer.join()
+    writer.join()
+    assert [e.status for e in errors] == [409]
+    assert uploads.status(upload_id, 1)['complete']
+
+
+def test_finalizadas_vigentes_cuentan_como_referenciadas(uploads):
+    upload_id = uploads.create(1, 'photo', len(PNG))['upload_id']
+    for start in range(0, len(PNG), 400):
+        put(uploads, upload_id, start, min(start + 399, len(PNG) - 1))
+    _, stored = uploads.complete(upload_id, 1)
+    # El archivo finalizado cuenta desde ahora para el período de gracia del recolector
+    assert time.time() - os.stat(uploads.store.absolute_path(stored.path)).st_mtime < 60
+
+    pending = uploads.create(1, 'photo', len(PNG))['upload_id']
+    assert finalized_paths(uploads.store.root) == {stored.path}
+
+    # Al vencer la sesión deja de protegerse
+    meta = uploads._read_meta(upload_id)
+    meta['expires'] = time.time() - 1
+    uploads._save(meta)
+    assert finalized_paths(uploads.store.root) == set()
+    assert uploads._read_meta(pending) is not None
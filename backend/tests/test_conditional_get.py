@@ -0,0 +1,53 @@
+import datetime
+
+from conftest import bearer
+
+USER = {'id_usuario': 7, '1_nombre': 'Ana', 'correo_electronico': 'ana@example.com'}
+ITEM = {'id_lista_deseos': 1, 'id_publicacion': 5, 'nombre': 'Camisa',
+        'fecha_agregado': datetime.datetime(2024, 3, 1, 12, 0, 0)}
+
+
+def test_if_none_match_responde_304_sin_cuerpo(api):
+    user = dict(USER)
+    api.db_pool.responder = lambda sql, params: [user]
+    client = api.app.test_client()
+
+    first = client.get('/api/profile/7')
+    etag = first.headers['ETag']
+    assert etag and first.headers['Cache-Control'] == 'no-cache'
+    assert 'Authorization' in first.headers['Vary']
+
+    again = client.get('/api/profile/7', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+    # Si cambian los datos cambia el ETag y la respuesta vuelve completa
+    user['1_nombre'] = 'Ana María'
+    api.cache.invalidate_tags('usuario:7')
+    changed = client.get('/api/profile/7', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['data']['1_nombre'] == 'Ana María'
+
+
+def test_respuesta_privada_con_last_modified(api):
+    api.db_pool.responder = lambda sql, params: [ITEM]
+    client = api.app.test_client()
+    headers = bearer(api, 3)
+
+    first = client.get('/api/wishlist', headers=headers)
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    assert first.headers['Last-Modified'] == 'Fri, 01 Mar 2024 12:00:00 GMT'
+
+    since = client.get('/api/wishlist', headers=dict(headers, **{'If-Modified-Since': first.headers['Last-Modified']}))
+    assert since.status_code == 304 and since.data == b''
+
+
+def test_solo_gets_exitosos_de_las_rutas_listadas(api):
+    client = api.app.test_client()
+    missing = client.get('/api/profile/99')
+    assert missing.status_code == 404 and 'ETag' not in missing.headers
+    # Solo GET: el POST del mismo endpoint no lleva ETag
+    response = client.post('/api/valoraciones/7', json={})
+    assert 'ETag' not in response.headers
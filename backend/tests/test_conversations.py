@@ -0,0 +1,122 @@
+import pytest
+
+import conversations
+from conftest import FakeConnection
+
+USERS = {1: {'id_usuario': 1, '1_nombre': 'Ana', '1_apellido': 'Pérez'},
+         2: {'id_usuario': 2, '1_nombre': 'Luis', '1_apellido': 'Gómez'}}
+
+
+def message(message_id, sender, recipient):
+    return {'id_mensaje': message_id, 'id_emisor': sender, 'id_receptor': recipient,
+            'contenido': f'mensaje {message_id}'}
+
+
+class MessageTables:
+    """Responde las consultas de fetch_messages sobre `mensaje` y `mensaje_archivo` en memoria"""
+
+    def __init__(self, hot, archived):
+        self.tables = {'mensaje': hot, 'mensaje_archivo': archived}
+        self.reads = []
+
+    def __call__(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT MAX(id_mensaje)'):
+            ids = [row['id_mensaje'] for row in self.tables['mensaje_archivo']]
+            return [{'max_id': max(ids) if ids else None}]
+        if sql.startswith('SELECT id_usuario'):
+            return [USERS[user_id] for user_id in params if user_id in USERS]
+        table = 'mensaje_archivo' if 'FROM mensaje_archivo' in sql else 'mensaje'
+        self.reads.append(table)
+        params = list(params)
+        branches = sql.count('SELECT *')
+        limited = ' LIMIT ' in sql
+        has_condition = 'id_mensaje >' in sql or 'id_mensaje <' in sql
+        forward = 'ASC' in sql
+        rows = []
+        for _ in range(branches):
+            sender, recipient = params.pop(0), params.pop(0)
+            bound = params.pop(0) if has_condition else None
+            branch_limit = params.pop(0) if limited else None
+            branch = [row for row in self.tables[table]
+                      if row['id_emisor'] == sender and row['id_receptor'] == recipient
+                      and (bound is None or (row['id_mensaje'] > bound if forward else row['id_mensaje'] < bound))]
+            branch.sort(key=lambda row: row['id_mensaje'], reverse=not forward)
+            rows.extend(branch[:branch_limit])
+        rows.sort(key=lambda row: row['id_mensaje'], reverse=not forward)
+        return [dict(row) for row in rows[:params.pop(0) if limited else None]]
+
+
+def fetch(hot, archived, **kwargs):
+    tables = MessageTables(hot, archived)
+    conn = FakeConnection(tables)
+    with conn.cursor() as cur:
+        messages, has_more = conversations.fetch_messages(cur, 1, 2, **kwargs)
+    return [row['id_mensaje'] for row in messages], has_more, tables.reads
+
+
+# Ids 1-6 archivados, 7-12 en la tabla caliente; intercalados entre ambos sentidos
+ARCHIVED = [message(i, 1 + i % 2, 2 - i % 2) for i in range(1, 7)]
+HOT = [message(i, 1 + i % 2, 2 - i % 2) for i in range(7, 13)]
+OTHER_PAIR = [message(100, 1, 3), message(101, 3, 1)]
+
+
+def test_pagina_reciente_sin_tocar_el_archivo():
+    ids, has_more, reads = fetch(HOT + OTHER_PAIR, ARCHIVED, limit=4)
+    assert ids == [9, 10, 11, 12]
+    assert has_more
+    assert reads == ['mensaje']
+
+
+def test_pagina_que_cruza_al_archivo():
+    ids, has_more, reads = fetch(HOT, ARCHIVED, before_id=9, limit=4)
+    assert ids == [5, 6, 7, 8]
+    assert has_more
+    assert reads == ['mensaje', 'mensaje_archivo']
+
+    ids, has_more, _ = fetch(HOT, ARCHIVED, before_id=5, limit=10)
+    assert ids == [1, 2, 3, 4]
+    assert not has_more
+
+
+def test_historial_completo_une_ambas_tablas():
+    ids, has_more, _ = fetch(HOT, ARCHIVED)
+    assert ids == list(range(1, 13))
+    assert not has_more
+
+
+def test_mensajes_nuevos_despues_de_un_id():
+    ids, has_more, reads = fetch(HOT, ARCHIVED, after_id=10, limit=5)
+    assert ids == [11, 12]
+    assert not has_more
+    assert reads == ['mensaje']
+
+    ids, has_more, reads = fetch(HOT, ARCHIVED, after_id=4, limit=3)
+    assert ids == [5, 6, 7]
+    assert has_more
+    assert reads == ['mensaje', 'mensaje_archivo']
+
+
+def test_un_mensaje_copiado_a_medias_no_se_duplica():
+    # archive_messages copia y luego borra: entre ambos pasos el mensaje está en las dos tablas
+    ids, _, _ = fetch(HOT + [message(6, 1, 2)], ARCHIVED, before_id=8, limit=3)
+    assert ids == [5, 6, 7]
+
+
+def test_agrega_los_nombres():
+    conn = FakeConnection(MessageTables(HOT, []))
+    with conn.cursor() as cur:
+        messages, _ = conversations.fetch_messages(cur, 1, 2, limit=1)
+    assert messages[0]['emisor_nombre'] == 'Ana' and messages[0]['receptor_apellido'] == 'Gómez'
+
+
+@pytest.mark.parametrize('reader, column', [(1, 'no_leidos_1'), (2, 'no_leidos_2')])
+def test_mark_read_descuenta_del_lado_del_lector(reader, column):
+    conn = FakeConnection()
+    with conn.cursor() as cur:
+        conversations.mark_read(cur, reader, 3 - reader, 4)
+        conversations.mark_read(cur, reader, 3 - reader, 0)
+    (update, params), (total, total_params) = conn.executed
+    assert f'SET {column} = GREATEST({column} - %s, 0)' in update
+    assert params == (4, 1, 2)
+    assert total_params == (4, reader)
@@ -0,0 +1,75 @@
+import pymysql
+import pytest
+from pymysql.constants import SERVER_STATUS
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class RawConnection:
+    def __init__(self):
+        self.server_status = 0
+        self.closed = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return 'cursor'
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.server_status = 0
+
+    def ping(self, reconnect=False):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(**options):
+    created = []
+
+    def creator():
+        created.append(RawConnection())
+        return created[-1]
+    return ConnectionPool(creator, **options), created
+
+
+def test_reutiliza_la_conexion_devuelta():
+    pool, created = make_pool(size=1, max_overflow=0)
+    conn = pool.connection()
+    assert conn.cursor() == 'cursor'
+    conn.close()
+    with pool.connection() as again:
+        assert again._raw is created[0]
+    assert len(created) == 1 and pool.stats()['reused'] == 1
+
+
+def test_usar_despues_de_close_falla():
+    pool, created = make_pool(size=1, max_overflow=0)
+    conn = pool.connection()
+    conn.close()
+    with pytest.raises(pymysql.err.InterfaceError):
+        conn.cursor()
+    with pytest.raises(pymysql.err.InterfaceError):
+        conn.commit()
+    conn.close()  # cerrar dos veces no devuelve la conexión dos veces
+    assert pool.stats()['idle'] == 1
+
+
+def test_revierte_transacciones_abiertas_al_devolver():
+    pool, created = make_pool(size=1, max_overflow=0)
+    conn = pool.connection()
+    created[0].server_status = SERVER_STATUS.SERVER_STATUS_IN_TRANS
+    conn.close()
+    assert created[0].rollbacks == 1
+
+
+def test_overflow_se_cierra_y_el_pool_agotado_espera():
+    pool, created = make_pool(size=1, max_overflow=1, timeout=0.05)
+    first, second = pool.connection(), pool.connection()
+    with pytest.raises(PoolTimeoutError):
+        pool.connection()
+    first.close()
+    second.close()
+    assert created[1].closed and not created[0].closed
+    assert pool.stats()['open'] == 1
@@ -0,0 +1,90 @@
+import json
+import threading
+
+from conftest import bearer
+from events import EventHub, LocalBroker, stream
+
+
+def test_entrega_solo_al_usuario_destino():
+    hub = EventHub()
+    ana, ana_otra_pestania, luis = hub.subscribe(1), hub.subscribe(1), hub.subscribe(2)
+    hub.dispatch({1}, 'message', '{"id": 10}')
+    assert ana.get(timeout=0) == (1, 'message', '{"id": 10}')
+    assert ana_otra_pestania.get(timeout=0) == (1, 'message', '{"id": 10}')
+    assert luis.get(timeout=0) is None
+    assert hub.stats() == {'published': 1, 'delivered': 2, 'dropped': 0, 'connections': 3, 'users': 2}
+
+    ana.close()
+    ana_otra_pestania.close()
+    hub.dispatch({1}, 'message', '{}')
+    assert hub.stats()['users'] == 1
+
+
+def test_suscriptor_lento_se_desconecta():
+    hub = EventHub(max_pending=2)
+    lento, rapido = hub.subscribe(1), hub.subscribe(1)
+    for n in range(3):
+        hub.dispatch({1}, 'read', str(n))
+        rapido.get(timeout=0)
+    assert lento.overflowed and not rapido.overflowed
+    stats = hub.stats()
+    assert stats['dropped'] == 1 and stats['delivered'] == 5 and stats['connections'] == 1
+    events = list(stream(lento, heartbeat=0, max_seconds=5))
+    assert events[-1].startswith('id: 0\nevent: ready')
+
+
+def test_contadores_concurrentes():
+    hub = EventHub(max_pending=10000)
+    subscriptions = [hub.subscribe(user_id) for user_id in range(4)]
+
+    def publish():
+        for _ in range(500):
+            hub.dispatch(range(4), 'message', '{}')
+
+    threads = [threading.Thread(target=publish) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hub.stats()['delivered'] == 4 * 500 * len(subscriptions)
+
+
+def test_heartbeat_y_cierre_por_tiempo():
+    hub = EventHub()
+    subscription = hub.subscribe(3)
+    events = stream(subscription, heartbeat=0.01, max_seconds=0.05, retry_ms=1000)
+    assert next(events) == 'retry: 1000\n\n'
+    assert next(events) == 'id: 0\nevent: ready\ndata: {"user_id": 3}\n\n'
+    hub.dispatch({3}, 'transaction', '{"estado": "pagado"}')
+    assert next(events) == 'id: 1\nevent: transaction\ndata: {"estado": "pagado"}\n\n'
+    rest = list(events)
+    assert rest and set(rest) == {': ping\n\n'}
+    # Al terminar el flujo la suscripción se libera
+    assert hub.connections() == 0
+
+
+def test_ruta_acepta_token_en_la_url(api, monkeypatch):
+    broker = LocalBroker(EventHub())
+    monkeypatch.setattr(api, 'event_broker', broker)
+    monkeypatch.setattr(api, 'EVENTS_MAX_SECONDS', 0)
+    client = api.app.test_client()
+    token = bearer(api, 4)['Authorization'].split(' ', 1)[1]
+
+    response = client.get(f'/api/events?token={token}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+    body = response.get_data(as_text=True)
+    assert json.loads(body.split('data: ', 1)[1].split('\n')[0]) == {'user_id': 4}
+
+    assert client.get('/api/events', headers=bearer(api, 4)).status_code == 200
+    assert broker.hub.connections() == 0
+
+
+def test_ruta_rechaza_tokens_invalidos(api):
+    client = api.app.test_client()
+    assert client.get('/api/events').status_code == 401
+    assert client.get('/api/events?token=basura').status_code == 401
+    expired = bearer(api, 4, expires_in=-10)['Authorization'].split(' ', 1)[1]
+    response = client.get(f'/api/events?token={expired}')
+    assert response.status_code == 401 and response.get_json()['error'] == 'Token inválido'
@@ -0,0 +1,97 @@
+import io
+import os
+import time
+
+import gc_uploads
+from chunked_uploads import ChunkedUploads
+from conftest import FakeConnection
+from storage import ContentStore, IMAGE_KINDS
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'contenido'
+DAY = 24 * 3600
+
+
+def age(store, relpath, seconds):
+    path = store.absolute_path(relpath)
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+    return path
+
+
+def derivative(store, stored, size='md'):
+    path = os.path.join(os.path.dirname(store.absolute_path(stored.path)), f"{stored.digest}__{size}.webp")
+    with open(path, 'wb') as f:
+        f.write(b'webp')
+    return os.path.relpath(path, store.root).replace(os.sep, '/')
+
+
+def references(*urls):
+    """Responde las columnas de prenda.foto como tuplas (SSCursor); el resto sin filas"""
+    def responder(sql, params):
+        return [(url,) for url in urls] if sql.startswith('SELECT foto FROM prenda') else []
+    return responder
+
+
+def test_conserva_referenciados_recientes_y_finalizados(tmp_path):
+    store = ContentStore(str(tmp_path))
+    referenced = store.save([PNG + b'1'], 'png')
+    orphan = store.save([PNG + b'2'], 'png')
+    recent = store.save([PNG + b'3'], 'png')
+    orphan_variant = derivative(store, orphan)
+    referenced_variant = derivative(store, referenced)
+    for relpath in (referenced.path, orphan.path, orphan_variant, referenced_variant):
+        age(store, relpath, 3 * DAY)
+
+    # Subida por partes finalizada que todavía no tiene fila en la base
+    uploads = ChunkedUploads(store, {'photo': (1024, IMAGE_KINDS)}, ttl_seconds=3600)
+    upload_id = uploads.create(1, 'photo', len(PNG + b'4'))['upload_id']
+    uploads.write(upload_id, 1, io.BytesIO(PNG + b'4'), f'bytes 0-{len(PNG)}/{len(PNG) + 1}')
+    _, finalized = uploads.complete(upload_id, 1)
+    age(store, finalized.path, 3 * DAY)
+
+    conn = FakeConnection(references(referenced.url + '?size=md', 'https://example.com/x.png'))
+    stats = gc_uploads.collect(conn, root=store.root, grace_seconds=DAY)
+
+    assert stats['deleted'] == 2 and stats['recent'] == 1 and stats['errors'] == 0
+    assert not os.path.exists(store.absolute_path(orphan.path))
+    assert not os.path.exists(store.absolute_path(orphan_variant))
+    for kept in (referenced, recent, finalized):
+        assert os.path.exists(store.absolute_path(kept.path))
+    assert os.path.exists(store.absolute_path(referenced_variant))
+    # La sesión en .partial/ no es un huérfano
+    assert uploads.status(upload_id, 1)['complete']
+
+    forget = [(sql, params) for sql, params in conn.executed if sql.startswith('DELETE FROM archivo')]
+    assert len(forget) == 1 and sorted(forget[0][1]) == sorted([orphan.path, orphan_variant])
+    assert conn.commits == 1
+
+
+def test_dry_run_no_borra(tmp_path):
+    store = ContentStore(str(tmp_path))
+    orphan = store.save([PNG], 'png')
+    age(store, orphan.path, 3 * DAY)
+    conn = FakeConnection(references())
+    stats = gc_uploads.collect(conn, root=store.root, grace_seconds=DAY, dry_run=True)
+    assert stats['deleted'] == 1 and stats['bytes'] == len(PNG)
+    assert os.path.exists(store.absolute_path(orphan.path))
+    assert not any(sql.startswith('DELETE') for sql, _ in conn.executed)
+
+
+def test_borra_temporales_viejos_y_directorios_vacios(tmp_path):
+    store = ContentStore(str(tmp_path))
+    orphan = store.save([PNG], 'png')
+    age(store, orphan.path, 3 * DAY)
+    leftover = os.path.join(store._tmp, 'subida.part')
+    with open(leftover, 'wb') as f:
+        f.write(b'x')
+    os.utime(leftover, (time.time() - 3 * DAY,) * 2)
+
+    gc_uploads.collect(FakeConnection(references()), root=store.root, grace_seconds=DAY)
+    assert not os.path.exists(leftover)
+    assert not os.path.exists(os.path.dirname(store.absolute_path(orphan.path)))
+
+
+def test_run_locked_respeta_el_bloqueo(tmp_path):
+    conn = FakeConnection(lambda sql, params: [{'got': 0}] if 'GET_LOCK' in sql else [])
+    assert gc_uploads.run_locked(conn, root=str(tmp_path)) is None
+    assert not any('RELEASE_LOCK' in sql for sql, _ in conn.executed)
@@ -0,0 +1,90 @@
+import os
+import threading
+
+from PIL import Image
+
+import images
+
+ORIENTATION = 0x0112
+
+
+def save_photo(folder, name='foto.jpg', size=(2000, 1000), orientation=None, color=(200, 30, 30)):
+    img = Image.new('RGB', size, color)
+    exif = Image.Exif()
+    exif[0x010F] = 'Camara de prueba'  # Make
+    if orientation:
+        exif[ORIENTATION] = orientation
+    img.save(os.path.join(folder, name), 'JPEG', exif=exif.tobytes())
+    return name
+
+
+def test_tamanios_y_formatos(tmp_path):
+    name = save_photo(str(tmp_path))
+    images.generate_all(str(tmp_path), name)
+    for size, width in images.IMAGE_SIZES.items():
+        for fmt, (pil_format, ext, _, _) in images.IMAGE_FORMATS.items():
+            derivative = tmp_path / f'foto__{size}.{ext}'
+            with Image.open(derivative) as img:
+                assert img.format == pil_format
+                assert img.size == (width, width // 2)
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        [name] + [images.derivative_name(name, size, fmt) for size in images.IMAGE_SIZES for fmt in images.IMAGE_FORMATS])
+
+
+def test_no_agranda_imagenes_pequenias(tmp_path):
+    name = save_photo(str(tmp_path), size=(100, 80))
+    derivative = images.ensure_derivative(str(tmp_path), name, 'lg', 'webp')
+    with Image.open(tmp_path / derivative) as img:
+        assert img.size == (100, 80)
+
+
+def test_aplica_la_orientacion_exif(tmp_path):
+    # Orientación 6: la cámara guardó la foto acostada; se muestra girada 90°
+    name = save_photo(str(tmp_path), size=(800, 400), orientation=6)
+    derivative = images.ensure_derivative(str(tmp_path), name, 'sm', 'jpeg')
+    with Image.open(tmp_path / derivative) as img:
+        assert img.size == (320, 640)
+
+
+def test_sin_metadatos(tmp_path):
+    name = save_photo(str(tmp_path), orientation=6)
+    with Image.open(tmp_path / name) as original:
+        assert original.getexif()
+    for fmt in images.IMAGE_FORMATS:
+        derivative = images.ensure_derivative(str(tmp_path), name, 'sm', fmt)
+        with Image.open(tmp_path / derivative) as img:
+            assert not img.getexif()
+            assert 'exif' not in img.info and 'icc_profile' not in img.info
+
+
+def test_transparencia_en_jpeg_sobre_blanco(tmp_path):
+    Image.new('RGBA', (50, 50), (0, 0, 0, 0)).save(tmp_path / 'logo.png')
+    derivative = images.ensure_derivative(str(tmp_path), 'logo.png', 'sm', 'jpeg')
+    with Image.open(tmp_path / derivative) as img:
+        assert img.mode == 'RGB' and img.getpixel((10, 10)) == (255, 255, 255)
+
+
+def test_no_deriva_derivados_ni_otros_tipos(tmp_path):
+    assert images.ensure_derivative(str(tmp_path), 'foto__sm.webp', 'sm', 'webp') is None
+    assert images.ensure_derivative(str(tmp_path), 'comprobante.pdf', 'sm', 'webp') is None
+    assert images.ensure_derivative(str(tmp_path), 'falta.jpg', 'sm', 'webp') is None
+    assert images.ensure_derivative(str(tmp_path), 'foto.jpg', 'xl', 'webp') is None
+    assert images.generate_in_background(str(tmp_path), 'comprobante.pdf') is None
+
+
+def test_segundo_plano_con_pool_acotado(tmp_path, monkeypatch):
+    name = save_photo(str(tmp_path), size=(400, 200))
+    images.generate_in_background(str(tmp_path), name).result(timeout=30)
+    assert os.path.exists(tmp_path / images.derivative_name(name, 'md', 'webp'))
+    assert images._executor._max_workers == images.IMAGE_WORKERS
+
+    # Sin cupos libres no se encola nada: el derivado se generará al pedirse
+    monkeypatch.setattr(images, '_slots', threading.BoundedSemaphore(1))
+    images._slots.acquire()
+    assert images.generate_in_background(str(tmp_path), name) is None
+
+
+def test_variant_urls():
+    assert [v['size'] for v in images.variant_urls('/uploads/ab/cd/abcd.jpg')] == list(images.IMAGE_SIZES)
+    assert images.variant_urls('/uploads/ab/cd/abcd.pdf') == []
+    assert images.variant_urls('https://example.com/a.jpg') == []
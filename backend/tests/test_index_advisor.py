@@ -0,0 +1,54 @@
+import os
+import re
+
+import pytest
+
+import index_advisor
+
+APP_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+ROUTE_RE = re.compile(r"@app\.route\('(?P<path>[^']+)'(?:,\s*methods=\[(?P<methods>[^\]]*)\])?\)")
+
+
+def app_get_routes():
+    with open(APP_PY, encoding='utf-8') as f:
+        source = f.read()
+    routes = set()
+    for match in ROUTE_RE.finditer(source):
+        methods = match.group('methods')
+        if methods is None or "'GET'" in methods:
+            routes.add(match.group('path'))
+    return routes
+
+
+def test_cada_get_de_la_app_se_reproduce():
+    replayed = {index_advisor.route_pattern(path) for _, path, _ in index_advisor.ROUTES}
+    skipped = {index_advisor.route_pattern(path) for path in index_advisor.SKIPPED_ROUTES}
+    missing = sorted(path for path in app_get_routes()
+                     if index_advisor.route_pattern(path) not in replayed | skipped)
+    assert missing == []
+
+
+def test_rutas_omitidas_existen():
+    existing = {index_advisor.route_pattern(path) for path in app_get_routes()}
+    for path in index_advisor.SKIPPED_ROUTES:
+        assert index_advisor.route_pattern(path) in existing
+
+
+def test_bloquea_escrituras():
+    class Cursor:
+        def execute(self, sql, params=None):
+            pass
+
+    statements = []
+    cursor = index_advisor._RecordingCursor(Cursor(), statements)
+    cursor.execute('(SELECT 1) UNION ALL (SELECT 2)')
+    assert len(statements) == 1
+    with pytest.raises(index_advisor.ReadOnlyViolation):
+        cursor.execute('UPDATE usuario SET foto = NULL')
+    assert len(statements) == 1
+
+
+def test_rellena_parametros():
+    samples = {'pub': 7, 'other': 3}
+    assert index_advisor._fill('/api/messages/{other}?limit=30', samples) == '/api/messages/3?limit=30'
+    assert index_advisor._fill({'ids': ['{pub}']}, samples) == {'ids': [7]}
@@ -0,0 +1,96 @@
+import smtplib
+import socket
+
+import pytest
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+from mailer import EmailOutbox, is_permanent
+from tests.conftest import FakeConnection
+
+
+class Handler:
+    """Servidor SMTP de prueba: 550 en RCPT para rechazado@, 451 en DATA para ocupado@"""
+
+    def __init__(self):
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith('rechazado@'):
+            return '550 5.1.1 Usuario desconocido'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        if any(address.startswith('ocupado@') for address in envelope.rcpt_tos):
+            return '451 4.3.0 Intente mas tarde'
+        self.delivered.extend(envelope.rcpt_tos)
+        return '250 OK'
+
+
+@pytest.fixture
+def smtp_server():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    handler = Handler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        yield handler, port
+    finally:
+        controller.stop()
+
+
+def outbox_rows(*addresses):
+    return [{'id_email': i, 'destinatario': address, 'asunto': 'Prueba', 'cuerpo': 'Hola',
+             'adjuntos': None, 'intentos': 0} for i, address in enumerate(addresses, 1)]
+
+
+def test_process_batch_reuses_session_and_classifies_failures(smtp_server):
+    handler, port = smtp_server
+    rows = outbox_rows('uno@example.com', 'ocupado@example.com', 'rechazado@example.com', 'dos@example.com')
+    conn = FakeConnection(lambda sql, params: rows if 'SELECT id_email' in sql else [])
+    outbox = EmailOutbox(lambda: conn, '127.0.0.1', port, sender='tienda@example.com', use_tls=False,
+                         run_worker=False)
+
+    assert outbox.process_batch() == 4
+    outbox._session.close()
+
+    assert handler.delivered == ['uno@example.com', 'dos@example.com']
+    # Una sola conexión para todo el lote: los 4xx/5xx no cierran la sesión
+    assert outbox._session.connections == 1
+
+    updates = {params[-1]: params for sql, params in conn.executed
+               if sql.startswith('UPDATE email_outbox SET estado = %s')}
+    assert updates[2][0] == 'PENDIENTE'      # 451: se reintenta
+    assert updates[2][3] == 30               # espera inicial del backoff
+    assert updates[3][0] == 'FALLIDO'        # 550: permanente
+    assert outbox.stats()['sent'] == 2
+    assert outbox.stats()['retried'] == 1
+    assert outbox.stats()['failed'] == 1
+
+
+def test_is_permanent():
+    assert is_permanent(smtplib.SMTPDataError(554, b'rechazado'))
+    assert not is_permanent(smtplib.SMTPDataError(451, b'ocupado'))
+    assert is_permanent(smtplib.SMTPRecipientsRefused({'a@example.com': (550, b'no existe')}))
+    assert not is_permanent(smtplib.SMTPRecipientsRefused({'a@example.com': (450, b'buzon lleno')}))
+    assert not is_permanent(smtplib.SMTPServerDisconnected('cerrado'))
+    assert not is_permanent(ConnectionResetError())
+
+
+def test_reconnects_once_after_disconnect(smtp_server):
+    handler, port = smtp_server
+    rows = outbox_rows('uno@example.com', 'dos@example.com')
+    conn = FakeConnection(lambda sql, params: rows if 'SELECT id_email' in sql else [])
+    outbox = EmailOutbox(lambda: conn, '127.0.0.1', port, sender='tienda@example.com', use_tls=False,
+                         run_worker=False)
+    outbox._session._connect()
+    # Simular que el servidor cerró la sesión inactiva
+    outbox._session._server.sock.close()
+
+    assert outbox.process_batch() == 2
+    outbox._session.close()
+    assert handler.delivered == ['uno@example.com', 'dos@example.com']
+    assert outbox._session.connections == 2
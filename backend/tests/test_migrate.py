@@ -0,0 +1,119 @@
+import pymysql
+import pytest
+
+import migrate
+from conftest import FakeConnection
+
+
+class Schema:
+    """Simula schema_version y hace fallar las sentencias marcadas como ya aplicadas"""
+
+    def __init__(self, versions=None, lock=1, failures=None):
+        self.versions = versions  # None = la tabla no existe
+        self.lock = lock
+        self.failures = failures or {}
+
+    def __call__(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT GET_LOCK'):
+            return [{'got': self.lock}]
+        if sql.startswith('CREATE TABLE IF NOT EXISTS schema_version'):
+            self.versions = self.versions or []
+            return []
+        if sql.startswith('SELECT MAX(version)'):
+            if self.versions is None:
+                raise pymysql.err.ProgrammingError(migrate.NO_SUCH_TABLE, "Table 'schema_version' doesn't exist")
+            return [{'version': max(self.versions, default=None)}]
+        if sql.startswith('INSERT INTO schema_version'):
+            self.versions.append(params[0])
+            return []
+        for marker, error in self.failures.items():
+            if marker in sql:
+                raise error
+        return []
+
+
+@pytest.fixture
+def migrations(tmp_path, monkeypatch):
+    files = {
+        '0002_indices.sql': '-- índice del catálogo\nCREATE INDEX idx_a ON prenda (valor);\nALTER TABLE x ADD b INT;',
+        '0001_columnas.sql': 'ALTER TABLE usuario ADD verified BOOL;\n\nALTER TABLE usuario ADD foto TEXT;',
+        '0003_tabla.sql': 'CREATE TABLE archivo (ruta VARCHAR(255))',
+        'LEEME.txt': 'no es una migración',
+    }
+    for name, sql in files.items():
+        (tmp_path / name).write_text(sql, encoding='utf-8')
+    monkeypatch.setattr(migrate, 'MIGRATIONS_DIR', str(tmp_path))
+    return tmp_path
+
+
+def statements(conn):
+    return [sql for sql, _ in conn.executed if not sql.startswith('SELECT')]
+
+
+def test_aplica_en_orden_sobre_una_base_nueva(migrations):
+    schema = Schema()
+    conn = FakeConnection(schema)
+    assert migrate.upgrade(conn) == [1, 2, 3]
+    applied = [sql for sql in statements(conn) if not sql.startswith(('CREATE TABLE IF', 'INSERT INTO schema'))]
+    assert applied == ['ALTER TABLE usuario ADD verified BOOL', 'ALTER TABLE usuario ADD foto TEXT',
+                       'CREATE INDEX idx_a ON prenda (valor)', 'ALTER TABLE x ADD b INT',
+                       'CREATE TABLE archivo (ruta VARCHAR(255))']
+    assert schema.versions == [1, 2, 3] and conn.commits == 3
+    assert conn.executed[-1][0] == 'SELECT RELEASE_LOCK(%s)'
+
+
+def test_omite_las_versiones_aplicadas_y_respeta_el_limite(migrations):
+    schema = Schema(versions=[1])
+    conn = FakeConnection(schema)
+    assert migrate.upgrade(conn, target=2) == [2]
+    assert not any('usuario' in sql or 'archivo' in sql for sql in statements(conn))
+    assert migrate.upgrade(FakeConnection(schema)) == [3]
+    assert migrate.upgrade(FakeConnection(schema)) == []
+
+
+def test_tolera_columnas_e_indices_duplicados(migrations):
+    schema = Schema(failures={
+        'ADD verified': pymysql.err.OperationalError(1060, "Duplicate column name 'verified'"),
+        'CREATE INDEX idx_a': pymysql.err.OperationalError(1061, "Duplicate key name 'idx_a'"),
+    })
+    conn = FakeConnection(schema)
+    assert migrate.upgrade(conn) == [1, 2, 3]
+    # La sentencia siguiente a la duplicada igual se ejecuta
+    assert 'ALTER TABLE usuario ADD foto TEXT' in statements(conn)
+
+
+def test_otros_errores_cortan_y_liberan_el_bloqueo(migrations):
+    schema = Schema(failures={'ALTER TABLE x': pymysql.err.OperationalError(1054, "Unknown column")})
+    conn = FakeConnection(schema)
+    with pytest.raises(pymysql.err.OperationalError):
+        migrate.upgrade(conn)
+    assert schema.versions == [1]
+    assert conn.executed[-1][0] == 'SELECT RELEASE_LOCK(%s)'
+
+
+def test_sin_bloqueo_no_migra(migrations):
+    conn = FakeConnection(Schema(lock=0))
+    with pytest.raises(RuntimeError):
+        migrate.upgrade(conn)
+    assert len(conn.executed) == 1
+
+
+def test_arranque_al_dia_hace_una_sola_consulta(migrations):
+    conn = FakeConnection(Schema(versions=[1, 2, 3]))
+    assert migrate.migrate_on_boot(lambda: conn) == []
+    assert conn.executed == [('SELECT MAX(version) AS version FROM schema_version', ())]
+
+    schema = Schema()
+    assert migrate.migrate_on_boot(lambda: FakeConnection(schema)) == [1, 2, 3]
+
+
+def test_versiones_duplicadas(migrations):
+    (migrations / '0003_otra.sql').write_text('SELECT 1', encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        migrate.discover_migrations()
+
+
+def test_los_archivos_del_repo_tienen_versiones_correlativas():
+    versions = [version for version, _, _ in migrate.discover_migrations()]
+    assert versions == list(range(1, len(versions) + 1))
@@ -0,0 +1,70 @@
+import base64
+import os
+
+import pytest
+
+from migrate_photos import save_data_url
+from storage import ContentStore, UploadRejected
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def data_url(payload, mime='image/png'):
+    return f"data:{mime};base64,{base64.b64encode(payload).decode()}"
+
+
+def temp_files(store):
+    return os.listdir(store._tmp)
+
+
+def test_guarda_por_contenido(tmp_path):
+    store = ContentStore(str(tmp_path))
+    stored = save_data_url(data_url(PNG), store)
+    assert stored.path.endswith('.png')
+    assert stored.size == len(PNG)
+    with open(store.absolute_path(stored.path), 'rb') as f:
+        assert f.read() == PNG
+    # El mismo contenido no se duplica
+    again = save_data_url(data_url(PNG), store)
+    assert again.path == stored.path and not again.created
+    assert temp_files(store) == []
+
+
+def test_extension_sale_de_la_firma(tmp_path):
+    store = ContentStore(str(tmp_path))
+    # Se declara jpeg pero los bytes son PNG
+    stored = save_data_url(data_url(PNG, 'image/jpeg'), store)
+    assert stored.path.endswith('.png')
+
+
+def test_rechaza_contenido_que_no_es_imagen(tmp_path):
+    store = ContentStore(str(tmp_path))
+    with pytest.raises(UploadRejected) as e:
+        save_data_url(data_url(b'<script>alert(1)</script>' * 4), store)
+    assert e.value.status == 415
+    assert temp_files(store) == []
+
+
+def test_rechaza_archivo_corto_que_no_es_imagen(tmp_path):
+    store = ContentStore(str(tmp_path))
+    with pytest.raises(UploadRejected) as e:
+        save_data_url(data_url(b'hola'), store)
+    assert e.value.status == 415
+    assert temp_files(store) == []
+
+
+def test_aplica_limite_de_bytes(tmp_path):
+    store = ContentStore(str(tmp_path))
+    with pytest.raises(UploadRejected) as e:
+        save_data_url(data_url(PNG), store, max_bytes=len(PNG) - 1)
+    assert e.value.status == 413
+    assert temp_files(store) == []
+
+
+def test_base64_invalido(tmp_path):
+    store = ContentStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        save_data_url('data:image/png;base64,iVBORw0K!!!', store)
+    with pytest.raises(ValueError):
+        save_data_url('data:text/html;base64,PGgxPg==', store)
+    assert temp_files(store) == []
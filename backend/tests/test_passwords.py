@@ -0,0 +1,90 @@
+import threading
+
+import bcrypt
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolBusy, hash_cost
+
+USER = {'id_usuario': 3, '1_nombre': 'Ana', '1_apellido': 'Pérez', 'verification_code': None,
+        'verification_exp': None, 'verified': True}
+
+
+def occupy(hasher):
+    """Ocupa el único hilo del pool (y su cupo) hasta que se libere el evento retornado"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def work():
+        started.set()
+        release.wait(5)
+
+    assert hasher._slots.acquire(blocking=False)
+    future = hasher._executor.submit(work)
+    future.add_done_callback(lambda _: hasher._slots.release())
+    started.wait(5)
+    return release, future
+
+
+def test_pool_lleno_rechaza_de_inmediato():
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=0)
+    release, future = occupy(hasher)
+    with pytest.raises(PasswordPoolBusy):
+        hasher.hash('clave')
+    release.set()
+    future.result()
+    assert hasher.stats()['rejected'] == 1
+    # Al terminar el trabajo el cupo vuelve a estar libre
+    assert hasher.verify('clave', hasher.hash('clave'))
+
+
+def test_operacion_lenta_vence():
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=1, timeout=0.05)
+    release, future = occupy(hasher)
+    with pytest.raises(PasswordPoolBusy):
+        hasher.hash('clave')
+    release.set()
+    future.result()
+    assert hasher.stats()['timeouts'] == 1
+
+
+def test_costo_del_hash():
+    hasher = PasswordHasher(rounds=5)
+    hashed = hasher.hash('clave')
+    assert hash_cost(hashed) == 5 and hash_cost(hashed.encode()) == 5
+    assert hash_cost('texto plano') is None
+    assert not hasher.needs_rehash(hashed)
+    assert hasher.needs_rehash(bcrypt.hashpw(b'clave', bcrypt.gensalt(rounds=4)))
+
+
+def login(api, stored):
+    api.db_pool.responder = lambda sql, params: [dict(USER, contrasena=stored)] if 'correo_electronico' in sql else []
+    return api.app.test_client().post('/api/login', json={'correo_electronico': 'ana@example.com', 'contrasena': 'clave'})
+
+
+def test_login_rehace_el_hash_con_otro_costo(api, monkeypatch):
+    monkeypatch.setattr(api, 'password_hasher', PasswordHasher(rounds=5))
+    old = bcrypt.hashpw(b'clave', bcrypt.gensalt(rounds=4)).decode()
+    response = login(api, old)
+    assert response.status_code == 200 and response.get_json()['token']
+    updates = [params for sql, params in api.db_pool.executed if sql.startswith('UPDATE usuario SET contrasena')]
+    assert len(updates) == 1
+    new_hash, user_id = updates[0]
+    assert user_id == 3 and hash_cost(new_hash) == 5
+    assert bcrypt.checkpw(b'clave', new_hash.encode())
+
+    api.db_pool.connections.clear()
+    login(api, new_hash)
+    assert not any(sql.startswith('UPDATE usuario SET contrasena') for sql, _ in api.db_pool.executed)
+
+
+def test_login_con_el_pool_saturado_responde_503(api, monkeypatch):
+    hasher = PasswordHasher(rounds=4, workers=1, max_queue=0)
+    monkeypatch.setattr(api, 'password_hasher', hasher)
+    release, future = occupy(hasher)
+    try:
+        response = login(api, bcrypt.hashpw(b'clave', bcrypt.gensalt(rounds=4)).decode())
+    finally:
+        release.set()
+        future.result()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
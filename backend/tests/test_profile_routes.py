@@ -0,0 +1,59 @@
+import datetime
+
+USER = {'id_usuario': 7, '1_nombre': 'Ana', '2_nombre': None, '1_apellido': 'Pérez', '2_apellido': None,
+        'correo_electronico': 'ana@example.com', 'talla': 'M', 'fecha_nacimiento': datetime.date(1990, 5, 1),
+        'fecha_registro': datetime.datetime(2024, 1, 2, 3, 4, 5), 'foto': None}
+RATING = {'id_valoracion': 1, 'usuario_valorado_id': 7, 'usuario_valorador_id': 8, 'puntaje': 5,
+          'valorador_nombre': 'Luis', 'valorador_apellido': 'Gómez'}
+
+
+def reads(api, table):
+    return [sql for sql, _ in api.db_pool.executed if sql.startswith('SELECT') and f'FROM {table}' in sql]
+
+
+def test_perfil_se_lee_una_vez_hasta_invalidar(api):
+    api.db_pool.responder = lambda sql, params: [USER] if params == (7,) else []
+    client = api.app.test_client()
+    first = client.get('/api/profile/7')
+    assert first.status_code == 200
+    data = first.get_json()['data']
+    assert data['fecha_nacimiento'] == '1990-05-01' and data['fecha_registro'] == '2024-01-02T03:04:05'
+    assert client.get('/api/profile/7').get_json()['data'] == data
+    assert len(reads(api, 'usuario')) == 1
+
+    api.cache.invalidate_tags('usuario:7')
+    client.get('/api/profile/7')
+    assert len(reads(api, 'usuario')) == 2
+
+
+def test_perfil_inexistente_no_queda_en_cache(api):
+    client = api.app.test_client()
+    assert client.get('/api/profile/99').status_code == 404
+    assert client.get('/api/profile/99').status_code == 404
+    assert len(reads(api, 'usuario')) == 2
+    assert api.cache.get('perfil:99') == (False, None)
+
+
+def test_valoraciones_en_cache_hasta_una_nueva(api):
+    api.db_pool.responder = lambda sql, params: [RATING] if 'FROM valoracion' in sql else []
+    client = api.app.test_client()
+    assert client.get('/api/valoraciones/7').get_json() == [RATING]
+    assert client.get('/api/valoraciones/7').get_json() == [RATING]
+    assert len(reads(api, 'valoracion')) == 1
+
+    api.cache.invalidate_tags('valoraciones:7')
+    client.get('/api/valoraciones/7')
+    assert len(reads(api, 'valoracion')) == 2
+
+
+def test_carga_invalidada_a_medias_no_se_guarda(api):
+    # Una valoración nueva llega mientras se lee la lista: el resultado viejo no debe quedar guardado
+    def responder(sql, params):
+        api.cache.invalidate_tags('valoraciones:7')
+        return [RATING]
+
+    api.db_pool.responder = responder
+    client = api.app.test_client()
+    client.get('/api/valoraciones/7')
+    client.get('/api/valoraciones/7')
+    assert len(reads(api, 'valoracion')) == 2
@@ -0,0 +1,95 @@
+from decimal import Decimal
+
+from conftest import bearer
+
+SELLER, ADMIN = 7, 1
+
+
+class Catalog:
+    """Responde las consultas de detalle, propiedad, rol y borrado de publicaciones"""
+
+    def __init__(self):
+        self.publications = {5: {'id_publicacion': 5, 'id_usuario': SELLER, 'nombre': 'Camisa', 'foto': None,
+                                 '1_nombre': 'Ana', '1_apellido': 'Pérez'}}
+        self.ratings = [5, 4, 4]
+        self.detail_reads = 0
+
+    def __call__(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT rol FROM usuario'):
+            return [{'rol': 'Administrador' if params[0] == ADMIN else 'Usuario'}]
+        if sql.startswith('SELECT p.*'):
+            self.detail_reads += 1
+            row = self.publications.get(params[0])
+            if not row:
+                return []
+            average = Decimal(sum(self.ratings)) / len(self.ratings) if self.ratings else None
+            return [dict(row, promedio_valoracion=average, total_valoraciones=len(self.ratings))]
+        if sql.startswith('SELECT id_usuario FROM publicacion') or sql.startswith('SELECT id_publicacion FROM'):
+            row = self.publications.get(params[0])
+            return [row] if row else []
+        if sql.startswith('DELETE FROM publicacion'):
+            self.publications.pop(params[0], None)
+        return []
+
+
+def setup(api):
+    catalog = Catalog()
+    api.db_pool.responder = catalog
+    return catalog, api.app.test_client()
+
+
+def test_publicacion_inexistente(api):
+    catalog, client = setup(api)
+    response = client.get('/api/publications/99')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Publicación no encontrada'}
+    assert catalog.detail_reads == 0
+    assert api.cache.get('publicacion:99') == (False, None)
+
+
+def test_incluye_promedio_y_total_de_valoraciones(api):
+    catalog, client = setup(api)
+    data = client.get('/api/publications/5').get_json()
+    assert data['vendedor'] == {'id_usuario': SELLER, 'nombre': 'Ana Pérez',
+                                'promedio_valoracion': 4.33, 'total_valoraciones': 3}
+    assert 'promedio_valoracion' not in data and 'total_valoraciones' not in data
+
+    catalog.ratings = []
+    api.cache.invalidate_tags(f'valoraciones:{SELLER}')
+    vendedor = client.get('/api/publications/5').get_json()['vendedor']
+    assert vendedor['promedio_valoracion'] is None and vendedor['total_valoraciones'] == 0
+
+
+def test_una_valoracion_nueva_refresca_el_detalle(api):
+    catalog, client = setup(api)
+    client.get('/api/publications/5')
+    client.get('/api/publications/5')
+    assert catalog.detail_reads == 1
+
+    catalog.ratings.append(1)
+    response = client.post(f'/api/valoraciones/{SELLER}', json={'puntaje': 1}, headers=bearer(api, 8))
+    assert response.status_code == 200
+    assert client.get('/api/publications/5').get_json()['vendedor']['total_valoraciones'] == 4
+
+
+def test_se_invalida_al_eliminar_el_duenio(api):
+    catalog, client = setup(api)
+    assert client.get('/api/publications/5').status_code == 200
+    response = client.delete('/api/publications/5', headers=bearer(api, SELLER))
+    assert response.status_code == 200
+    assert client.get('/api/publications/5').status_code == 404
+
+
+def test_otro_usuario_no_puede_eliminar(api):
+    catalog, client = setup(api)
+    assert client.delete('/api/publications/5', headers=bearer(api, 8)).status_code == 404
+    assert client.get('/api/publications/5').status_code == 200
+
+
+def test_se_invalida_al_eliminar_un_admin(api):
+    catalog, client = setup(api)
+    assert client.get('/api/publications/5').status_code == 200
+    response = client.delete('/api/admin/publications/5', headers=bearer(api, ADMIN))
+    assert response.status_code == 200
+    assert client.get('/api/publications/5').status_code == 404
@@ -0,0 +1,86 @@
+from search_index import SearchIndex, normalize, stem, tokenize
+
+DOCUMENTS = [
+    (1, {'nombre': 'Camisón de algodón', 'descripcion_prenda': 'Largo y cómodo', 'vendedor': 'Ana Pérez'}),
+    (2, {'nombre': 'Camisa azul', 'descripcion_prenda': 'Manga larga', 'descripcion': 'Poco uso'}),
+    (3, {'nombre': 'Pantalón', 'descripcion_prenda': 'Combina con camisas azules', 'vendedor': 'Luis'}),
+    (4, {'nombre': 'Chaqueta de cuero', 'descripcion_prenda': 'Negra', 'vendedor': 'Camila Ruiz'}),
+]
+
+
+def make_index(documents=DOCUMENTS, refresh_seconds=300):
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return list(documents)
+    return SearchIndex(loader, refresh_seconds=refresh_seconds), loads
+
+
+def test_tokeniza_sin_acentos_ni_palabras_vacias():
+    assert normalize('Camisón ÑANDÚ') == 'camison nandu'
+    assert stem('camisas') == 'camisa'
+    assert stem('pantalones') == 'pantalon'
+    assert stem('gas') == 'gas'
+    assert tokenize('La camisa de los pantalones') == ['camisa', 'pantalon']
+
+
+def test_acentos_y_plurales_coinciden():
+    index, _ = make_index()
+    assert index.search('camison') == [1]
+    assert index.search('CAMISÓN') == [1]
+    assert set(index.search('camisas')) == {2, 3}
+
+
+def test_nombre_pesa_mas_que_la_descripcion():
+    index, _ = make_index()
+    # 2 tiene "camisa" en el nombre; 3 solo en la descripción
+    assert index.search('camisa')[:2] == [2, 3]
+
+
+def test_todos_los_terminos_deben_coincidir():
+    index, _ = make_index()
+    assert index.search('camisa azul') == [2, 3]
+    assert index.search('camisa cuero') == []
+    assert index.search('de la') == []
+
+
+def test_prefijo_vale_menos_que_la_palabra_completa():
+    index, _ = make_index()
+    results = index.search('cami')
+    assert set(results) == {1, 2, 3, 4}
+    assert index.search('camisa')[0] == 2
+
+
+def test_altas_y_bajas_sin_recargar():
+    index, loads = make_index()
+    assert index.search('chaqueta') == [4]
+    index.upsert(5, {'nombre': 'Chaqueta de jean'})
+    index.upsert(4, {'nombre': 'Abrigo de cuero'})
+    assert index.search('chaqueta') == [5]
+    assert index.search('abrigo') == [4]
+    index.remove(5)
+    assert index.search('chaqueta') == []
+    assert len(loads) == 1
+
+
+def test_recarga_periodica_e_invalidacion():
+    documents = list(DOCUMENTS)
+    index, loads = make_index(documents, refresh_seconds=0)
+    assert index.search('bufanda') == []
+    documents.append((6, {'nombre': 'Bufanda'}))
+    assert index.search('bufanda') == [6]
+    assert len(loads) == 2
+
+    index, loads = make_index(documents)
+    index.search('bufanda')
+    index.invalidate()
+    index.search('bufanda')
+    assert len(loads) == 2
+
+
+def test_upsert_antes_de_la_primera_carga_se_ignora():
+    index, loads = make_index()
+    index.upsert(9, {'nombre': 'Gorra'})
+    assert index.search('gorra') == []
+    assert len(loads) == 1
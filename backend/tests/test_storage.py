@@ -0,0 +1,79 @@
+import os
+
+from conftest import FakeConnection
+from storage import ContentStore, add_reference, path_from_url, recount, release_reference
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'contenido'
+
+
+def test_mismo_contenido_se_guarda_una_vez(tmp_path):
+    store = ContentStore(str(tmp_path))
+    first = store.save([PNG[:5], PNG[5:]], 'PNG')
+    second = store.save([PNG], '.png')
+    assert first.created and not second.created
+    assert first.path == second.path
+    digest = first.digest
+    assert first.path == f"{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert first.url == '/uploads/' + first.path
+    assert first.size == len(PNG)
+    with open(store.absolute_path(first.path), 'rb') as f:
+        assert f.read() == PNG
+    assert os.listdir(store._tmp) == []
+
+
+def test_contenido_distinto_no_se_mezcla(tmp_path):
+    store = ContentStore(str(tmp_path))
+    a = store.save([PNG], 'png')
+    b = store.save([PNG + b'!'], 'png')
+    assert a.path != b.path
+
+
+def test_ingest_mueve_un_archivo_escrito(tmp_path):
+    store = ContentStore(str(tmp_path))
+    source = tmp_path / 'subida.part'
+    source.write_bytes(PNG)
+    stored = store.ingest(str(source), 'png')
+    assert stored.path == store.save([PNG], 'png').path
+    assert not source.exists()
+
+    # Si el contenido ya existía se descarta la copia
+    source.write_bytes(PNG)
+    again = store.ingest(str(source), 'png')
+    assert not again.created and not source.exists()
+
+
+def test_path_from_url():
+    assert path_from_url('/uploads/ab/cd/abcd.png') == 'ab/cd/abcd.png'
+    assert path_from_url('/uploads/ab/cd/abcd.png?size=sm') == 'ab/cd/abcd.png'
+    for value in (None, '', 'data:image/png;base64,AAAA', 'https://example.com/a.png', 12):
+        assert path_from_url(value) is None
+
+
+def test_referencias():
+    conn = FakeConnection()
+    with conn.cursor() as cur:
+        add_reference(cur, '/uploads/ab/cd/abcd.png', 120)
+        release_reference(cur, '/uploads/ab/cd/abcd.png')
+        # Las URLs externas o en base64 no cuentan
+        add_reference(cur, 'https://example.com/a.png')
+        release_reference(cur, None)
+    assert len(conn.executed) == 2
+    (insert, insert_params), (update, update_params) = conn.executed
+    assert insert.startswith('INSERT INTO archivo') and 'referencias = referencias + 1' in insert
+    assert insert_params == ('ab/cd/abcd.png', 120)
+    assert 'GREATEST(referencias - 1, 0)' in update and update_params == ('ab/cd/abcd.png',)
+
+
+def test_recount_suma_todas_las_columnas():
+    def responder(sql, params):
+        if 'FROM prenda' in sql:
+            return [{'url': '/uploads/a.png', 'n': 2}]
+        if 'FROM usuario' in sql:
+            return [{'url': '/uploads/a.png', 'n': 1}, {'url': '/uploads/b.jpg', 'n': 1}]
+        return []
+
+    conn = FakeConnection(responder)
+    assert recount(conn) == {'a.png': 3, 'b.jpg': 1}
+    upserts = [params for sql, params in conn.executed if sql.startswith('INSERT INTO archivo')]
+    assert sorted(upserts) == [('a.png', 3), ('b.jpg', 1)]
+    assert conn.commits == 1
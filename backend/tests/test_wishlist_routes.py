@@ -0,0 +1,84 @@
+import pytest
+
+from conftest import bearer
+
+USER, SELLER = 3, 7
+
+
+class Wishlist:
+    """Tabla lista_deseos en memoria para un único usuario"""
+
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.reads = 0
+
+    def __call__(self, sql, params):
+        sql = ' '.join(sql.split())
+        if sql.startswith('SELECT id_publicacion FROM lista_deseos'):
+            self.reads += 1
+            return [{'id_publicacion': pub_id} for pub_id in self.ids]
+        if sql.startswith('SELECT id_usuario FROM publicacion'):
+            return [{'id_usuario': SELLER}]
+        if sql.startswith('INSERT INTO lista_deseos'):
+            self.ids.add(params[1])
+        if sql.startswith('DELETE FROM lista_deseos') and params[1] in self.ids:
+            self.ids.discard(params[1])
+            return [{}]  # una fila afectada
+        return []
+
+
+@pytest.fixture
+def client(api):
+    api.db_pool.responder = Wishlist({5, 2})
+    return api.app.test_client()
+
+
+def test_ids_en_cache_hasta_agregar_o_quitar(api, client):
+    wishlist = api.db_pool.responder
+    headers = bearer(api, USER)
+    assert client.get('/api/wishlist/ids', headers=headers).get_json() == {'ids': [2, 5]}
+    assert client.get('/api/wishlist/check/5', headers=headers).get_json() == {'in_wishlist': True}
+    assert wishlist.reads == 1
+
+    assert client.post('/api/wishlist/9', headers=headers).status_code == 200
+    assert client.get('/api/wishlist/ids', headers=headers).get_json() == {'ids': [2, 5, 9]}
+    assert client.delete('/api/wishlist/5', headers=headers).status_code == 200
+    assert client.get('/api/wishlist/check/5', headers=headers).get_json() == {'in_wishlist': False}
+    assert wishlist.reads == 3
+
+    # Quitar algo que no estaba no invalida
+    assert client.delete('/api/wishlist/5', headers=headers).status_code == 404
+    client.get('/api/wishlist/ids', headers=headers)
+    assert wishlist.reads == 3
+
+
+def test_check_por_lote(api, client):
+    response = client.post('/api/wishlist/check', json={'ids': [5, '9', 2]}, headers=bearer(api, USER))
+    assert response.get_json() == {'in_wishlist': {'5': True, '9': False, '2': True}}
+
+
+def test_sin_sesion_todo_falso(api, client):
+    assert client.get('/api/wishlist/ids').get_json() == {'ids': []}
+    response = client.post('/api/wishlist/check', json={'ids': [5]})
+    assert response.get_json() == {'in_wishlist': {'5': False}}
+    assert api.db_pool.responder.reads == 0
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'ids': list(range(501))}, 'Se requiere una lista "ids" (máx. 500)'),
+    ({'ids': '5,2'}, 'Se requiere una lista "ids" (máx. 500)'),
+    ({}, 'Se requiere una lista "ids" (máx. 500)'),
+    ({'ids': [5, 'abc']}, 'Ids inválidos'),
+    ({'ids': [None]}, 'Ids inválidos'),
+    ({'ids': [[5]]}, 'Ids inválidos'),
+])
+def test_check_por_lote_valida_los_ids(api, client, body, error):
+    response = client.post('/api/wishlist/check', json=body, headers=bearer(api, USER))
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+    assert api.db_pool.responder.reads == 0
+
+
+def test_check_por_lote_admite_500(api, client):
+    response = client.post('/api/wishlist/check', json={'ids': list(range(500))}, headers=bearer(api, USER))
+    assert response.status_code == 200 and len(response.get_json()['in_wishlist']) == 500
@@ -2,7 +2,7 @@ const API_BASE = import.meta.env.VITE_API_BASE || 'http://127.0.0.1:5000'
 
 export function getImageUrl(path, bustCache = false) {
   if (!path) return ''
-  if (path.startsWith('http')) return path
+  if (path.startsWith('http') || path.startsWith('data:') || path.startsWith('blob:')) return path
   // Asegurar que path comience con / para URLs correctas
   const normalizedPath = path.startsWith('/') ? path : `/${path}`
   const baseUrl = `${API_BASE}${normalizedPath}`
@@ -10,6 +10,12 @@ export function getImageUrl(path, bustCache = false) {
   return bustCache ? `${baseUrl}?t=${Date.now()}` : baseUrl
 }
 
+// srcset a partir de `foto_variantes` ([{size, width, url}]) devuelto por la API
+export function getImageSrcSet(variants) {
+  if (!variants || !variants.length) return undefined
+  return variants.map(v => `${getImageUrl(v.url)} ${v.width}w`).join(', ')
+}
+
 export async function apiFetch(path, options = {}){
   const token = localStorage.getItem('token')
   const headers = options.headers || {}
@@ -27,6 +33,47 @@ export async function apiFetch(path, options = {}){
   return { ok: res.ok, status: res.status, data }
 }
 
+// Archivos más grandes que esto se suben por partes reanudables
+const RESUMABLE_THRESHOLD = 1024 * 1024
+
+// Subida reanudable por partes (/api/uploads): si una parte falla se pregunta al servidor
+// cuánto recibió y se continúa desde ahí. Retorna { ok, status, data } con data.upload_id.
+export async function uploadResumable(file, kind, onProgress){
+  let res = await apiFetch('/api/uploads', { method: 'POST', body: JSON.stringify({ kind, size: file.size }) })
+  if(!res.ok) return res
+  const { upload_id, chunk_size } = res.data
+  let offset = res.data.offset
+  let failures = 0
+  while(offset < file.size){
+    const end = Math.min(offset + chunk_size, file.size)
+    try {
+      res = await apiFetch(`/api/uploads/${upload_id}`, {
+        method: 'PUT',
+        headers: { 'Content-Type': 'application/octet-stream', 'Content-Range': `bytes ${offset}-${end - 1}/${file.size}` },
+        body: file.slice(offset, end)
+      })
+    } catch (err) {
+      res = null // conexión cortada
+    }
+    if(res && res.ok){
+      offset = res.data.offset
+      failures = 0
+      if(onProgress) onProgress(offset / file.size)
+      continue
+    }
+    if(res && res.status !== 409 && res.status < 500) return res
+    if(++failures > 5) return res || { ok: false, status: 0, data: { error: 'Sin conexión con el servidor' } }
+    await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures))
+    try {
+      const current = await apiFetch(`/api/uploads/${upload_id}`)
+      if(current.ok) offset = current.data.offset
+    } catch (err) {
+      // se reintenta desde el último offset conocido
+    }
+  }
+  return apiFetch(`/api/uploads/${upload_id}/complete`, { method: 'POST' })
+}
+
 // Autenticación
 export async function register(payload){
   return apiFetch('/api/register', { method: 'POST', body: JSON.stringify(payload) })
@@ -57,8 +104,10 @@ export async function changePasswordAuth(payload){
 }
 
 // Perfil de usuario
+// Acepta un objeto (JSON) o un FormData con la foto de perfil como archivo en `foto`
 export async function updateProfile(payload){
-  return apiFetch('/api/profile', { method: 'PUT', body: JSON.stringify(payload) })
+  const body = payload instanceof FormData ? payload : JSON.stringify(payload)
+  return apiFetch('/api/profile', { method: 'PUT', body })
 }
 
 export async function getUserProfile(userId){
@@ -71,11 +120,39 @@ export async function getPublications(filters = {}){
   return apiFetch(`/api/publications?${params.toString()}`)
 }
 
+// Página de publicaciones por cursor: responde { items, next_cursor }
+export async function getPublicationsPage(filters = {}, cursor = null, limit = 24){
+  const params = new URLSearchParams()
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.append(key, value)
+  })
+  params.append('limit', limit)
+  if (cursor) params.append('cursor', cursor)
+  return apiFetch(`/api/publications?${params.toString()}`)
+}
+
+// Conteos de facetas (talla, tipo, estado, rango de precio) para los filtros actuales
+export async function getPublicationFacets(filters = {}){
+  const params = new URLSearchParams()
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.append(key, value)
+  })
+  return apiFetch(`/api/publications/facets?${params.toString()}`)
+}
+
+export async function getPublication(id){
+  return apiFetch(`/api/publications/${id}`)
+}
+
 export async function createPublication(payload){
   const formData = new FormData();
   
-  // Añadir el archivo de imagen
-  if (payload.foto instanceof File) {
+  // Añadir el archivo de imagen (por partes si es grande)
+  if (payload.foto instanceof File && payload.foto.size > RESUMABLE_THRESHOLD) {
+    const upload = await uploadResumable(payload.foto, 'photo');
+    if (!upload.ok) return upload;
+    formData.append('upload_id', upload.data.upload_id);
+  } else if (payload.foto instanceof File) {
     formData.append('foto', payload.foto);
   } else {
     return { ok: false, error: 'Se requiere un archivo de imagen' };
@@ -203,6 +280,14 @@ export async function adminGetRatings(page = 1, limit = 10){
 }
 
 // Sistema de mensajes
+// Eventos en tiempo real (mensajes, lecturas y transacciones) por Server-Sent Events.
+// EventSource no admite encabezados, por eso el token va en la URL.
+export function openEventStream(){
+  const token = localStorage.getItem('token')
+  if(!token) return null
+  return new EventSource(`${API_BASE}/api/events?token=${encodeURIComponent(token)}`)
+}
+
 export async function getConversations(){
   return apiFetch('/api/conversations')
 }
@@ -211,6 +296,15 @@ export async function getMessages(otherUserId){
   return apiFetch(`/api/messages/${otherUserId}`)
 }
 
+// Página del historial: { items, has_more }. Sin ids trae los más recientes; beforeId
+// carga los anteriores (al desplazarse hacia arriba) y afterId solo los nuevos.
+export async function getMessagesPage(otherUserId, { beforeId, afterId, limit = 30 } = {}){
+  const params = new URLSearchParams({ limit })
+  if (beforeId) params.append('before_id', beforeId)
+  if (afterId) params.append('after_id', afterId)
+  return apiFetch(`/api/messages/${otherUserId}?${params.toString()}`)
+}
+
 export async function sendMessage(recipientId, content){
   return apiFetch('/api/messages', {
     method: 'POST',
@@ -218,6 +312,11 @@ export async function sendMessage(recipientId, content){
   })
 }
 
+// Total de mensajes no leídos para el contador del chat: { unread_count }
+export async function getUnreadMessageCount(){
+  return apiFetch('/api/messages/unread-count')
+}
+
 export async function markMessagesAsRead(otherUserId){
   return apiFetch(`/api/messages/${otherUserId}/read`, { method: 'PUT' })
 }
@@ -232,7 +331,13 @@ export async function initiateTransaction(publicationId, message = ''){
 
 export async function uploadPaymentProof(transactionId, proofFile){
   const formData = new FormData();
-  formData.append('proof', proofFile);
+  if (proofFile.size > RESUMABLE_THRESHOLD) {
+    const upload = await uploadResumable(proofFile, 'proof');
+    if (!upload.ok) return upload;
+    formData.append('upload_id', upload.data.upload_id);
+  } else {
+    formData.append('proof', proofFile);
+  }
   
   return apiFetch(`/api/transactions/${transactionId}/payment-proof`, {
     method: 'POST',
@@ -289,3 +394,16 @@ export async function removeFromWishlist(publicationId){
 export async function checkWishlistStatus(publicationId){
   return apiFetch(`/api/wishlist/check/${publicationId}`)
 }
+
+// Todos los ids de la wishlist del usuario en una sola petición
+export async function getWishlistIds(){
+  return apiFetch('/api/wishlist/ids')
+}
+
+// Estado de varias publicaciones a la vez: { in_wishlist: { "<id>": bool } }
+export async function checkWishlistBatch(publicationIds){
+  return apiFetch('/api/wishlist/check', {
+    method: 'POST',
+    body: JSON.stringify({ ids: publicationIds })
+  })
+}
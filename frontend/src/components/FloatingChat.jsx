@@ -1,5 +1,5 @@
-import React, { useState, useEffect, useRef } from 'react';
-import { getConversations, getMessages, sendMessage, markMessagesAsRead } from '../api';
+import React, { useState, useEffect, useLayoutEffect, useRef } from 'react';
+import { getConversations, getMessagesPage, sendMessage, markMessagesAsRead, getUnreadMessageCount, openEventStream } from '../api';
 
 export default function FloatingChat() {
   const [isOpen, setIsOpen] = useState(false);
@@ -10,7 +10,22 @@ export default function FloatingChat() {
   const [currentUser, setCurrentUser] = useState(null);
   const [loading, setLoading] = useState(false);
   const [unreadCount, setUnreadCount] = useState(0);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const messagesContainerRef = useRef(null);
+  // Altura del historial antes de anteponer mensajes antiguos, para conservar la posición
+  const previousScrollHeightRef = useRef(null);
+  const messagesRef = useRef([]);
+  // Valores actuales para los manejadores de eventos SSE (que se registran una sola vez)
+  const selectedRef = useRef(null);
+  const conversationsRef = useRef([]);
+  const isOpenRef = useRef(false);
+
+  useEffect(() => { selectedRef.current = selectedConversation; }, [selectedConversation]);
+  useEffect(() => { conversationsRef.current = conversations; }, [conversations]);
+  useEffect(() => { messagesRef.current = messages; }, [messages]);
+  useEffect(() => { isOpenRef.current = isOpen; }, [isOpen]);
 
   // Verificar si hay usuario logueado
   useEffect(() => {
@@ -49,11 +64,32 @@ export default function FloatingChat() {
   useEffect(() => {
     if (isOpen && currentUser) {
       loadConversations();
-      // Actualizar conversaciones cada 30 segundos cuando está abierto
-      const interval = setInterval(loadConversations, 30000);
-      return () => clearInterval(interval);
     }
-  }, [isOpen, currentUser]);
+  }, [isOpen, currentUser?.id]);
+
+  // Mensajes, lecturas y transacciones llegan por SSE: sin consultas periódicas
+  useEffect(() => {
+    if (!currentUser) return;
+    loadUnreadCount();
+    const source = openEventStream();
+    if (!source) return;
+    let connectedBefore = false;
+    source.addEventListener('ready', () => {
+      // Tras una reconexión se pudieron perder eventos: recargar una sola vez
+      if (connectedBefore) {
+        loadUnreadCount();
+        if (isOpenRef.current) loadConversations();
+        if (selectedRef.current) syncNewMessages(selectedRef.current.other_user_id);
+      }
+      connectedBefore = true;
+    });
+    source.addEventListener('message', (e) => handleIncomingMessage(JSON.parse(e.data)));
+    source.addEventListener('read', (e) => handleReadReceipt(JSON.parse(e.data)));
+    source.addEventListener('transaction', (e) => {
+      window.dispatchEvent(new CustomEvent('transactionUpdate', { detail: JSON.parse(e.data) }));
+    });
+    return () => source.close();
+  }, [currentUser?.id]);
 
   // Escuchar eventos externos para abrir el chat con mensaje predefinido
   useEffect(() => {
@@ -81,21 +117,70 @@ export default function FloatingChat() {
     return () => window.removeEventListener('openChat', handler);
   }, [currentUser]);
 
-  // Auto-scroll a nuevos mensajes
-  useEffect(() => {
+  // Auto-scroll a nuevos mensajes; al cargar mensajes antiguos se mantiene la posición
+  useLayoutEffect(() => {
+    const container = messagesContainerRef.current;
+    if (previousScrollHeightRef.current !== null && container) {
+      container.scrollTop = container.scrollHeight - previousScrollHeightRef.current;
+      previousScrollHeightRef.current = null;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
-  // Actualizar contador de no leídos
-  useEffect(() => {
-    const total = conversations.reduce((sum, conv) => sum + (conv.unread_count || 0), 0);
-    setUnreadCount(total);
-  }, [conversations]);
+  // Contador de no leídos: lo mantiene el servidor, sin cargar las conversaciones
+  const loadUnreadCount = async () => {
+    try {
+      const response = await getUnreadMessageCount();
+      if (response.ok && response.data) setUnreadCount(response.data.unread_count || 0);
+    } catch (error) {
+      console.error('Error loading unread count:', error);
+    }
+  };
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
+  const handleIncomingMessage = (msg) => {
+    const myId = Number(currentUser.id);
+    const otherId = Number(msg.id_emisor) === myId ? Number(msg.id_receptor) : Number(msg.id_emisor);
+    const incoming = Number(msg.id_receptor) === myId;
+    const selected = selectedRef.current;
+    const isSelected = selected && Number(selected.other_user_id) === otherId;
+
+    if (isSelected) {
+      setMessages(prev => prev.some(m => m.id_mensaje === msg.id_mensaje) ? prev : [...prev, msg]);
+      if (incoming) markMessagesAsRead(otherId);
+    } else if (incoming) {
+      loadUnreadCount();
+    }
+    if (!conversationsRef.current.some(c => Number(c.other_user_id) === otherId)) {
+      // Conversación nueva: traer la lista con el nombre del otro usuario (si está a la vista)
+      if (isOpenRef.current) loadConversations();
+      return;
+    }
+    setConversations(prev => prev.map(c => Number(c.other_user_id) === otherId
+      ? {
+          ...c,
+          last_message_time: msg.fecha_envio || c.last_message_time,
+          last_message: msg.contenido,
+          unread_count: incoming && !isSelected ? (parseInt(c.unread_count) || 0) + 1 : c.unread_count
+        }
+      : c));
+  };
+
+  const handleReadReceipt = ({ reader_id, sender_id }) => {
+    const myId = Number(currentUser.id);
+    if (Number(reader_id) === myId) {
+      // Leídos aquí o desde otra pestaña
+      loadUnreadCount();
+      setConversations(prev => prev.map(c => Number(c.other_user_id) === Number(sender_id) ? { ...c, unread_count: 0 } : c));
+    } else {
+      setMessages(prev => prev.map(m => Number(m.id_receptor) === Number(reader_id) ? { ...m, leido: 1 } : m));
+    }
+  };
+
   const loadConversations = async () => {
     try {
       console.log('🔄 Cargando conversaciones...');
@@ -118,19 +203,17 @@ export default function FloatingChat() {
     }
   };
 
+  // Al abrir una conversación solo se trae la página más reciente
   const loadMessages = async (conversationId) => {
     if (!conversationId) return;
     
     try {
       setLoading(true);
-      console.log('📨 Cargando mensajes para usuario:', conversationId);
-      const response = await getMessages(conversationId);
-      console.log('📥 Respuesta de mensajes:', response);
+      const response = await getMessagesPage(conversationId);
       
       if (response.ok && response.data) {
-        const messages = Array.isArray(response.data) ? response.data : [];
-        console.log('💬 Mensajes procesados:', messages);
-        setMessages(messages);
+        setMessages(Array.isArray(response.data.items) ? response.data.items : []);
+        setHasOlderMessages(Boolean(response.data.has_more));
         
         // Marcar mensajes como leídos
         await markMessagesAsRead(conversationId);
@@ -146,15 +229,66 @@ export default function FloatingChat() {
       } else {
         console.error('❌ Error en respuesta de mensajes:', response);
         setMessages([]);
+        setHasOlderMessages(false);
       }
     } catch (error) {
       console.error('💥 Error loading messages:', error);
       setMessages([]);
+      setHasOlderMessages(false);
     } finally {
       setLoading(false);
     }
   };
 
+  // Página anterior al mensaje más antiguo cargado, al llegar al inicio del historial
+  const loadOlderMessages = async () => {
+    const oldest = messagesRef.current[0];
+    if (!selectedConversation || !hasOlderMessages || loadingOlder || !oldest) return;
+    setLoadingOlder(true);
+    try {
+      const response = await getMessagesPage(selectedConversation.other_user_id, { beforeId: oldest.id_mensaje });
+      if (response.ok && response.data) {
+        previousScrollHeightRef.current = messagesContainerRef.current?.scrollHeight ?? null;
+        setMessages(prev => [...response.data.items, ...prev]);
+        setHasOlderMessages(Boolean(response.data.has_more));
+      }
+    } catch (error) {
+      console.error('Error loading older messages:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  // Solo los mensajes posteriores al último que ya se tiene (p. ej. tras reconectar)
+  const syncNewMessages = async (conversationId) => {
+    let newest = messagesRef.current[messagesRef.current.length - 1];
+    if (!newest) {
+      loadMessages(conversationId);
+      return;
+    }
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const response = await getMessagesPage(conversationId, { afterId: newest.id_mensaje, limit: 100 });
+        if (!response.ok || !response.data || response.data.items.length === 0) break;
+        const items = response.data.items;
+        setMessages(prev => {
+          const known = new Set(prev.map(m => m.id_mensaje));
+          return [...prev, ...items.filter(m => !known.has(m.id_mensaje))];
+        });
+        newest = items[items.length - 1];
+        hasMore = response.data.has_more;
+      }
+      await markMessagesAsRead(conversationId);
+    } catch (error) {
+      console.error('Error syncing messages:', error);
+    }
+  };
+
+  const handleMessagesScroll = (e) => {
+    if (e.currentTarget.scrollTop < 40) loadOlderMessages();
+  };
+
   const handleSendMessage = async (e) => {
     e.preventDefault();
     if (!newMessage.trim() || !selectedConversation || loading) return;
@@ -165,19 +299,13 @@ export default function FloatingChat() {
     try {
       const response = await sendMessage(selectedConversation.other_user_id, messageText);
       
-      // Agregar mensaje inmediatamente a la UI
-      const newMsg = {
-        id_mensaje: Date.now(),
-        contenido: messageText,
-        id_emisor: currentUser.id,
-        fecha_envio: new Date().toISOString(),
-        emisor_nombre: currentUser.nombre || currentUser.username
-      };
-      
-      setMessages(prev => [...prev, newMsg]);
-      
-      // Recargar mensajes para obtener la versión del servidor
-      setTimeout(() => loadMessages(selectedConversation.other_user_id), 500);
+      if (response.ok && response.data) {
+        // El mismo mensaje puede haber llegado ya por el flujo de eventos
+        const sent = response.data;
+        setMessages(prev => prev.some(m => m.id_mensaje === sent.id_mensaje) ? prev : [...prev, sent]);
+      } else {
+        setNewMessage(messageText);
+      }
       
     } catch (error) {
       console.error('Error sending message:', error);
@@ -199,6 +327,7 @@ export default function FloatingChat() {
   const goBackToConversations = () => {
     setSelectedConversation(null);
     setMessages([]);
+    setHasOlderMessages(false);
   };
 
   const formatTime = (timestamp) => {
@@ -361,7 +490,12 @@ export default function FloatingChat() {
                 // Mensajes de la conversación seleccionada
                 <div className="h-full flex flex-col">
                   {/* Área de mensajes */}
-                  <div className="flex-1 overflow-y-auto p-3 space-y-3">
+                  <div ref={messagesContainerRef} onScroll={handleMessagesScroll} className="flex-1 overflow-y-auto p-3 space-y-3">
+                    {loadingOlder && (
+                      <div className="flex justify-center">
+                        <div className="animate-spin rounded-full h-4 w-4 border-b-2 border-wine-medium"></div>
+                      </div>
+                    )}
                     {loading ? (
                       <div className="flex justify-center items-center h-full">
                         <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-wine-medium"></div>
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { me } from '../api';
+import { me, getImageUrl } from '../api';
 
 export default function Navbar() {
   const navigate = useNavigate();
@@ -133,7 +133,7 @@ export default function Navbar() {
                       {user?.foto ? (
                         <img
                           className="h-8 w-8 rounded-full ring-2 ring-wine-medium/50 group-hover:ring-wine-light transition-all duration-300"
-                          src={user.foto}
+                          src={getImageUrl(user.foto)}
                           alt=""
                         />
                       ) : (
@@ -287,7 +287,7 @@ export default function Navbar() {
                 <div className="flex items-center px-3 py-2 mb-3 border-b border-wine-medium/20">
                   <div className="relative">
                     {user?.foto ? (
-                      <img className="h-8 w-8 rounded-full ring-2 ring-wine-medium/50" src={user.foto} alt="" />
+                      <img className="h-8 w-8 rounded-full ring-2 ring-wine-medium/50" src={getImageUrl(user.foto)} alt="" />
                     ) : (
                       <div className="h-8 w-8 rounded-full flex items-center justify-center bg-gradient-to-br from-wine-medium to-wine-dark text-white ring-2 ring-wine-medium/50">
                         {user?.['1_nombre']?.charAt(0) || 'U'}
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { getUsers, updateUser } from "../api";
+import { getUsers, updateUser, getImageUrl } from "../api";
 
 export default function AdminDashboard() {
   const [users, setUsers] = useState([]);
@@ -183,7 +183,7 @@ export default function AdminDashboard() {
                     <td className="px-4 py-3 flex items-center">
                       {user.foto && (
                         <img
-                          src={user.foto}
+                          src={getImageUrl(user.foto)}
                           alt=""
                           className="h-8 w-8 rounded-full mr-3 object-cover"
                         />
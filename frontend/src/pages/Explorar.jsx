@@ -1,6 +1,6 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
-import { me, getPublications, getImageUrl } from '../api';
+import { me, getPublicationsPage, getImageUrl, getImageSrcSet } from '../api';
 
 export default function Explorar() {
   const [user, setUser] = useState(null);
@@ -8,11 +8,40 @@ export default function Explorar() {
   const [publications, setPublications] = useState([]);
   // Por defecto mostrar sólo publicaciones disponibles
   const [filters, setFilters] = useState({ estado: 'Disponible' });
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const sentinelRef = useRef(null);
 
   useEffect(() => {
     loadInitialData();
   }, [filters]); // React a cambios en filtros
 
+  // Scroll infinito: cargar la siguiente página cuando el final de la lista es visible
+  useEffect(() => {
+    if (!nextCursor || !sentinelRef.current) return;
+    const observer = new IntersectionObserver((entries) => {
+      if (entries[0].isIntersecting) loadMore();
+    }, { rootMargin: '400px' });
+    observer.observe(sentinelRef.current);
+    return () => observer.disconnect();
+  }, [nextCursor, loadingMore]);
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const pubRes = await getPublicationsPage(filters, nextCursor);
+      if (pubRes.ok) {
+        setPublications(prev => [...prev, ...pubRes.data.items]);
+        setNextCursor(pubRes.data.next_cursor);
+      }
+    } catch (error) {
+      console.error('Error loading more publications:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const loadInitialData = async () => {
     try {
       const token = localStorage.getItem('token');
@@ -22,9 +51,10 @@ export default function Explorar() {
           setUser(userRes.data.user);
         }
       }
-      const pubRes = await getPublications(filters);
+      const pubRes = await getPublicationsPage(filters);
       if (pubRes.ok) {
-        setPublications(pubRes.data);
+        setPublications(pubRes.data.items);
+        setNextCursor(pubRes.data.next_cursor);
       }
     } catch (error) {
       console.error('Error loading data:', error);
@@ -142,7 +172,10 @@ export default function Explorar() {
               {/* Imagen */}
               <div className="flex justify-center mb-4">
                 <img
-                  src={getImageUrl(pub.foto)}
+                  src={getImageUrl(pub.foto_variantes?.[0]?.url || pub.foto)}
+                  srcSet={getImageSrcSet(pub.foto_variantes)}
+                  sizes="192px"
+                  loading="lazy"
                   alt={pub.nombre}
                   className="w-48 h-40 object-contain"
                   onError={(e) => {
@@ -177,6 +210,15 @@ export default function Explorar() {
           ))
         })()}
       </div>
+
+      {/* Marcador para el scroll infinito */}
+      {nextCursor && (
+        <div ref={sentinelRef} className="flex justify-center py-8">
+          {loadingMore && (
+            <div className="animate-spin rounded-full h-8 w-8 border-t-2 border-b-2 border-wine-medium"></div>
+          )}
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file
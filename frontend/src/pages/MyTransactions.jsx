@@ -26,6 +26,13 @@ export default function MyTransactions() {
     loadTransactions();
   }, [filter]);
 
+  // El chat reenvía los eventos de transacción recibidos por SSE
+  useEffect(() => {
+    const onUpdate = () => loadTransactions();
+    window.addEventListener('transactionUpdate', onUpdate);
+    return () => window.removeEventListener('transactionUpdate', onUpdate);
+  }, [filter]);
+
   const loadTransactions = async () => {
     setLoading(true);
     try {
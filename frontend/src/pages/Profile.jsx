@@ -13,6 +13,7 @@ export default function Profile() {
   const [newPass, setNewPass] = useState('')
   const [error, setError] = useState('')
   const [previewImage, setPreviewImage] = useState('')
+  const [photoFile, setPhotoFile] = useState(null)
   const [isSaving, setIsSaving] = useState(false)
   const [ageError, setAgeError] = useState('')
   const [showOldPassword, setShowOldPassword] = useState(false)
@@ -143,20 +144,25 @@ export default function Profile() {
       '1_apellido': form['1_apellido'],
       '2_apellido': form['2_apellido'],
       talla: form.talla,
-      fecha_nacimiento: fechaNacimiento,
-      foto: previewImage || form.foto // Usar la imagen en base64 si hay una nueva, sino la existente
+      fecha_nacimiento: fechaNacimiento
     }
-    
-    console.log('Enviando payload:', payload) // Para debug
+
+    // La foto nueva se envía como archivo; el servidor responde con su URL
+    const body = new FormData()
+    Object.entries(payload).forEach(([key, value]) => {
+      if (value !== undefined && value !== null) body.append(key, value)
+    })
+    if (photoFile) body.append('foto', photoFile, 'avatar.jpg')
 
     try {
-      const res = await updateProfile(payload)
+      const res = await updateProfile(body)
       if (res.ok) {
         setMessage('Perfil actualizado correctamente')
         // Actualizar el usuario con los nuevos datos
-        setUser({...user, ...payload})
+        setUser({...user, ...payload, foto: (res.data && res.data.foto) || user.foto})
         // Limpiar la vista previa
         setPreviewImage('')
+        setPhotoFile(null)
         // Recargar perfil para obtener los datos actualizados
         await loadProfile()
       } else {
@@ -198,9 +204,8 @@ export default function Profile() {
         // Dibujar imagen comprimida
         ctx.drawImage(img, 0, 0, width, height)
         
-        // Convertir a base64 con compresión
-        const compressedDataUrl = canvas.toDataURL('image/jpeg', quality)
-        resolve(compressedDataUrl)
+        // Convertir a JPEG comprimido (Blob para subirlo como archivo)
+        canvas.toBlob(resolve, 'image/jpeg', quality)
       }
       
       img.src = URL.createObjectURL(file)
@@ -223,9 +228,10 @@ export default function Profile() {
       }
 
       try {
-        // Comprimir imagen antes de convertir a base64
+        // Comprimir imagen antes de subirla
         const compressedImage = await compressImage(file, 800, 0.8)
-        setPreviewImage(compressedImage)
+        setPhotoFile(compressedImage)
+        setPreviewImage(URL.createObjectURL(compressedImage))
         setError('') // Limpiar errores previos
       } catch (error) {
         console.error('Error comprimiendo imagen:', error)
@@ -276,7 +282,7 @@ export default function Profile() {
           <aside className="lg:col-span-1 bg-white rounded-lg shadow p-6">
             <div className="flex flex-col items-center text-center">
               {previewImage || user.foto ? (
-                <img src={previewImage || user.foto} alt="avatar" className="w-32 h-32 rounded-full object-cover mb-4" />
+                <img src={previewImage || getImageUrl(user.foto)} alt="avatar" className="w-32 h-32 rounded-full object-cover mb-4" />
               ) : (
                 <div className="w-32 h-32 rounded-full bg-wine-medium text-white flex items-center justify-center mb-4 text-2xl font-bold">{(user['1_nombre']||'U').charAt(0)}</div>
               )}
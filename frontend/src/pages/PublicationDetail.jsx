@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import { useParams, useNavigate, Link } from 'react-router-dom'
-import { getPublications, deletePublication, me, getImageUrl, checkWishlistStatus, addToWishlist, removeFromWishlist } from '../api'
+import { getPublication, deletePublication, me, getImageUrl, checkWishlistStatus, addToWishlist, removeFromWishlist } from '../api'
 import BuyButton from '../components/BuyButton'
 
 export default function PublicationDetail() {
@@ -20,9 +20,9 @@ export default function PublicationDetail() {
   const loadPublication = async () => {
     try {
       setLoading(true)
-      const response = await getPublications()
-      if (response.ok) {
-        const pub = response.data.find(p => p.id_publicacion === parseInt(id))
+      const response = await getPublication(id)
+      if (response.ok || response.status === 404) {
+        const pub = response.ok ? response.data : null
         if (pub) {
           setPublication(pub)
           const token = localStorage.getItem('token')